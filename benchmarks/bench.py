@@ -0,0 +1,251 @@
+"""
+Benchmark suite for the simulation engine.
+
+Microbenchmarks time the hot functions on their own (Deck.deal_code, a shoe shuffled
+fully or lazily and dealt to the cut card, get_move_code, get_blackjack_move, play_seat,
+simulate_round); macrobenchmarks play whole shoes at
+1, 2 and 7 players with 1, 6 and 8 decks and report rounds/sec, hands/sec and peak
+traced memory. Results are written as JSON and can be compared with a saved baseline:
+
+    python -m benchmarks.bench --save benchmarks/baseline.json
+    python -m benchmarks.bench --compare benchmarks/baseline.json
+
+The comparison flags any throughput that dropped by more than --threshold and exits
+with status 1 if there is one.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+
+import main
+from src.cls import deck as deck_module
+from src.cls.game import BlackjackGame
+from src.config import DEFAULT_CONFIG
+from src.helpers.simulation_logger import LOG_OFF
+from src.strategies.basic import get_blackjack_move, get_move_code, UPCARD_INDEX
+
+PLAYER_COUNTS = (1, 2, 7)
+DECK_COUNTS = (1, 6, 8)
+
+
+def _new_game(num_players, seed=0, config=DEFAULT_CONFIG):
+    return BlackjackGame([f"Player{i}" for i in range(1, num_players + 1)], rng=random.Random(seed),
+                         config=config)
+
+
+def _play_round(game, bet_histogram):
+    # One round plus the reshuffle check simulate_game does; returns hands played
+    main.simulate_round(game, bet_histogram)
+    if 100 * len(game.deck) / game.deck.size <= 100 - game.config.shuffle_percentage:
+        game.deck.reshuffle()
+    return sum(game.table.num_hands)
+
+
+def _per_second(func, number, repeat):
+    # Best of `repeat` timings, as calls per second
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return number / best
+
+
+# --- Microbenchmarks ---------------------------------------------------------------
+
+def bench_deal(number, repeat):
+    deck = deck_module.Deck(rng=random.Random(0))
+
+    def deal():
+        if deck.deal_code() < 0:
+            deck.reshuffle()
+    return {'deals_per_sec': _per_second(deal, number, repeat)}
+
+
+def bench_shoe(number, repeat, lazy=False):
+    # A shoe shuffled and dealt down to the cut card, fully shuffled or lazily
+    config = DEFAULT_CONFIG._replace(lazy_shuffle=lazy)
+    deck = deck_module.Deck(rng=random.Random(0), config=config, stream=deck_module.ShoeStream(0) if lazy else None)
+    cut = deck.cut
+
+    def shoe():
+        deck.reshuffle()
+        for _ in range(cut):
+            deck.deal_code()
+    return {'shoes_per_sec': _per_second(shoe, max(1, number // 20), repeat)}
+
+
+def bench_lazy_shoe(number, repeat):
+    return bench_shoe(number, repeat, lazy=True)
+
+
+def bench_get_move_code(number, repeat):
+    states = [(total, soft, 0, up) for total in range(4, 21) for soft in (False, True) for up in range(10)
+              if not soft or total >= 13]
+    count = len(states)
+
+    def lookup():
+        for state in states:
+            get_move_code(*state)
+    return {'lookups_per_sec': _per_second(lookup, max(1, number // count), repeat) * count}
+
+
+def bench_get_blackjack_move(number, repeat):
+    hands = [([{'rank': a}, {'rank': b}], {'rank': up}, total)
+             for a, b, total in (('10', '6', 16), ('A', '7', 18), ('8', '8', 16), ('5', '6', 11))
+             for up in ('2', '7', '10', 'A')]
+    count = len(hands)
+
+    def lookup():
+        for hand, upcard, total in hands:
+            get_blackjack_move(hand, upcard, total)
+    return {'lookups_per_sec': _per_second(lookup, max(1, number // count), repeat) * count}
+
+
+def bench_play_seat(number, repeat):
+    game = _new_game(1)
+    table = game.table
+
+    def play():
+        hand = table.start_seat(0, 10)
+        table.add_code(hand, game.deck.deal_code())
+        table.add_code(hand, game.deck.deal_code())
+        main.play_seat(table, 0, UPCARD_INDEX[game.deck.deal_code()], game.deck)
+        if len(game.deck) < 40:
+            game.deck.reshuffle()
+    return {'hands_per_sec': _per_second(play, number, repeat)}
+
+
+def bench_simulate_round(number, repeat):
+    game = _new_game(2)
+    bet_histogram = {}
+    return {'rounds_per_sec': _per_second(lambda: _play_round(game, bet_histogram), number, repeat)}
+
+
+MICROBENCHMARKS = {
+    'deck.deal_code': bench_deal,
+    'deck.shoe': bench_shoe,
+    'deck.lazy_shoe': bench_lazy_shoe,
+    'strategy.get_move_code': bench_get_move_code,
+    'strategy.get_blackjack_move': bench_get_blackjack_move,
+    'main.play_seat': bench_play_seat,
+    'main.simulate_round': bench_simulate_round,
+}
+
+
+# --- Macrobenchmarks ---------------------------------------------------------------
+
+def bench_shoes(num_players, num_decks, rounds, repeat):
+    config = DEFAULT_CONFIG._replace(num_decks=num_decks)
+    # Best of `repeat` passes over the same seeded shoes
+    bet_histogram = {}
+    elapsed = float('inf')
+    for _ in range(repeat):
+        game = _new_game(num_players, config=config)
+        hands = 0
+        start = time.perf_counter()
+        for _ in range(rounds):
+            hands += _play_round(game, bet_histogram)
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    # Memory is measured on a separate, shorter pass so tracing does not skew the timing
+    tracemalloc.start()
+    game = _new_game(num_players, seed=1, config=config)
+    for _ in range(max(1, rounds // 10)):
+        _play_round(game, bet_histogram)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'rounds_per_sec': rounds / elapsed, 'hands_per_sec': hands / elapsed, 'peak_memory_kb': peak / 1024}
+
+
+def run(quick=False):
+    number, repeat, rounds = (2_000, 3, 2_000) if quick else (20_000, 5, 20_000)
+    saved_level = main.logger.level
+    main.logger.level = LOG_OFF
+    results = {}
+    try:
+        for name, bench in MICROBENCHMARKS.items():
+            results[name] = bench(number, repeat)
+            print(f"{name}: {_format(results[name])}")
+        for num_players in PLAYER_COUNTS:
+            for num_decks in DECK_COUNTS:
+                name = f"shoe.players{num_players}.decks{num_decks}"
+                results[name] = bench_shoes(num_players, num_decks, rounds, repeat)
+                print(f"{name}: {_format(results[name])}")
+    finally:
+        main.logger.level = saved_level
+    return {'meta': _meta(quick), 'results': results}
+
+
+def _format(metrics):
+    return ", ".join(f"{metric}={value:,.1f}" for metric, value in metrics.items())
+
+
+def _meta(quick):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': quick,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(current, baseline, threshold):
+    """
+    Compare throughput metrics with a baseline run.
+
+    Returns:
+        list: (benchmark, metric, baseline value, current value, relative change) for
+        every throughput that dropped by more than `threshold`.
+    """
+    regressions = []
+    for name, metrics in current['results'].items():
+        for metric, value in metrics.items():
+            if not metric.endswith('_per_sec'):
+                continue
+            base = baseline['results'].get(name, {}).get(metric)
+            if not base:
+                continue
+            change = value / base - 1
+            if change < -threshold:
+                regressions.append((name, metric, base, value, change))
+    return regressions
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help="fewer iterations, for a fast sanity check")
+    parser.add_argument('--output', default='benchmarks/results/latest.json', help="where to write this run's JSON")
+    parser.add_argument('--save', metavar='BASELINE', help="also save this run as the baseline file")
+    parser.add_argument('--compare', metavar='BASELINE', help="baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="allowed relative throughput drop (default 0.10)")
+    args = parser.parse_args(argv)
+
+    current = run(quick=args.quick)
+    for path in filter(None, (args.output, args.save)):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        for name, metric, base, value, change in regressions:
+            print(f"REGRESSION {name} {metric}: {base:,.1f} -> {value:,.1f} ({100 * change:+.1f}%)")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {100 * args.threshold:.0f}% against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
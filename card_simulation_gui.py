@@ -2,7 +2,7 @@
 import os
 
 os.environ['SDL_AUDIODRIVER'] = 'dummy'  # disable sound to avoid ALSA errors
-import re, pygame, sys
+import mmap, re, struct, pygame, sys
 
 # %%
 # --- Configuration ---
@@ -11,6 +11,9 @@ BACKGROUND_COLOR = (0, 100, 0)
 FPS = 30
 CARDS_FOLDER = os.path.join(os.getcwd(), "cards")  # Place your card images here
 LOG_FILE = os.path.join(os.getcwd(), "src/outputs/simulation_log.txt")
+# Round index written next to the log by SimulationLogger (see src/helpers/simulation_logger.py)
+INDEX_MAGIC = b'BJLOGIX1'
+INDEX_RECORD = struct.Struct('<QIIH')
 
 
 # %%
@@ -29,71 +32,187 @@ def get_card_image_filename(card_str):
     return os.path.join(CARDS_FOLDER, filename)
 
 
-# --- Parse simulation_log.txt into rounds ---
-def parse_simulation_log():
-    rounds = []
-    current_round = {}
-    with open(LOG_FILE, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    for line in lines:
-        line = line.strip()
-        # Detect round beginning
-        if re.match(r"^Round\s+\d+\s+beginning", line):
-            if current_round:
-                rounds.append(current_round)
-            current_round = {"round": line}
-        elif line.startswith("Player1's Round Summary:"):
-            # Reset hand data for player1
-            current_round["player1"] = {}
-        elif line.startswith("Player2's Round Summary:"):
-            current_round["player2"] = {}
-        elif line.startswith("Dealer's Final Hand:"):
-            current_round["dealer_final"] = line.split("Dealer's Final Hand:")[-1].strip()
-        elif line.startswith("Final Hand:"):
-            # Depending on context, assign to current player
-            if "player1" in current_round and "final_hand" not in current_round["player1"]:
-                current_round["player1"]["final_hand"] = line.split("Final Hand:")[-1].strip()
-            elif "player2" in current_round and "final_hand" not in current_round["player2"]:
-                current_round["player2"]["final_hand"] = line.split("Final Hand:")[-1].strip()
-    if current_round:
-        rounds.append(current_round)
-    return rounds
+# --- Lazily parsed rounds of simulation_log.txt ---
+class SimulationLogRounds:
+    """
+    Rounds of a simulation log, parsed on demand.
+
+    The log is memory-mapped and the round index (<log>.idx) gives the byte offset,
+    run, round number and player count of every round, so any round is found in O(1)
+    and only the rounds on screen are ever decoded. Logs written without an index are
+    indexed with one scan over the mapped file.
+    """
+
+    def __init__(self, log_file=LOG_FILE):
+        with open(log_file, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.records = self._read_index(f"{log_file}.idx")
+        if self.records is None:
+            self.records = self._scan()
+        self._cache = {}
+
+    def _read_index(self, index_file):
+        if not os.path.exists(index_file):
+            return None
+        with open(index_file, "rb") as f:
+            index = f.read()
+        if not index.startswith(INDEX_MAGIC) or (len(index) - len(INDEX_MAGIC)) % INDEX_RECORD.size:
+            return None
+        # Records are unpacked when a round is shown; only the raw index is kept
+        return memoryview(index)[len(INDEX_MAGIC):].cast('B')
+
+    def _scan(self):
+        # Fallback for logs without an index: offsets of every "Round N beginning" line
+        index = bytearray()
+        for m in re.finditer(rb"^Round (\d+) beginning", self.data, re.MULTILINE):
+            index += INDEX_RECORD.pack(m.start(), 0, int(m.group(1)), 0)
+        return memoryview(bytes(index))
+
+    def __len__(self):
+        return len(self.records) // INDEX_RECORD.size
+
+    def __getitem__(self, i):
+        cr = self._cache.get(i)
+        if cr is None:
+            if len(self._cache) > 256:
+                self._cache.clear()
+            cr = self._cache[i] = self._parse(i)
+        return cr
+
+    def _parse(self, i):
+        offset, run, round_num, num_players = INDEX_RECORD.unpack_from(self.records, i * INDEX_RECORD.size)
+        end = INDEX_RECORD.unpack_from(self.records, (i + 1) * INDEX_RECORD.size)[0] if i + 1 < len(self) \
+            else len(self.data)
+        cr = {"run": run, "round": round_num, "num_players": num_players, "players": {}}
+        current = None
+        for line in self.data[offset:end].decode("utf-8", errors="replace").splitlines():
+            line = line.strip()
+            if line.endswith("'s Round Summary:"):
+                # One summary per hand, so a split player gets several
+                name = line[:-len("'s Round Summary:")]
+                current = {}
+                cr["players"].setdefault(name, []).append(current)
+            elif line.startswith("Dealer's Final Hand:"):
+                cr["dealer_final"] = line.split("Dealer's Final Hand:")[-1].strip()
+            elif line.startswith("Final Hand:") and current is not None:
+                current["final_hand"] = line.split("Final Hand:")[-1].strip()
+            elif line.startswith("Outcome:") and current is not None:
+                # "Outcome: win, Bet: 20, Player Money: 1020"
+                m = re.match(r"Outcome:\s*(\w+),\s*Bet:\s*([\d.]+),\s*Player Money:\s*([-\d.]+)", line)
+                if m:
+                    current["outcome"], current["bet"], current["money"] = m.groups()
+        return cr
+
+
+def parse_simulation_log(log_file=LOG_FILE):
+    return SimulationLogRounds(log_file)
+
+
+# --- Surface caches: every card image is loaded and scaled once, fonts created once ---
+_card_surfaces = {}  # (card_str, card_size) -> scaled Surface or placeholder
+_fonts = {}  # size -> Font
+
+
+def get_font(size):
+    font = _fonts.get(size)
+    if font is None:
+        font = _fonts[size] = pygame.font.SysFont(None, size)
+    return font
+
+
+def get_card_surface(card_str, card_size):
+    key = (card_str, card_size)
+    card_img = _card_surfaces.get(key)
+    if card_img is not None:
+        return card_img
+    img_file = get_card_image_filename(card_str)
+    if img_file and os.path.exists(img_file):
+        card_img = pygame.image.load(img_file).convert_alpha()
+        card_img = pygame.transform.smoothscale(card_img, card_size)
+    else:
+        # fallback: render a placeholder rectangle with text (warned about once per card)
+        print(f"Card image not found: {card_str}")
+        card_img = pygame.Surface(card_size)
+        card_img.fill((255, 255, 255))
+        text_surf = get_font(24).render(card_str, True, (0, 0, 0))
+        card_img.blit(text_surf, (5, 5))
+    _card_surfaces[key] = card_img
+    return card_img
 
 
 # --- Render a set of cards horizontally ---
 def render_cards(screen, card_str_list, start_pos, card_size=(100, 145), gap=10):
     x, y = start_pos
     for card_str in card_str_list:
-        img_file = get_card_image_filename(card_str)
-        if img_file and os.path.exists(img_file):
-            card_img = pygame.image.load(img_file).convert_alpha()
-            card_img = pygame.transform.smoothscale(card_img, card_size)
-        else:
-            # fallback: render a placeholder rectangle with text
-            print(f"Card image not found: {card_str}")
-            card_img = pygame.Surface(card_size)
-            card_img.fill((255, 255, 255))
-            font = pygame.font.SysFont(None, 24)
-            text_surf = font.render(card_str, True, (0, 0, 0))
-            card_img.blit(text_surf, (5, 5))
-        screen.blit(card_img, (x, y))
+        screen.blit(get_card_surface(card_str, card_size), (x, y))
         x += card_size[0] + gap
 
 
+# Parse hand strings into lists
+def get_hand_list(hand_str):
+    # assuming cards in hand are separated by " | "
+    return [s.strip() for s in hand_str.split("|") if s.strip()]
+
+
+# --- Render one round into a frame surface ---
+def render_round(frame, cr, index, total):
+    font = get_font(36)
+    frame.fill(BACKGROUND_COLOR)
+    round_text = f"Round: {cr['round']}" + (f"  (run {cr['run']})" if cr["run"] else "") + f"  [{index + 1}/{total}]"
+    text_surf = font.render(round_text, True, (255, 255, 0))
+    frame.blit(text_surf, (20, 20))
+
+    # One row per player (any number of them) and one for the dealer, cards scaled to fit
+    players = cr["players"]
+    rows = len(players) + 1
+    top = 70
+    row_height = (SCREEN_HEIGHT - top) // rows
+    card_height = max(20, min(145, row_height - 45))
+    card_size = (card_height * 100 // 145, card_height)
+    y = top
+    for name, hands in players.items():
+        x = 20
+        money = next((hand["money"] for hand in reversed(hands) if "money" in hand), None)
+        label = f"{name}:" + (f"  Money: {money}" if money is not None else "")
+        frame.blit(font.render(label, True, (255, 255, 255)), (20, y))
+        for hand in hands:
+            if "final_hand" not in hand:
+                continue
+            cards = get_hand_list(hand["final_hand"])
+            render_cards(frame, cards, (x, y + 35), card_size, gap=4)
+            if "bet" in hand:
+                # Render the hand's bet and outcome under its cards
+                text = get_font(24).render(f"Bet: {hand['bet']} ({hand['outcome']})", True, (255, 255, 255))
+                frame.blit(text, (x, y + 35 + card_height + 2))
+            x += len(cards) * (card_size[0] + 4) + 30
+        y += row_height
+
+    # Render Dealer final hand
+    if "dealer_final" in cr:
+        dealer_hand = get_hand_list(cr["dealer_final"])
+        text = font.render("Dealer:", True, (255, 255, 255))
+        frame.blit(text, (20, y))
+        render_cards(frame, dealer_hand, (20, y + 35), card_size, gap=4)
+
+
 # %%
 def main():
     pygame.init()
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Card Simulation Viewer")
     clock = pygame.time.Clock()
-    font = pygame.font.SysFont(None, 36)
 
-    rounds = parse_simulation_log()
+    rounds = parse_simulation_log(sys.argv[1] if len(sys.argv) > 1 else LOG_FILE)
     if not rounds:
         print("No rounds found in log.")
         sys.exit()
 
     current_index = 0
+    # The round's frame is rendered once into an off-screen surface and only redrawn
+    # when the round changes; otherwise the loop just waits for events.
+    frame = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    frame_index = None
+    dirty = True
 
     running = True
     while running:
@@ -106,52 +225,26 @@ def main():
                     current_index = (current_index + 1) % len(rounds)
                 elif event.key == pygame.K_LEFT:
                     current_index = (current_index - 1) % len(rounds)
-
-        screen.fill(BACKGROUND_COLOR)
-        cr = rounds[current_index]
-        round_text = f"Round: {current_index + 1}"
-        text_surf = font.render(round_text, True, (255, 255, 0))
-        screen.blit(text_surf, (20, 20))
-
-        # Parse hand strings into lists
-        def get_hand_list(hand_str):
-            # assuming cards in hand are separated by " | "
-            return [s.strip() for s in hand_str.split("|") if s.strip()]
-
-        # Render Player1 final hand
-        if "player1" in cr and "final_hand" in cr["player1"]:
-            p1_hand = get_hand_list(cr["player1"]["final_hand"])
-            text = font.render("Player1:", True, (255, 255, 255))
-            screen.blit(text, (20, 80))
-            render_cards(screen, p1_hand, (20, 120))
-            # Render Player1 bet and money
-            if "bet" in cr["player1"] and "money" in cr["player1"]:
-                bet_text = font.render(f"Bet: {cr['player1']['bet']}", True, (255, 255, 255))
-                money_text = font.render(f"Money: {cr['player1']['money']}", True, (255, 255, 255))
-                screen.blit(bet_text, (20, 270))
-                screen.blit(money_text, (20, 310))
-
-        # Render Player2 final hand
-        if "player2" in cr and "final_hand" in cr["player2"]:
-            p2_hand = get_hand_list(cr["player2"]["final_hand"])
-            text = font.render("Player2:", True, (255, 255, 255))
-            screen.blit(text, (20, 300))
-            render_cards(screen, p2_hand, (20, 340))
-            # Render Player2 bet and money
-            if "bet" in cr["player2"] and "money" in cr["player2"]:
-                bet_text = font.render(f"Bet: {cr['player2']['bet']}", True, (255, 255, 255))
-                money_text = font.render(f"Money: {cr['player2']['money']}", True, (255, 255, 255))
-                screen.blit(bet_text, (20, 490))
-                screen.blit(money_text, (20, 530))
-
-        # Render Dealer final hand
-        if "dealer_final" in cr:
-            dealer_hand = get_hand_list(cr["dealer_final"])
-            text = font.render("Dealer:", True, (255, 255, 255))
-            screen.blit(text, (20, 520))
-            render_cards(screen, dealer_hand, (20, 560))
-
-        pygame.display.flip()
+                # Page up/down jump 100 rounds, Home/End to the first/last round
+                elif event.key == pygame.K_PAGEDOWN:
+                    current_index = min(current_index + 100, len(rounds) - 1)
+                elif event.key == pygame.K_PAGEUP:
+                    current_index = max(current_index - 100, 0)
+                elif event.key == pygame.K_HOME:
+                    current_index = 0
+                elif event.key == pygame.K_END:
+                    current_index = len(rounds) - 1
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                dirty = True
+
+        if current_index != frame_index:
+            render_round(frame, rounds[current_index], current_index, len(rounds))
+            frame_index = current_index
+            dirty = True
+        if dirty:
+            screen.blit(frame, (0, 0))
+            pygame.display.flip()
+            dirty = False
         clock.tick(FPS)
     pygame.quit()
     sys.exit()
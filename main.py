@@ -1,251 +1,462 @@
-import csv
-
-from src.cls.game import BlackjackGame
-from src.cls.hand import Hand
-from src.helpers.simulation_logger import logger
-from src.settings import (SHUFFLE_PERCENTAGE,
-                          BET_AMOUNT,
-                          MAX_RESHUFFLE,
-                          ENABLE_CARD_COUNTING,
-                          MIN_BET, MAX_BET,
-                          NUM_PLAYERS, TOTAL_RUNS, MAX_SPLIT_ALLOWED)
-from src.strategies.basic import get_blackjack_move, hi_lo_count
-
-
-def print_cards(label, cards):
-    # Build a string representation for a list of cards
-    card_str = ' | '.join(str(card) for card in cards)
-    logger.log(f"{label}: {card_str}")
-
-
-def print_separator():
-    logger.log("=" * 50)
-
-
-def handle_split(player, hand_index, game, running_count):
-    # Split the hand into two separate hands
-    hand = player.hands[hand_index]
-    # add new hand
-    player.add_hand(hand=Hand(), bet=player.hands_bets[hand_index])
-    # remove one card from current hand and add it to the new hand
-    card = hand.cards.pop()
-    player.hands[hand_index + 1].add_card(card)
+import functools
+import hashlib
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from src.cls.card import CARD_IS_ACE, CARD_RANK, CARD_VALUE, card_from_code
+from src.cls.deck import Deck, ShoeStream, ShoeView
+from src.cls.game import BlackjackGame, ShadowTable
+from src.cls.hand import DOUBLED, SPLIT_HAND, SURRENDERED
+from src.cls.table import TableState, HAND_CARDS
+from src.config import DEFAULT_CONFIG
+from src.helpers.hand_history import HandRecorder, HandHistoryWriter
+from src.helpers.profiler import profiler
+from src.helpers.results_writer import ResultsWriter
+from src.helpers.shoe_corpus import ShoeCorpus, shoe_for_run
+from src.helpers.stats import EVStats, OutcomeMatrix, ShadowStats
+from src.helpers.simulation_logger import SimulationLogger, logger, LOG_SUMMARY, LOG_ROUND, LOG_ACTION
+from src.settings import (TOTAL_RUNS, RESULTS_CHUNK_SIZE, PROFILE, PROFILE_MEMORY, SHOE_CORPUS,
+                          HAND_HISTORY_FILE, OUTCOME_MATRIX, ROUND_KERNEL)
+from src.engines.kernel import RoundRules, compile_round
+from src.strategies.basic import (get_move_code, surrender_cells, MOVE_NAMES, UPCARD_INDEX,
+                                  STAND, HIT, DOUBLE, DOUBLE_STAND, SPLIT)
+from src.strategies.deviations import CountStrategy
+
+# Version of the engine's results: bump it whenever a change alters what a seeded game
+# produces, so that cached results (src/engines/sweep.py) are recomputed. That is any
+# change to the game loop, dealing, settlement or seeding in this file, to the shoe and
+# table state (src/cls), to basic strategy, counting or deviation lookup
+# (src/strategies) or to shoe_for_run; a new settings/GameConfig default does not need
+# it, as the config is part of the cache key
+ENGINE_VERSION = 1
+# Pre-shuffled shoes to deal from, memory-mapped once per process; games shuffle when None
+shoe_corpus = ShoeCorpus(SHOE_CORPUS) if SHOE_CORPUS else None
+# With ROUND_KERNEL, simulate_game plays rounds with a function specialized on its
+# config's rules (src/engines/kernel.py) whenever nothing needs the generic round's
+# per-hand detail
+
+
+# Log calls on the hot path are guarded by a level check so that nothing is
+# formatted when the level is disabled. Profiling is guarded the same way: the
+# phase timers only run when `profiler.enabled` was set at the start of the call.
+def print_cards(label, codes, level=LOG_ROUND):
+    # Build a string representation for a list of card codes
+    card_str = ' | '.join(str(card_from_code(code)) for code in codes)
+    logger.log(f"{label}: {card_str}", level)
+
+
+def print_separator(level=LOG_SUMMARY):
+    logger.log("=" * 50, level)
+
+
+@functools.lru_cache(maxsize=None)
+def load_count_strategy(path, count_system):
+    # Count-aware strategy of a deviation file, loaded once per process; the file must be
+    # for the game's count system
+    return CountStrategy.load(path, count_system)
+
+
+def handle_split(table, slot, hand, deck):
+    # Split the hand into two separate hands: the second card moves to a new hand of the
+    # seat with the same bet, after the seat's other hands; returns the new hand's index
+    new_hand = table.new_hand(slot, table.bets[hand])
+    table.add_code(new_hand, table.pop_code(hand))
+    table.flags[hand] |= SPLIT_HAND
+    table.flags[new_hand] |= SPLIT_HAND
 
     # deal a new card to each hand
-    for i in range(hand_index, hand_index + 2):
-        card = game.deck.deal()
-        if card:
-            player.hands[i].add_card(card)
-            if ENABLE_CARD_COUNTING:
-                running_count[0] += hi_lo_count(card.rank)
+    for split_hand in (hand, new_hand):
+        code = deck.deal_code()
+        if code >= 0:
+            table.add_code(split_hand, code)
         else:
             break
-
-
-def simulate_round(game, running_count, bet_histogram):
-    print_separator()
-    logger.log("New Round Starting")
-    # Reinitialize players for new round
-    for player in game.players:
-        player.hands = [Hand()]
-        adjusted_bet = get_bet_amount(running_count)
+    return new_hand
+
+
+def simulate_round(game, bet_histogram, stats=None, history=None, outcomes=None):
+    # `stats` (an EVStats), when given, receives every seat's net units and hand outcomes;
+    # `history` (a HandRecorder) receives a record of every hand and `outcomes` (an
+    # OutcomeMatrix) every seat's net units by initial hand, upcard, action and count
+    log_round = logger.level >= LOG_ROUND
+    profile = profiler.enabled
+    if profile:
+        round_mark = mark = profiler.start()
+    if log_round:
+        print_separator(LOG_ROUND)
+        logger.log("New Round Starting", LOG_ROUND)
+    deck = game.deck
+    config = game.config
+    # The game's single table: seat s is slot s and its first hand is s * max_hands
+    table = game.table
+    seats = range(table.seats)
+    max_hands = table.max_hands
+    if history is not None or outcomes is not None:
+        # Recorded with every hand: the count the round was bet at
+        running_count, true_count = deck.running_count, deck.true_count
+    # Start every seat's round over its previous one
+    for seat in seats:
+        adjusted_bet = get_bet_amount(deck, config)
         bet_histogram[adjusted_bet] = bet_histogram.get(adjusted_bet, 0) + 1
-        player.hands_bets = [adjusted_bet]
-    # Dealer hand is local (list of cards)
-    dealer_hand = []
+        table.start_seat(seat, adjusted_bet)
+    # The dealer hand keeps the same running total and soft flag as player hands
+    dealer_hand = table.dealers[0]
+    dealer_hand.reset()
+    if profile:
+        profiler.stop('bet', mark)
+        mark = profiler.start()
 
     # Deal initial cards for each player
-    for player in game.players:
+    for seat in seats:
         for _ in range(2):
-            card = game.deck.deal()
-            if card:
-                if ENABLE_CARD_COUNTING:
-                    running_count[0] += hi_lo_count(card.rank)
-                player.hands[0].add_card(card)
+            code = deck.deal_code()
+            if code >= 0:
+                table.add_code(seat * max_hands, code)
 
     # Deal dealer two cards
     for _ in range(2):
-        card = game.deck.deal()
-        if card:
-            if ENABLE_CARD_COUNTING:
-                running_count[0] += hi_lo_count(card.rank)
-            dealer_hand.append(card)
-
-    dealer_upcard = {'rank': dealer_hand[0].rank, 'suit': dealer_hand[0].suit.value}
+        code = deck.deal_code()
+        if code >= 0:
+            dealer_hand.add_code(code)
+
+    upcard_index = UPCARD_INDEX[dealer_hand.codes[0]]
+    if outcomes is not None:
+        # Initial hand row per seat, taken before the hands are played or split
+        hand_rows = [OutcomeMatrix.hand_row(*table.codes(seat * max_hands))
+                     if table.num_cards[seat * max_hands] == 2 else None for seat in seats]
+    if profile:
+        profiler.stop('deal', mark)
+        mark = profiler.start()
 
     # Show initial state for each player
-    for player in game.players:
-        print_cards(f"{player.name}'s Hand", player.hands[0].cards)
-        logger.log(f"{player.name}'s Total: {player.hands[0].value}")
-    print_cards("Dealer Upcard", dealer_hand[:1])
-
-    if ENABLE_CARD_COUNTING:
-        logger.log(f"Running Count: {running_count[0]}")
+    if log_round:
+        for seat in seats:
+            name = table.names[seat]
+            print_cards(f"{name}'s Hand", table.codes(seat * max_hands))
+            logger.log(f"{name}'s Total: {table.totals[seat * max_hands]}", LOG_ROUND)
+        print_cards("Dealer Upcard", dealer_hand.codes[:1])
+
+        if config.counting:
+            logger.log(f"Running Count: {deck.running_count}, True Count: {deck.true_count:.2f}", LOG_ROUND)
+        if profile:
+            profiler.stop('log', mark)
+    if profile:
+        mark = profiler.start()
 
     # Player's turn for each hand
-    for player in game.players:
-        # Using while-loop to process any newly added hands (from splits)
-        play_hand(player, player.hands[0], dealer_upcard, game, running_count)
+    for seat in seats:
+        play_seat(table, seat, upcard_index, deck, config=config)
+    if profile:
+        profiler.stop('player', mark)
+        mark = profiler.start()
 
     # Dealer's turn if any player hasn't busted
-    if any(hand.value <= 21 for player in game.players for hand in player.hands):
-        print_separator()
-        logger.log("Dealer's Turn:")
-        print_cards("Dealer's Hand", dealer_hand)
-        dealer_total = sum(card.value() for card in dealer_hand)
-        logger.log(f"Dealer's Total: {dealer_total}")
-        while dealer_total < 17:
-            card = game.deck.deal()
-            if not card:
-                break
-            if ENABLE_CARD_COUNTING:
-                running_count[0] += hi_lo_count(card.rank)
-            dealer_hand.append(card)
-            dealer_total = sum(card.value() for card in dealer_hand)
-            logger.log(f"Dealer hits and receives: {card}")
-            print_cards("Dealer's Hand", dealer_hand)
-            logger.log(f"Dealer's New Total: {dealer_total}")
+    if table.live():
+        dealer_total = play_dealer(dealer_hand, deck, config)
     else:
-        dealer_total = sum(card.value() for card in dealer_hand)
-        logger.log("Dealer wins by all players bust.")
+        dealer_total = dealer_hand.value
+        if log_round:
+            logger.log("Dealer wins by all players bust.", LOG_ROUND)
+    if profile:
+        profiler.stop('dealer', mark)
+        mark = profiler.start()
 
     # Determine outcome for each player's hand
-    for player in game.players:
-        for hand, bet in zip(player.hands, player.hands_bets):
-            if hand.value > 21:
-                outcome = "lose"
-                player.money -= bet
-            elif dealer_total > 21 or hand.value > dealer_total:
-                outcome = "win"
-                player.money += bet
-            elif hand.value == dealer_total:
-                outcome = "push"
+    hands_played = 0
+    money = table.money
+    totals = table.totals
+    flags = table.flags
+    bets = table.bets
+    for seat in seats:
+        initial_bet = table.initial_bets[seat]
+        hands = table.hand_range(seat)
+        hands_played += len(hands)
+        money_before = money[seat]
+        for index, hand in enumerate(hands):
+            outcome, net = settle_hand(totals[hand], flags[hand], bets[hand], dealer_total)
+            money[seat] += net
+            if history is not None:
+                history.add(seat, index, table.codes(hand), flags[hand], totals[hand], dealer_hand, dealer_total,
+                            running_count, true_count, initial_bet, net, (net > 0) - (net < 0))
+            if stats is not None:
+                if outcome == "win":
+                    stats.wins += 1
+                elif outcome == "push":
+                    stats.pushes += 1
+                else:
+                    stats.losses += 1
+            if log_round:
+                print_separator(LOG_ROUND)
+                logger.log(f"{table.names[seat]}'s Round Summary:", LOG_ROUND)
+                print_cards("Final Hand", table.codes(hand))
+                logger.log(f"Hand Total: {totals[hand]}", LOG_ROUND)
+                print_cards("Dealer's Final Hand", dealer_hand.codes)
+                logger.log(f"Dealer Total: {dealer_total}", LOG_ROUND)
+                logger.log(f"Outcome: {outcome}, Bet: {bets[hand]}, Player Money: {money[seat]}\n", LOG_ROUND)
+        if stats is not None:
+            stats.add_hand((money[seat] - money_before) / initial_bet)
+        if outcomes is not None and hand_rows[seat] is not None:
+            first_hand = seat * max_hands
+            if len(hands) > 1:
+                action = OutcomeMatrix.SPLIT
+            elif flags[first_hand] & SURRENDERED:
+                action = OutcomeMatrix.SURRENDER
+            elif flags[first_hand] & DOUBLED:
+                action = OutcomeMatrix.DOUBLE
+            elif table.num_cards[first_hand] > 2:
+                action = OutcomeMatrix.HIT
             else:
-                outcome = "lose"
-                player.money -= bet
-            print_separator()
-            logger.log(f"{player.name}'s Round Summary:")
-            print_cards("Final Hand", hand.cards)
-            logger.log(f"Hand Total: {hand.value}")
-            print_cards("Dealer's Final Hand", dealer_hand)
-            logger.log(f"Dealer Total: {dealer_total}")
-            logger.log(f"Outcome: {outcome}, Bet: {bet}, Player Money: {player.money}\n")
+                action = OutcomeMatrix.STAND
+            outcomes.add(outcomes.cell(hand_rows[seat], upcard_index, action, true_count),
+                         (money[seat] - money_before) / initial_bet)
+    if profile:
+        # Settlement includes its per-hand summary lines when round logging is on
+        profiler.stop('settle', mark)
+        profiler.stop('round', round_mark)
+        profiler.count('hands', hands_played)
+        profiler.count('dealer_cards', len(dealer_hand.codes))
     return None
 
 
-def get_bet_amount(running_count):
-    # Compute adjusted bet based on the running count if card counting is enabled
-    if ENABLE_CARD_COUNTING:
-        # Increase bet for positive count, reduce for negative, using an increment of 2 per count point
-        adjusted_bet = BET_AMOUNT + running_count[0] * 2
-        return max(MIN_BET, min(adjusted_bet, MAX_BET))
-    return BET_AMOUNT
-
-
-# New function to play a single hand
-def play_hand(player, hand, dealer_upcard, game, running_count, split_count=0):
-    while True:
-
-        if hand.value > 21:
-            logger.log("Player busts!")
+def play_dealer(dealer_hand, deck, config=DEFAULT_CONFIG):
+    # Dealer hits below 17, and on soft 17 unless the rules say it stands; returns the final total
+    log_round = logger.level >= LOG_ROUND
+    log_action = logger.level >= LOG_ACTION
+    if log_round:
+        print_separator(LOG_ROUND)
+        logger.log("Dealer's Turn:", LOG_ROUND)
+        print_cards("Dealer's Hand", dealer_hand.codes)
+        logger.log(f"Dealer's Total: {dealer_hand.value}", LOG_ROUND)
+    hits_soft_17 = not config.stands_on_soft_17
+    while dealer_hand.value < 17 or (dealer_hand.value == 17 and dealer_hand.soft and hits_soft_17):
+        code = deck.deal_code()
+        if code < 0:
             break
+        dealer_hand.add_code(code)
+        if log_action:
+            logger.log(f"Dealer hits and receives: {card_from_code(code)}", LOG_ACTION)
+            print_cards("Dealer's Hand", dealer_hand.codes, LOG_ACTION)
+            logger.log(f"Dealer's New Total: {dealer_hand.value}", LOG_ACTION)
+    return dealer_hand.value
+
+
+def settle_hand(value, flags, bet, dealer_total):
+    # Outcome ("win", "push", "lose" or "surrender") and money won of a hand (its total and
+    # flags) against the dealer's total
+    if flags & SURRENDERED:
+        return "surrender", -bet / 2
+    if value > 21:
+        return "lose", -bet
+    if dealer_total > 21 or value > dealer_total:
+        return "win", bet
+    if value == dealer_total:
+        return "push", 0
+    return "lose", -bet
+
+
+def game_rules(config=DEFAULT_CONFIG):
+    # The rules both engines play under `config`, recorded with each result row
+    return ", ".join([
+        "no peek", "naturals pay 1x", "S17" if config.stands_on_soft_17 else "H17", "double on two cards",
+        "DAS" if config.das else "no DAS", "split aces one card" if config.split_aces_one_card else "split aces draw",
+        f"{config.max_splits} splits", "hard table after two cards",
+        "late surrender" if config.surrender else "no surrender",
+    ])
+
+
+def get_bet_amount(deck, config=DEFAULT_CONFIG):
+    # Compute adjusted bet based on the shoe's true count if card counting is enabled
+    if config.counting:
+        # Increase bet for positive count, reduce for negative, by bet_ramp per whole point of true count
+        adjusted_bet = config.bet_amount + int(deck.true_count) * config.bet_ramp
+        return max(config.min_bet, min(adjusted_bet, config.max_bet))
+    return config.bet_amount
+
+
+def play_seat(table, slot, upcard_index, deck, policy=None, config=DEFAULT_CONFIG):
+    """
+    Play all of a seat's hands (slot `slot` of a TableState), starting from its dealt
+    hand, without recursion.
+
+    Hands still to play are kept as a stack of hand indexes: a split takes the seat's
+    next hand, pushes its index and plays on with the current hand, so hands are played
+    depth first in the order they were split off. Moves come from `policy` (a
+    src.strategies.policy.Policy) when given, otherwise from the config's count strategy
+    or basic strategy; the rules come from `config`.
+    """
+    log_action = logger.level >= LOG_ACTION
+    profile = profiler.enabled
+    count_file = config.count_strategy_file
+    count_strategy = load_count_strategy(count_file, config.count_system) if count_file and policy is None else None
+    max_splits = config.max_splits
+    surrender = surrender_cells(config.stands_on_soft_17) if config.surrender else None
+    totals = table.totals
+    num_cards = table.num_cards
+    cards = table.cards
+    pending = [slot * table.max_hands]
+    splits = 0
+    while pending:
+        hand = pending.pop()
+        while True:
+            value = totals[hand]
+            if value > 21:
+                if log_action:
+                    logger.log("Player busts!", LOG_ACTION)
+                break
 
-        player_hand_dict = [{'rank': card.rank, 'suit': card.suit.value} for card in hand.cards]
-
-        move = get_blackjack_move(player_hand_dict, dealer_upcard, hand.value)
-
-        if move == "split" and split_count > MAX_SPLIT_ALLOWED:
-            move = "H"  # Change move to hit if split count exceeds MAX_SPLIT_ALLOWED
-        if move == "split":
-            logger.log("Player splits the hand.")
-
-            # Find the index of the current hand by iterating over the hands
-            hand_index = next(i for i, h in enumerate(player.hands) if h == hand)
-            handle_split(player, hand_index, game, running_count)
-
-            print_cards("Player's Hands", [hand.cards for hand in player.hands])
-
-            # Recursive call to play the newly split hands
-            old_hand = player.hands[hand_index]
-            play_hand(player, old_hand, dealer_upcard, game, running_count, split_count + 1)
-
-            new_hand = player.hands[hand_index + 1]
-            play_hand(player, new_hand, dealer_upcard, game, running_count, split_count + 1)
+            # Strategy state straight from the hand: the soft table and pair splitting
+            # only apply to the first two cards
+            two_cards = num_cards[hand] == 2
+            if two_cards:
+                first = cards[hand * HAND_CARDS]
+                second = cards[hand * HAND_CARDS + 1]
+                soft = CARD_IS_ACE[first] or CARD_IS_ACE[second]
+                # Once the seat has split max_splits times a pair plays as a total
+                pair_value = CARD_VALUE[first] if CARD_RANK[first] == CARD_RANK[second] \
+                    and splits < max_splits else 0
+            else:
+                soft = False
+                pair_value = 0
+
+            if profile:
+                mark = profiler.start()
+            if policy is not None:
+                move = policy.get_move_code(value, soft, pair_value, upcard_index, deck.true_count)
+            elif count_strategy is None:
+                move = get_move_code(value, soft, pair_value, upcard_index)
+            else:
+                move = count_strategy.get_move_code(value, soft, pair_value, upcard_index, deck.true_count)
+            if profile:
+                profiler.stop('strategy', mark)
+
+            if move == SPLIT:
+                if log_action:
+                    logger.log("Player splits the hand.", LOG_ACTION)
+                splits += 1
+                if profile:
+                    mark = profiler.start()
+                    new_hand = handle_split(table, slot, hand, deck)
+                    profiler.stop('split', mark)
+                else:
+                    new_hand = handle_split(table, slot, hand, deck)
+                if log_action:
+                    seat_hands = ' | '.join(f'[{table.hand_repr(seat_hand)}]' for seat_hand in table.hand_range(slot))
+                    logger.log(f"Player's Hands: {seat_hands}", LOG_ACTION)
+                if config.split_aces_one_card and CARD_IS_ACE[first]:
+                    # Split aces take one card each and stand
+                    break
+                pending.append(new_hand)
+                continue
+
+            if (surrender is not None and two_cards and not soft and not splits
+                    and (value, upcard_index) in surrender):
+                if log_action:
+                    logger.log("Player surrenders.", LOG_ACTION)
+                table.flags[hand] |= SURRENDERED
+                break
 
-            break
+            if move == DOUBLE or move == DOUBLE_STAND:
+                # Doubling is allowed on two cards only, and after a split only with DAS
+                if not two_cards or (splits and not config.das):
+                    move = HIT if move == DOUBLE else STAND
 
-        logger.log(f"Suggested move: {move}")
-        if move in ["S"]:  # Stand
-            logger.log("Player stands.")
-            break
+            if log_action:
+                logger.log(f"Suggested move: {MOVE_NAMES[move] if move < len(MOVE_NAMES) else move}", LOG_ACTION)
+            if move == STAND:
+                if log_action:
+                    logger.log("Player stands.", LOG_ACTION)
+                break
 
-        elif move in ["H"]:  # Hit
-            card = game.deck.deal()
-            if card:
-                if ENABLE_CARD_COUNTING:
-                    running_count[0] += hi_lo_count(card.rank)
-                logger.log(f"Player hits and receives: {card}")
-                hand.add_card(card)
-                print_cards("Player's Hand", hand.cards)
+            elif move == HIT:
+                code = deck.deal_code()
+                if profile:
+                    profiler.count('hits')
+                if code >= 0:
+                    table.add_code(hand, code)
+                    if log_action:
+                        logger.log(f"Player hits and receives: {card_from_code(code)}", LOG_ACTION)
+                        print_cards("Player's Hand", table.codes(hand), LOG_ACTION)
+                else:
+                    break
+
+            elif move == DOUBLE or move == DOUBLE_STAND:
+                table.bets[hand] *= 2
+                table.flags[hand] |= DOUBLED
+                code = deck.deal_code()
+                if profile:
+                    profiler.count('doubles')
+                if code >= 0:
+                    table.add_code(hand, code)
+                    if log_action:
+                        logger.log(f"Player doubles and receives: {card_from_code(code)}", LOG_ACTION)
+                break
             else:
+                if log_action:
+                    logger.log("Unexpected move. Player stands by default.", LOG_ACTION)
                 break
 
-        elif move in ["D", "Ds"]:  # Double
-            player.set_bet(player.hands_bets[0] * 2, hand_index=0)
-            card = game.deck.deal()
-            if card:
-                if ENABLE_CARD_COUNTING:
-                    running_count[0] += hi_lo_count(card.rank)
-                logger.log(f"Player doubles and receives: {card}")
-                hand.add_card(card)
-            break
-        else:
-            logger.log("Unexpected move. Player stands by default.")
-            break
-    return hand.value
-
 
-def simulate_game():
-    # Initialize game with NUM_PLAYERS players using dynamically generated names
-    player_names = [f"Player{i}" for i in range(1, NUM_PLAYERS + 1)]
-    game = BlackjackGame(player_names)
+def simulate_game(seed=None, stats=None, first_shoe=0, run=None, history=None, outcomes=None, config=None):
+    # The game is played with `config` (a GameConfig), the settings by default
+    config = config if config is not None else DEFAULT_CONFIG
+    # Initialize game with num_players players using dynamically generated names
+    player_names = [f"Player{i}" for i in range(1, config.num_players + 1)]
+    profile = profiler.enabled
+    if profile:
+        game_mark = profiler.start()
+    # A seeded game owns its RNG stream; without a seed the shoe uses the global random module
+    # With a shoe corpus the game deals its shoes from `first_shoe` on instead of shuffling
+    shoes = shoe_corpus.stream(first_shoe) if shoe_corpus is not None else None
+    # A lazily shuffled shoe draws shoe n of the game from the seed's stream instead
+    stream = ShoeStream(seed) if config.lazy_shuffle else None
+    game = BlackjackGame(player_names, rng=random.Random(seed) if seed is not None else None, shoes=shoes,
+                         config=config, stream=stream)
+    # Seat state (money, minimum money reached, bets, hands) lives in the table's arrays
+    table = game.table
     total_hands = 0
     reshuffle_count = 0
-    running_count = [0]  # define once outside of rounds
     bet_histogram = {}  # initialize bet amounts histogram
 
-    # Initialize each player's minimum reached money
-    min_reached = {p.name: p.money for p in game.players}
-
-    total_cards = len(game.deck.cards)
+    total_cards = game.deck.size
     logger.log(f"Starting game with {total_cards} cards in the deck.")
+    # The kernel keeps no hands, logs or phase timings; it hands back rounds where the shoe runs out
+    kernel = compile_round(RoundRules.from_config(config)) if (ROUND_KERNEL and history is None and outcomes is None
+                                                              and not profile and logger.level < LOG_ROUND) else None
     round_num = 1
     while True:
-        print_separator()
-        logger.log(f"Round {round_num} beginning...")
+        if logger.level >= LOG_ROUND:
+            print_separator(LOG_ROUND)
+            logger.mark_round(run, round_num, table.seats)
+            logger.log(f"Round {round_num} beginning...", LOG_ROUND)
 
-        simulate_round(game, running_count, bet_histogram)
+        if history is not None:
+            history.round = round_num
+        if kernel is None or not kernel(game.deck, table, bet_histogram, stats):
+            simulate_round(game, bet_histogram, stats, history, outcomes)
 
         total_hands += 1
 
-        # Update min_reached for each player
-        for p in game.players:
-            if p.money < min_reached[p.name]:
-                min_reached[p.name] = p.money
+        # Update each player's minimum reached money
+        table.track_min()
 
         round_num += 1
 
         # Check deck percentage and reshuffle if needed
-        remaining_pct = 100 * len(game.deck.cards) / total_cards
-        if remaining_pct <= 100 - SHUFFLE_PERCENTAGE:
-            if reshuffle_count < MAX_RESHUFFLE:
+        remaining_pct = 100 * len(game.deck) / total_cards
+        if remaining_pct <= 100 - config.shuffle_percentage:
+            if reshuffle_count < config.max_reshuffle:
                 reshuffle_count += 1
-                print_separator()
-                logger.log(f"Reshuffling deck (reshuffle #{reshuffle_count})...")
-                game.deck.reshuffle()
-                total_cards = len(game.deck.cards)
-                if ENABLE_CARD_COUNTING:
-                    running_count[0] = 0
+                if logger.level >= LOG_ROUND:
+                    print_separator(LOG_ROUND)
+                    logger.log(f"Reshuffling deck (reshuffle #{reshuffle_count})...", LOG_ROUND)
+                if profile:
+                    mark = profiler.start()
+                    game.deck.reshuffle()
+                    profiler.stop('reshuffle', mark)
+                else:
+                    game.deck.reshuffle()
+                total_cards = game.deck.size
             else:
                 print_separator()
                 logger.log("Maximum reshuffles reached. Ending game.")
@@ -253,55 +464,436 @@ def simulate_game():
 
     print_separator()
     logger.log("Game Over!")
-    for p in game.players:
-        logger.log(f"Final Money for {p.name}: {p.money}")
+    seats = range(table.seats)
+    for seat in seats:
+        logger.log(f"Final Money for {table.names[seat]}: {table.money[seat]}")
     # Compute overall minimum using the tracked values
-    min_player_name, overall_min = min(min_reached.items(), key=lambda item: item[1])
-    max_player = max(game.players, key=lambda p: p.money)
-    logger.log(f"Player with Maximum Money: {max_player.name} ({max_player.money})")
+    min_seat = min(seats, key=table.min_money.__getitem__)
+    min_player_name, overall_min = table.names[min_seat], table.min_money[min_seat]
+    max_seat = max(seats, key=table.money.__getitem__)
+    logger.log(f"Player with Maximum Money: {table.names[max_seat]} ({table.money[max_seat]})")
     logger.log(f"Minimum Money Reached During Simulation: {overall_min} (by {min_player_name})")
     logger.log(f"Total Hands Played: {total_hands}")
     logger.log(f"Total Reshuffles: {reshuffle_count}")
 
-    if ENABLE_CARD_COUNTING:
-        logger.log(f"Final Running Count: {running_count[0]}")
+    if config.counting:
+        logger.log(f"Final Running Count: {game.deck.running_count}")
 
-    print("Bet Histogram:")
+    logger.log("Bet Histogram:")
     for bet, count in bet_histogram.items():
-        print(f"Bet: {bet} => {count} time(s)")
+        logger.log(f"Bet: {bet} => {count} time(s)")
 
     # Build a dictionary for each player's final money
-    players_stats = {f"final_money_{p.name}": p.money for p in game.players}
+    players_stats = {f"final_money_{table.names[seat]}": table.money[seat] for seat in seats}
     # Build a summary dictionary including the minimum reached money
     summary = {
         'total_hands': total_hands,
         'total_reshuffles': reshuffle_count,
-        'final_running_count': running_count[0] if ENABLE_CARD_COUNTING else None,
-        'max_money': max_player.money,
-        'max_money_player': max_player.name,
+        'final_running_count': game.deck.running_count if config.counting else None,
+        'max_money': table.money[max_seat],
+        'max_money_player': table.names[max_seat],
         'min_money_reached': overall_min,
         'min_money_player': min_player_name,
     }
     summary.update(players_stats)
+    if profile:
+        profiler.stop('game', game_mark)
+        profiler.count('rounds', total_hands)
     return summary
 
 
-def simulate_multiple_runs(num_runs, output_csv='src/outputs/simulation_results.csv'):
-    results = []
-    for i in range(num_runs):
-        print_separator()
-        logger.log(f"Starting simulation run #{i + 1}...")
-        result = simulate_game()
-        result['run'] = i + 1
-        results.append(result)
-    base_fields = results[0].keys()
-    with open(output_csv, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=base_fields)
-        writer.writeheader()
-        for res in results:
-            writer.writerow(res)
+def simulate_shadow_round(deck, tables, state, config=DEFAULT_CONFIG):
+    """
+    Play one round for several policies on the same cards (shadow play).
+
+    Bets are placed on the shared count and the initial cards are dealt once from
+    `deck`. Each table (one per policy, table n of the TableState `state`) then plays
+    its hands and the dealer's from the same point of the shoe through its own
+    ShoeView, so every policy sees the cards the others would have seen had they made
+    its decisions. The deck then advances by the cards the first (reference) table used,
+    so the game follows the reference policy. Every table plays the rules of `config`;
+    policies bring their own strategy and bets.
+    """
+    log_round = logger.level >= LOG_ROUND
+    seats = state.seats
+    bets = [[table.policy.bet(deck) for _ in range(seats)] for table in tables]
+    seat_codes = [[code for code in (deck.deal_code(), deck.deal_code()) if code >= 0] for _ in range(seats)]
+    dealer_codes = [code for code in (deck.deal_code(), deck.deal_code()) if code >= 0]
+    upcard_index = UPCARD_INDEX[dealer_codes[0]]
+    start = deck.position
+    consumed = 0
+    reference_units = reference_money = None
+    money = state.money
+
+    for number, (table, table_bets) in enumerate(zip(tables, bets)):
+        view = ShoeView(deck)
+        slots = range(number * seats, (number + 1) * seats)
+        if log_round:
+            print_separator(LOG_ROUND)
+            logger.log(f"Policy {table.policy.name}:", LOG_ROUND)
+        for slot, codes, bet in zip(slots, seat_codes, table_bets):
+            hand = state.start_seat(slot, bet)
+            for code in codes:
+                state.add_code(hand, code)
+        for slot in slots:
+            play_seat(state, slot, upcard_index, view, policy=table.policy, config=config)
+
+        dealer_hand = state.dealers[number]
+        dealer_hand.reset()
+        for code in dealer_codes:
+            dealer_hand.add_code(code)
+        if state.live(number):
+            dealer_total = play_dealer(dealer_hand, view, config)
+        else:
+            dealer_total = dealer_hand.value
+
+        stats = table.stats
+        units = []
+        won = []
+        for slot, bet in zip(slots, table_bets):
+            money_before = money[slot]
+            for hand in state.hand_range(slot):
+                hand_bet = state.bets[hand]
+                outcome, net = settle_hand(state.totals[hand], state.flags[hand], hand_bet, dealer_total)
+                money[slot] += net
+                if outcome == "win":
+                    stats.ev.wins += 1
+                elif outcome == "push":
+                    stats.ev.pushes += 1
+                else:
+                    stats.ev.losses += 1
+                if log_round:
+                    logger.log(f"{state.name(slot)}: {state.hand_repr(hand)} ({state.totals[hand]}) vs dealer "
+                               f"{dealer_total}: {outcome}, Bet: {hand_bet}, Player Money: {money[slot]}", LOG_ROUND)
+            units.append((money[slot] - money_before) / bet)
+            won.append(money[slot] - money_before)
+            stats.add_seat(units[-1], won[-1])
+        if number == 0:
+            consumed = view.position - start
+            reference_units, reference_money = units, won
+        else:
+            for seat in range(seats):
+                stats.paired.add(units[seat] - reference_units[seat])
+                stats.paired_money.add(won[seat] - reference_money[seat])
+
+    for _ in range(consumed):
+        deck.deal_code()
+
+
+def simulate_shadow_game(policies, seed=None, stats=None, first_shoe=0, run=None, config=None):
+    """
+    Play a game like simulate_game, but for every policy at once on shared shoes.
+
+    Args:
+        policies (list): Policy objects; the first is the reference the game follows.
+        stats (dict | None): Policy name -> ShadowStats receiving that policy's results.
+        config (GameConfig | None): Rules and shoe; the settings by default.
+
+    Returns:
+        dict: Run summary with every policy's final money per player.
+    """
+    config = config if config is not None else DEFAULT_CONFIG
+    player_names = [f"Player{i}" for i in range(1, config.num_players + 1)]
+    shoes = shoe_corpus.stream(first_shoe) if shoe_corpus is not None else None
+    deck = Deck(rng=random.Random(seed) if seed is not None else None, shoes=shoes, config=config,
+                stream=ShoeStream(seed) if config.lazy_shuffle else None)
+    stats = stats if stats is not None else {}
+    tables = [ShadowTable(policy, stats=stats.setdefault(policy.name, ShadowStats())) for policy in policies]
+    # Every policy's seats in one state, table n for policy n; money stays integral only if
+    # every policy's bets are whole amounts too
+    integral = config.integral_money and all(getattr(policy.bet, 'integral', False) for policy in policies)
+    state = TableState(player_names, tables=len(tables), initial_money=config.initial_balance,
+                       max_hands=config.max_hands, integral=integral)
+    total_hands = 0
+    reshuffle_count = 0
+    total_cards = deck.size
+    logger.log(f"Starting shadow game for {len(tables)} policies with {total_cards} cards in the deck.")
+    round_num = 1
+    while True:
+        if logger.level >= LOG_ROUND:
+            print_separator(LOG_ROUND)
+            logger.mark_round(run, round_num, len(player_names))
+            logger.log(f"Round {round_num} beginning...", LOG_ROUND)
+
+        simulate_shadow_round(deck, tables, state, config)
+
+        total_hands += 1
+        round_num += 1
+
+        # Check deck percentage and reshuffle if needed
+        remaining_pct = 100 * len(deck) / total_cards
+        if remaining_pct <= 100 - config.shuffle_percentage:
+            if reshuffle_count < config.max_reshuffle:
+                reshuffle_count += 1
+                if logger.level >= LOG_ROUND:
+                    print_separator(LOG_ROUND)
+                    logger.log(f"Reshuffling deck (reshuffle #{reshuffle_count})...", LOG_ROUND)
+                deck.reshuffle()
+                total_cards = deck.size
+            else:
+                print_separator()
+                logger.log("Maximum reshuffles reached. Ending game.")
+                break
+
+    print_separator()
+    logger.log("Game Over!")
+    summary = {
+        'total_hands': total_hands,
+        'total_reshuffles': reshuffle_count,
+        'final_running_count': deck.running_count if config.counting else None,
+    }
+    for number, table in enumerate(tables):
+        for seat, name in enumerate(state.names):
+            money = state.money[state.slot(number, seat)]
+            logger.log(f"Final Money for {name} ({table.policy.name}): {money}")
+            summary[f"{table.policy.name}_final_money_{name}"] = money
+    return summary
+
+
+def derive_run_seed(master_seed, run):
+    # Independent 64-bit seed per run, a pure function of (master seed, run number)
+    digest = hashlib.sha256(f"{master_seed}:{run}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def _init_worker(log_dir, level, echo, profile=False, profile_memory=False):
+    # Each worker process logs to its own file instead of sharing the parent's logger, at
+    # the parent logger's level and echo setting
+    global logger
+    logger = SimulationLogger(os.path.join(log_dir, f"simulation_log.{os.getpid()}.txt"), level=level, echo=echo)
+    # and keeps its own profiler, whose stats are sent back with every run
+    profiler.reset()
+    if profile:
+        profiler.enable(profile_memory)
+    else:
+        profiler.disable()
+
+
+def _simulate_run(run, master_seed, record_hands=False, record_outcomes=False, policies=None, config=None):
+    config = config if config is not None else DEFAULT_CONFIG
+    first_shoe = shoe_for_run(run, config.max_reshuffle)
+    print_separator()
+    logger.log(f"Starting simulation run #{run}...")
+    if policies:
+        # Shadow play: the reference policy's EV stands in for the run's EV
+        shadow = {}
+        result = simulate_shadow_game(policies, seed=derive_run_seed(master_seed, run), stats=shadow,
+                                      first_shoe=first_shoe, run=run, config=config)
+        result['run'] = run
+        result['ev_stats'] = shadow[policies[0].name].ev
+        result['shadow'] = shadow
+        logger.flush()
+        return result
+    # The run's EV accumulator (and hand records or outcome matrix, when asked for)
+    # travels with its result, also from worker processes; simulate_multiple_runs merges
+    # or writes them and strips them before the result is written
+    stats = EVStats()
+    history = HandRecorder(run) if record_hands else None
+    outcomes = OutcomeMatrix() if record_outcomes else None
+    result = simulate_game(seed=derive_run_seed(master_seed, run), stats=stats, first_shoe=first_shoe,
+                           run=run, history=history, outcomes=outcomes, config=config)
+    result['run'] = run
+    result['ev_stats'] = stats
+    if history is not None:
+        result['hands'] = history.rows
+    if outcomes is not None:
+        result['outcomes'] = outcomes
+    # Worker processes exit without running finalizers, so flush after every run
+    logger.flush()
+    return result
+
+
+def _simulate_run_profiled(run, master_seed, record_hands=False, record_outcomes=False, policies=None,
+                           config=None):
+    # Worker-side wrapper: returns the run's result with its profiler stats, which the
+    # parent merges and strips before the result is written
+    result = _simulate_run(run, master_seed, record_hands, record_outcomes, policies, config)
+    result['profile'] = profiler.snapshot()
+    profiler.reset()
+    return result
+
+
+def simulate_multiple_runs(num_runs, output_csv='src/outputs/simulation_results.csv', batch=False, seed=None,
+                           parallel=False, workers=None, chunk_size=RESULTS_CHUNK_SIZE, resume=False,
+                           profile=PROFILE, profile_memory=PROFILE_MEMORY,
+                           target_precision=None, confidence=0.95, hand_history=HAND_HISTORY_FILE,
+                           outcome_matrix=OUTCOME_MATRIX, policies=None, config=None):
+    # Results are streamed to disk `chunk_size` runs at a time with a checkpoint after
+    # each chunk, so memory stays flat and resume=True continues an interrupted campaign.
+    # Player EV per hand is accumulated online over all runs and reported with its
+    # confidence interval. With target_precision (e.g. 0.0005 for ±0.05%) the campaign
+    # stops after the first chunk whose interval is that tight; num_runs is then only a
+    # cap and may be None.
+    # With hand_history every hand of the scalar engine is also written, in run order, to
+    # that binary history file (see src/helpers/hand_history.py); it is checkpointed and
+    # rolled back with the results.
+    # With outcome_matrix the per-(initial hand, upcard, action, true count) outcome
+    # matrix is accumulated over all runs, reported and exported as <output>.outcomes.npz.
+    # With policies (src.strategies.policy.Policy objects) every run is played in shadow
+    # mode: all policies on the same shoes, each with its own bankroll and stats, reported
+    # with their paired EV difference from the first policy. EV, convergence and the
+    # results follow the first policy.
+    # Games are played with `config` (a GameConfig), the settings by default; it is part
+    # of the campaign, so a checkpoint only resumes with the same config.
+    config = config if config is not None else DEFAULT_CONFIG
+    if num_runs is None and target_precision is None:
+        raise ValueError("Give num_runs, target_precision or both, or the campaign never ends")
+    if hand_history and batch:
+        raise ValueError("The hand history is only recorded by the game engine (batch=False)")
+    if outcome_matrix and batch:
+        raise ValueError("The outcome matrix is only recorded by the game engine (batch=False)")
+    if policies:
+        if batch or hand_history or outcome_matrix:
+            raise ValueError("Shadow play (policies) runs on the game engine without hand history or outcome matrix")
+        if len({policy.name for policy in policies}) != len(policies):
+            raise ValueError("Policy names must be unique")
+    writer = ResultsWriter(output_csv)
+    # With profile=True the phase report is logged at the end and exported next to the
+    # results as <output>.profile.json
+    if profile:
+        profiler.reset()
+        profiler.enable(profile_memory)
+    # Every run (or batch chunk) gets its own RNG stream derived from the master seed, so
+    # the results are identical whether the runs are played serially or in parallel.
+    engine = 'batch' if batch else 'game'
+    rules = game_rules(config)
+    campaign = {'engine': engine, 'chunk_size': chunk_size, 'config': config._asdict(), 'rules': rules}
+    if shoe_corpus is not None:
+        campaign['shoe_corpus'] = shoe_corpus.path
+    if hand_history:
+        campaign['hand_history'] = hand_history
+    if outcome_matrix:
+        campaign['outcome_matrix'] = True
+    if policies:
+        campaign['policies'] = [policy.signature() for policy in policies]
+    if ROUND_KERNEL:
+        campaign['round_kernel'] = True
+    if seed is None and not (resume and os.path.exists(writer.checkpoint_file)):
+        seed = random.randrange(2 ** 32)
+    master_seed = writer.start(seed, campaign, resume=resume)
+    logger.log(f"Master seed: {master_seed}")
+    stats = EVStats()
+    outcomes = OutcomeMatrix() if outcome_matrix else None
+    shadow = {policy.name: ShadowStats() for policy in policies} if policies else None
+    history_bytes = None
+    if writer.next_run > 1:
+        logger.log(f"Resuming from run #{writer.next_run}")
+        if writer.state is not None:
+            stats = EVStats.from_dict(writer.state['ev_stats'])
+            history_bytes = writer.state.get('hand_history_bytes')
+            if outcomes is not None and 'outcomes' in writer.state:
+                outcomes = OutcomeMatrix.from_dict(writer.state['outcomes'])
+            if shadow is not None and 'shadow' in writer.state:
+                shadow = {name: ShadowStats.from_dict(data) for name, data in writer.state['shadow'].items()}
+    history_writer = HandHistoryWriter(hand_history, truncate_to=history_bytes) if hand_history else None
+    record_hands = history_writer is not None
+
+    pool = None
+    if parallel and not batch:
+        logger.flush()
+        log_dir = os.path.dirname(logger.log_file) or '.'
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(log_dir, logger.level, logger.echo, profile, profile_memory))
+    try:
+        start = writer.next_run
+        while not (target_precision is not None and stats.converged(target_precision, confidence)):
+            stop = start + chunk_size if num_runs is None else min(start + chunk_size, num_runs + 1)
+            if stop <= start:
+                break
+            runs = range(start, stop)
+            if batch:
+                # Vectorized engine: every run is one table seeded with the run's own seed, a
+                # chunk is played in lockstep; it is profiled as a whole
+                from src.engines.batch import simulate_batch
+                if profile:
+                    mark = profiler.start()
+                results = simulate_batch([derive_run_seed(master_seed, run) for run in runs], config=config,
+                                         stats=stats, corpus=shoe_corpus, first_run=start)
+                if profile:
+                    profiler.stop('batch', mark)
+                for run, result in zip(runs, results):
+                    result['run'] = run
+            elif pool is not None:
+                # map() yields results in run order regardless of which worker finished first
+                if profile:
+                    results = list(pool.map(_simulate_run_profiled, runs, [master_seed] * len(runs),
+                                            [record_hands] * len(runs), [outcome_matrix] * len(runs),
+                                            [policies] * len(runs), [config] * len(runs)))
+                    for result in results:
+                        profiler.merge(result.pop('profile'))
+                else:
+                    results = list(pool.map(_simulate_run, runs, [master_seed] * len(runs),
+                                            [record_hands] * len(runs), [outcome_matrix] * len(runs),
+                                            [policies] * len(runs), [config] * len(runs)))
+            else:
+                results = [_simulate_run(run, master_seed, record_hands, outcome_matrix, policies, config)
+                           for run in runs]
+            if not batch:
+                for result in results:
+                    stats.merge(result.pop('ev_stats'))
+            # Every row says which engine played it, and under which rules
+            for result in results:
+                result['engine'] = engine
+                result['rules'] = rules
+            state = {'ev_stats': stats.to_dict()}
+            if outcomes is not None:
+                for result in results:
+                    outcomes.merge(result.pop('outcomes'))
+                state['outcomes'] = outcomes.to_dict()
+            if shadow is not None:
+                for result in results:
+                    for name, policy_stats in result.pop('shadow').items():
+                        shadow[name].merge(policy_stats)
+                state['shadow'] = {name: policy_stats.to_dict() for name, policy_stats in shadow.items()}
+            if history_writer is not None:
+                for result in results:
+                    history_writer.write(result.pop('hands'))
+                state['hand_history_bytes'] = history_writer.flush()
+            writer.write(results, state=state)
+            start = stop
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        writer.close()
+        if history_writer is not None:
+            history_writer.close()
+        if profile:
+            profiler.disable()
     print_separator()
     logger.log(f"Simulation complete. Results saved to {output_csv}")
+    if hand_history:
+        logger.log(f"Hand history saved to {hand_history}")
+    for line in stats.report(confidence):
+        logger.log(line)
+    if shadow is not None:
+        reference = policies[0].name
+        for name, policy_stats in shadow.items():
+            print_separator()
+            logger.log(f"Policy {name}{' (reference)' if name == reference else ''}:")
+            for line in policy_stats.report(None if name == reference else reference, confidence):
+                logger.log(line)
+    if outcomes is not None:
+        outcomes_file = os.path.splitext(output_csv)[0] + '.outcomes.npz'
+        outcomes.export(outcomes_file)
+        print_separator()
+        logger.log("Outcomes by first action, and the cells losing the most units:")
+        for line in outcomes.report():
+            logger.log(line)
+        logger.log(f"Outcome matrix saved to {outcomes_file}")
+    if target_precision is not None:
+        if stats.converged(target_precision, confidence):
+            logger.log(f"Target precision ±{100 * target_precision:g}% reached after {stats.hands:,} hands "
+                       f"({start - 1:,} runs)")
+        else:
+            logger.log(f"Target precision ±{100 * target_precision:g}% not reached within {num_runs:,} runs")
+    if profile:
+        profile_file = os.path.splitext(output_csv)[0] + '.profile.json'
+        profiler.export(profile_file)
+        print_separator()
+        logger.log("Phase profile:")
+        for line in profiler.report():
+            logger.log(line)
+        logger.log(f"Profile saved to {profile_file}")
 
 
 if __name__ == "__main__":
@@ -6,18 +6,50 @@ class Suit(Enum):
     CLUBS = "♣️"
     SPADES = "♠️"
 
+
+RANKS = ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A')
+SUITS = (Suit.HEARTS, Suit.DIAMONDS, Suit.CLUBS, Suit.SPADES)
+
+# A card is encoded as a small integer: code = rank_index * 4 + suit_index (0..51).
+# The shoe only ever moves these codes around; the tables below give everything the
+# hot path needs without touching a Card object.
+CARDS_PER_DECK = len(RANKS) * len(SUITS)
+RANK_INDEX = {rank: i for i, rank in enumerate(RANKS)}
+SUIT_INDEX = {suit: i for i, suit in enumerate(SUITS)}
+
+# Per-code lookup tables
+CARD_RANK_INDEX = tuple(code >> 2 for code in range(CARDS_PER_DECK))
+CARD_RANK = tuple(RANKS[index] for index in CARD_RANK_INDEX)
+CARD_VALUE = tuple(11 if rank == 'A' else 10 if rank in ('J', 'Q', 'K') else int(rank) for rank in CARD_RANK)
+CARD_HI_LO = tuple(1 if value <= 6 else -1 if value >= 10 else 0 for value in CARD_VALUE)
+CARD_IS_ACE = tuple(rank == 'A' for rank in CARD_RANK)
+
+_card_cache = [None] * CARDS_PER_DECK
+
+
 class Card:
+    __slots__ = ('suit', 'rank', 'code')
+
     def __init__(self, suit: Suit, rank):
         self.suit = suit
         self.rank = rank
+        self.code = RANK_INDEX[rank] * 4 + SUIT_INDEX[suit]
 
     def __repr__(self):
         return f"{self.rank} of {self.suit.value}"  # suit is an instance of Suit
 
     def value(self):
-        if self.rank in ['J', 'Q', 'K']:
-            return 10
-        elif self.rank == 'A':
-            return 11
-        else:
-            return int(self.rank)
+        return CARD_VALUE[self.code]
+
+
+def card_from_code(code: int) -> Card:
+    """
+    Return the Card for an integer card code, creating it on first use.
+
+    Cards are immutable in practice, so one shared instance per code is enough for
+    logging and the GUI.
+    """
+    card = _card_cache[code]
+    if card is None:
+        card = _card_cache[code] = Card(SUITS[code & 3], RANKS[code >> 2])
+    return card
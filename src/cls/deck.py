@@ -1,26 +1,216 @@
-from src.cls.card import Card, Suit
-from src.settings import NUM_DECKS  # import number of decks from settings
+import hashlib
+import math
 import random
 
+import numpy as np
+
+from src.cls.card import CARDS_PER_DECK, CARD_RANK_INDEX, RANKS, card_from_code
+from src.config import DEFAULT_CONFIG
+from src.strategies.counting import count_tags, initial_running_count
+
+# Cards a lazy shoe shuffles past its cut card on the first deal, enough for the round
+# that crosses the cut in most games
+CUT_MARGIN = 32
+# Cards a lazy shoe shuffles at a time after that
+SHUFFLE_CHUNK = 16
+
+
+class ShoeStream:
+    """
+    Counter-based random stream for lazily shuffled shoes (NumPy's Philox).
+
+    The key is derived from (seed, stream), one stream per table. Shoe n draws from
+    counter block n of the key, one 64-bit output per shuffled card, so the cards of a
+    shoe follow from (seed, shoe number) alone: no shoe before it has to be generated,
+    and the result does not depend on how many cards are shuffled at a time.
+    """
+
+    __slots__ = ('_bit_generator', '_state')
+
+    def __init__(self, seed=None, stream=0):
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        digest = hashlib.sha256(f"{seed}:{stream}".encode()).digest()
+        self._bit_generator = np.random.Philox(key=int.from_bytes(digest[:16], 'little'))
+        self._state = self._bit_generator.state
+
+    def start(self, shoe):
+        # Jump to the start of shoe `shoe`'s block
+        self._state['state']['counter'] = np.array([0, 0, shoe, 0], dtype=np.uint64)
+        self._bit_generator.state = self._state
+
+    def indices(self, start, stop, size):
+        """
+        Fisher-Yates swap targets for positions start..stop-1 of a `size`-card shoe,
+        drawn in bulk: position i swaps with a uniform position in [i, size). An offset
+        is the top 53 bits of an output scaled to the range, so its bias is below
+        (size - i) / 2**53.
+        """
+        positions = np.arange(start, stop, dtype=np.uint64)
+        spans = np.uint64(size) - positions
+        raw = self._bit_generator.random_raw(stop - start) >> np.uint64(11)
+        return (positions + (raw * spans >> np.uint64(53))).tolist()
+
+
 class Deck:
-    def __init__(self):
-        self.cards = self._create_deck(NUM_DECKS)
+    def __init__(self, rng=None, count_system=None, shoes=None, config=None, stream=None):
+        # The shoe's size, cut and count system come from `config` (a GameConfig, the
+        # settings by default); `count_system` overrides the config's.
+        config = config if config is not None else DEFAULT_CONFIG
+        # Any object with a random.shuffle-compatible `shuffle`; the module-level
+        # generator by default, a seeded random.Random for reproducible runs.
+        self.rng = rng if rng is not None else random
+        # An iterator of pre-shuffled shoes (e.g. ShoeCorpus.stream()); when given, every
+        # shuffle takes the next shoe from it instead of permuting the cards.
+        self.shoes = shoes
+        # The shoe is a compact array of card codes, built once and reshuffled in place.
+        # Dealing just advances `position`; Card objects are only made on request.
+        self.codes = self._create_deck(config.num_decks)
+        self.size = len(self.codes)
+        self.position = 0
+        # With config.lazy_shuffle (and no pre-shuffled shoes) a shuffle only puts the
+        # cards back in order: the shoe is shuffled as it is dealt, one incremental
+        # Fisher-Yates step per card, so the cards behind the cut card are never
+        # permuted. Cards before `ready` are in their final place. Shoe n of a deck is
+        # drawn from shoe n of `stream` (a ShoeStream, unseeded by default).
+        self.lazy = config.lazy_shuffle and shoes is None
+        self.stream = (stream if stream is not None else ShoeStream()) if self.lazy else None
+        self.shoe_number = -1
+        self.cut = math.ceil(self.size * config.shuffle_percentage / 100)
+        self.ready = self.size
+        self._ordered = bytes(self.codes)
+        # Composition and count are kept up to date on every deal, so reading them is O(1)
+        self.count_system = count_system if count_system is not None else config.count_system
+        self.count_tags = count_tags(self.count_system)
+        self._reset_counts()
         self.shuffle()
 
     def _create_deck(self, num_decks):
-        cards = []
-        for _ in range(num_decks):
-            cards.extend([Card(suit, rank)
-                          for suit in [Suit.HEARTS, Suit.DIAMONDS, Suit.CLUBS, Suit.SPADES]
-                          for rank in ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']])
-        return cards
+        return bytearray(range(CARDS_PER_DECK)) * num_decks
+
+    def _reset_counts(self):
+        self.remaining = [self.size // CARDS_PER_DECK * 4] * len(RANKS)  # undealt cards per rank
+        self.running_count = initial_running_count(self.count_system, self.size // CARDS_PER_DECK)
+
+    @property
+    def cards(self):
+        # Remaining (undealt) cards, top of the shoe last, as Card objects.
+        if self.ready < self.size:
+            self.draw(self.size - 1)
+        return [card_from_code(code) for code in reversed(self.codes[self.position:])]
+
+    def __len__(self):
+        return self.size - self.position
+
+    @property
+    def decks_remaining(self):
+        return (self.size - self.position) / CARDS_PER_DECK
+
+    @property
+    def true_count(self):
+        # Running count per deck still in the shoe
+        undealt = self.size - self.position
+        return self.running_count * CARDS_PER_DECK / undealt if undealt else 0.0
 
     def shuffle(self):
-        random.shuffle(self.cards)
+        self.shoe_number += 1
+        if self.lazy:
+            self.codes[:] = self._ordered
+            self.ready = 0
+            self.stream.start(self.shoe_number)
+            return
+        if self.shoes is None:
+            self.rng.shuffle(self.codes)
+            return
+        codes = next(self.shoes)
+        if len(codes) != self.size:
+            raise ValueError(f"Pre-shuffled shoe has {len(codes)} cards, expected {self.size}")
+        self.codes = codes
+
+    def draw(self, position):
+        """
+        Shuffle a lazy shoe up to and including `position` and return the new `ready`.
+
+        The first draw of a shoe goes CUT_MARGIN cards past the cut card, later ones
+        SHUFFLE_CHUNK cards at a time.
+
+        Raises:
+            IndexError: If `position` is past the end of the shoe.
+        """
+        size = self.size
+        if position >= size:
+            raise IndexError("Deal past the end of the shoe.")
+        start = self.ready
+        if position < start:
+            return start
+        stop = min(size, max(position + 1, start + SHUFFLE_CHUNK, self.cut + CUT_MARGIN))
+        codes = self.codes
+        for i, j in zip(range(start, stop), self.stream.indices(start, stop, size)):
+            codes[i], codes[j] = codes[j], codes[i]
+        self.ready = stop
+        return stop
+
+    def deal_code(self):
+        # Deal the next card as an integer code, or -1 if the shoe is empty
+        position = self.position
+        if position >= self.ready:
+            if position >= self.size:
+                return -1
+            self.draw(position)
+        self.position = position + 1
+        code = self.codes[position]
+        self.remaining[CARD_RANK_INDEX[code]] -= 1
+        self.running_count += self.count_tags[code]
+        return code
 
     def deal(self):
-        return self.cards.pop() if self.cards else None
+        code = self.deal_code()
+        return card_from_code(code) if code >= 0 else None
 
     def reshuffle(self):
-        self.cards = self._create_deck(NUM_DECKS)
-        random.shuffle(self.cards)
+        # Every card is still in the array, so gathering the shoe is just a rewind
+        self.position = 0
+        self._reset_counts()
+        self.shuffle()
+
+
+class ShoeView:
+    """
+    Read-ahead view of a Deck for shadow play: deals the deck's next cards, in order,
+    with a count of its own, without moving the deck itself.
+
+    Several views taken at the same point see exactly the same cards, so policies played
+    through them are compared on common cards; the deck is advanced afterwards by
+    whichever view's consumption the caller chooses.
+    """
+
+    __slots__ = ('deck', 'codes', 'size', 'ready', 'position', 'running_count', 'count_tags')
+
+    def __init__(self, deck):
+        # A lazy deck is shuffled further as views read past its `ready`
+        self.deck = deck
+        self.codes = deck.codes
+        self.ready = deck.ready
+        self.size = deck.size
+        self.position = deck.position
+        self.running_count = deck.running_count
+        self.count_tags = deck.count_tags
+
+    def __len__(self):
+        return self.size - self.position
+
+    @property
+    def true_count(self):
+        undealt = self.size - self.position
+        return self.running_count * CARDS_PER_DECK / undealt if undealt else 0.0
+
+    def deal_code(self):
+        position = self.position
+        if position >= self.ready:
+            if position >= self.size:
+                return -1
+            self.ready = self.deck.draw(position)
+        self.position = position + 1
+        code = self.codes[position]
+        self.running_count += self.count_tags[code]
+        return code
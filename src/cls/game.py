@@ -1,15 +1,28 @@
 from src.cls.deck import Deck
-from src.cls.player import Player
 from src.cls.dealer import Dealer
+from src.cls.table import TableState
 from src.helpers.simulation_logger import SimulationLogger
+from src.helpers.stats import ShadowStats
+from src.config import DEFAULT_CONFIG
 import os
 
 class BlackjackGame:
-    def __init__(self, player_names, initial_money=1000):
-        self.deck = Deck()
-        self.players = [Player(name, money=initial_money) for name in player_names]
+    def __init__(self, player_names, initial_money=None, rng=None, shoes=None, config=None, stream=None):
+        # The rules and betting the game is played with (a GameConfig, the settings by default)
+        self.config = config if config is not None else DEFAULT_CONFIG
+        self.deck = Deck(rng=rng, shoes=shoes, config=self.config, stream=stream)
+        # Seat state (money, bets, hands) as arrays indexed by seat, see src.cls.table
+        self.table = TableState(player_names,
+                                initial_money=initial_money if initial_money is not None else self.config.initial_balance,
+                                max_hands=self.config.max_hands, integral=self.config.integral_money)
         self.logger = SimulationLogger(os.path.join(os.getcwd(), "src/outputs/simulation_log.txt"))
 
 
+class ShadowTable:
+    # One policy in shadow play: the policy and its stats; its seats are one table of the
+    # shadow game's TableState
+    __slots__ = ('policy', 'stats')
 
-
+    def __init__(self, policy, stats=None):
+        self.policy = policy
+        self.stats = stats if stats is not None else ShadowStats()
@@ -1,43 +1,71 @@
-from src.cls.card import Card
+from src.cls.card import Card, CARD_VALUE, CARD_IS_ACE, card_from_code
 
+# Hand.flags bits: what was done to the hand, recorded for the hand history
+DOUBLED = 1
+SPLIT_HAND = 2  # the hand is one half of a split
+SURRENDERED = 4
 
 class Hand:
+    # Running state is updated in O(1) per card: `hard_total` counts every ace as 1,
+    # `value` is the best total and `soft` is True while an ace is counted as 11.
+    __slots__ = ('codes', 'hard_total', 'aces', 'value', 'soft', 'flags')
+
     def __init__(self):
-        self.cards = []
-        self._value = None
+        self.codes = []  # integer card codes, see src.cls.card
+        self.hard_total = 0
+        self.aces = 0
+        self.value = 0
+        self.soft = False
+        self.flags = 0
+
+    def reset(self) -> None:
+        # Empty the hand for reuse, keeping its card list
+        self.codes.clear()
+        self.hard_total = self.aces = self.value = self.flags = 0
+        self.soft = False
 
     @property
-    def value(self) -> int:
-        if self._value is None:
-            self._value = self._calculate_value()
-        return self._value
+    def cards(self):
+        # Card objects are only built when something (logging, the GUI) asks for them
+        return [card_from_code(code) for code in self.codes]
 
     def add_card(self, card: Card) -> None:
-        self.cards.append(card)
-        self._value = None  # Invalidate cached value
+        self.add_code(card.code)
+
+    def add_code(self, code: int) -> None:
+        self.codes.append(code)
+        if CARD_IS_ACE[code]:
+            self.aces += 1
+            self.hard_total += 1
+        else:
+            self.hard_total += CARD_VALUE[code]
+        self._update_value()
+
+    def pop_code(self) -> int:
+        code = self.codes.pop()
+        if CARD_IS_ACE[code]:
+            self.aces -= 1
+            self.hard_total -= 1
+        else:
+            self.hard_total -= CARD_VALUE[code]
+        self._update_value()
+        return code
 
-    def _calculate_value(self) -> int:
+    def _update_value(self) -> None:
         """
-        Calculate the total value of the hand, adjusting for Aces to prevent exceeding 21.
-    
-        Returns:
-            int: The total value of the hand.
+        Recompute the best total from the running hard total, counting one Ace as 11
+        when that does not exceed 21.
         """
-        total = sum(card.value() for card in self.cards)
-        num_aces = sum(card.rank == 'A' for card in self.cards)
-
-        while total > 21 and num_aces:
-            total -= 10
-            num_aces -= 1
-        return total
+        self.soft = self.aces > 0 and self.hard_total <= 11
+        self.value = self.hard_total + 10 if self.soft else self.hard_total
 
     def get_winnings(self, dealer_value: int) -> int:
         """
         Determine the outcome (win, loss, draw) based on the hand's value and the dealer's hand value.
-    
+
         Args:
             dealer_value (int): The value of the dealer's hand.
-    
+
         Returns:
             int: -1 for loss, 1 for win, 0 for draw.
         """
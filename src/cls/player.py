@@ -1,6 +1,8 @@
 from src.cls.hand import Hand
 
 class Player:
+    __slots__ = ('name', 'money', 'hands', 'hands_bets')
+
     def __init__(self, name, money=1000):
         self.name = name
         self.money = money
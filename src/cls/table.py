@@ -0,0 +1,157 @@
+from array import array
+
+import numpy as np
+
+from src.cls.card import CARD_IS_ACE, CARD_VALUE, card_from_code
+from src.cls.hand import Hand, SURRENDERED
+from src.settings import MAX_SPLIT_ALLOWED
+
+# Card slots per hand: play stops at 21, so a hand holds at most 21 one-point cards and
+# the card that ends it
+HAND_CARDS = 22
+# State arrays with one value per seat; the others have one per hand
+_SLOT_ARRAYS = ('money', 'min_money', 'initial_bets', 'num_hands')
+
+
+class TableState:
+    """
+    Seats and hands of one or more tables of the same seats, as contiguous typed arrays.
+
+    Seat `seat` of table `table` is slot table * seats + seat. Per-slot arrays (money,
+    min_money, initial_bets, num_hands) hold one value per slot; per-hand arrays (bets,
+    hard, aces, totals, soft, flags, num_cards) hold max_hands values per slot, hand i of
+    a slot being slot * max_hands + i, and `cards` holds HAND_CARDS codes per hand.
+    Hands keep the same running state as Hand: `hard` counts every ace as 1, `totals` is
+    the best total and `soft` is 1 while an ace is counted as 11.
+
+    Money (money, min_money, initial_bets, bets) is kept as integers when `integral`,
+    for games in which every amount is a whole number (GameConfig.integral_money), and
+    as floats otherwise.
+
+    Everything is allocated once: a round starts a seat by setting its hand count back
+    (start_seat) and every hand handed out is overwritten in place, so playing rounds
+    allocates no per-seat or per-hand objects. The arrays can also be read and written
+    as NumPy arrays over the same memory (view()), for operations over whole tables.
+    """
+
+    __slots__ = ('names', 'tables', 'seats', 'max_hands', 'money', 'min_money', 'initial_bets', 'num_hands',
+                 'bets', 'hard', 'aces', 'totals', 'soft', 'flags', 'num_cards', 'cards', 'dealers',
+                 '_money_view', '_min_view')
+
+    def __init__(self, names, tables=1, initial_money=1000, max_hands=MAX_SPLIT_ALLOWED + 1, integral=False):
+        self.names = list(names)
+        self.tables = tables
+        self.seats = len(self.names)
+        self.max_hands = max_hands
+        slots = tables * self.seats
+        hands = slots * max_hands
+        money = 'q' if integral else 'd'
+        self.money = array(money, [initial_money]) * slots
+        self.min_money = array(money, [initial_money]) * slots
+        self.initial_bets = array(money, [0]) * slots
+        self.num_hands = bytearray(slots)
+        self.bets = array(money, [0]) * hands
+        self.hard = bytearray(hands)
+        self.aces = bytearray(hands)
+        self.totals = bytearray(hands)
+        self.soft = bytearray(hands)
+        self.flags = bytearray(hands)
+        self.num_cards = bytearray(hands)
+        self.cards = bytearray(hands * HAND_CARDS)
+        # One dealer hand per table, reset every round
+        self.dealers = [Hand() for _ in range(tables)]
+        self._money_view = self.view('money')
+        self._min_view = self.view('min_money')
+
+    def slot(self, table, seat):
+        return table * self.seats + seat
+
+    def name(self, slot):
+        return self.names[slot % self.seats]
+
+    def start_seat(self, slot, bet):
+        # Start a seat's round: drop its hands and return its first (empty) hand with `bet` on it
+        self.initial_bets[slot] = bet
+        self.num_hands[slot] = 0
+        return self.new_hand(slot, bet)
+
+    def new_hand(self, slot, bet):
+        # Next empty hand of a seat, overwritten in place; IndexError once a seat has max_hands hands
+        index = self.num_hands[slot]
+        if index >= self.max_hands:
+            raise IndexError("Hand index out of range.")
+        self.num_hands[slot] = index + 1
+        hand = slot * self.max_hands + index
+        self.bets[hand] = bet
+        self.hard[hand] = self.aces[hand] = self.totals[hand] = self.soft[hand] = 0
+        self.flags[hand] = self.num_cards[hand] = 0
+        return hand
+
+    def hand_range(self, slot):
+        # Indexes of a seat's hands this round
+        first = slot * self.max_hands
+        return range(first, first + self.num_hands[slot])
+
+    def add_code(self, hand, code):
+        count = self.num_cards[hand]
+        self.cards[hand * HAND_CARDS + count] = code
+        self.num_cards[hand] = count + 1
+        if CARD_IS_ACE[code]:
+            self.aces[hand] += 1
+            hard = self.hard[hand] = self.hard[hand] + 1
+        else:
+            hard = self.hard[hand] = self.hard[hand] + CARD_VALUE[code]
+        soft = self.aces[hand] and hard <= 11
+        self.soft[hand] = soft
+        self.totals[hand] = hard + 10 if soft else hard
+
+    def pop_code(self, hand):
+        count = self.num_cards[hand] - 1
+        code = self.cards[hand * HAND_CARDS + count]
+        self.num_cards[hand] = count
+        if CARD_IS_ACE[code]:
+            self.aces[hand] -= 1
+            hard = self.hard[hand] = self.hard[hand] - 1
+        else:
+            hard = self.hard[hand] = self.hard[hand] - CARD_VALUE[code]
+        soft = self.aces[hand] and hard <= 11
+        self.soft[hand] = soft
+        self.totals[hand] = hard + 10 if soft else hard
+        return code
+
+    def codes(self, hand):
+        # The hand's card codes, as bytes
+        start = hand * HAND_CARDS
+        return bytes(self.cards[start:start + self.num_cards[hand]])
+
+    def hand_repr(self, hand):
+        return ', '.join(str(card_from_code(code)) for code in self.codes(hand))
+
+    def live(self, table=0):
+        # True while some hand at the table is neither bust nor surrendered, so the dealer plays
+        for slot in range(table * self.seats, (table + 1) * self.seats):
+            for hand in self.hand_range(slot):
+                if self.totals[hand] <= 21 and not self.flags[hand] & SURRENDERED:
+                    return True
+        return False
+
+    def track_min(self):
+        # Lower every seat's minimum bankroll to its current money, all tables at once
+        np.minimum(self._min_view, self._money_view, out=self._min_view)
+
+    def view(self, name):
+        """
+        NumPy array over one of the state arrays, without copying.
+
+        Per-slot arrays are shaped (tables, seats), per-hand arrays (tables, seats,
+        max_hands) and `cards` (tables, seats, max_hands, HAND_CARDS); writes go
+        straight to the state.
+        """
+        data = getattr(self, name)
+        dtype = np.dtype(data.typecode) if isinstance(data, array) else np.uint8
+        shape = (self.tables, self.seats)
+        if name not in _SLOT_ARRAYS:
+            shape += (self.max_hands,)
+        if name == 'cards':
+            shape += (HAND_CARDS,)
+        return np.frombuffer(data, dtype=dtype).reshape(shape)
@@ -0,0 +1,61 @@
+"""
+Immutable game configuration.
+
+src/settings.py holds the defaults. A GameConfig is one set of rules and betting
+parameters built from them, with any field overridden (GameConfig(num_decks=2),
+config._replace(max_bet=200)). BlackjackGame, Deck, Dealer and the round functions
+in main.py read the config they are given instead of the module constants, so several
+configurations can be played in the same process. Configs are hashable and picklable,
+so they can key caches and travel to worker processes.
+"""
+from typing import NamedTuple
+
+from src.settings import (NUM_DECKS, SHUFFLE_PERCENTAGE, MAX_RESHUFFLE, LAZY_SHUFFLE, NUM_PLAYERS, INITIAL_BALANCE,
+                          ENABLE_CARD_COUNTING, COUNT_SYSTEM, DEVIATIONS_FILE, BET_AMOUNT, BET_RAMP, MIN_BET,
+                          MAX_BET, DEALER_STANDS_ON_SOFT_17, MAX_SPLIT_ALLOWED, DOUBLE_AFTER_SPLIT,
+                          SPLIT_ACES_ONE_CARD, LATE_SURRENDER)
+
+
+class GameConfig(NamedTuple):
+    # Shoe
+    num_decks: int = NUM_DECKS
+    shuffle_percentage: float = SHUFFLE_PERCENTAGE
+    max_reshuffle: int = MAX_RESHUFFLE
+    lazy_shuffle: bool = LAZY_SHUFFLE
+    # Table
+    num_players: int = NUM_PLAYERS
+    initial_balance: float = INITIAL_BALANCE
+    # Counting and betting
+    counting: bool = ENABLE_CARD_COUNTING
+    count_system: str = COUNT_SYSTEM
+    deviations: str = DEVIATIONS_FILE  # deviation file played on top of basic strategy (counting only)
+    bet_amount: float = BET_AMOUNT
+    bet_ramp: float = BET_RAMP
+    min_bet: float = MIN_BET
+    max_bet: float = MAX_BET
+    # Rules
+    stands_on_soft_17: bool = DEALER_STANDS_ON_SOFT_17
+    max_splits: int = MAX_SPLIT_ALLOWED
+    das: bool = DOUBLE_AFTER_SPLIT
+    split_aces_one_card: bool = SPLIT_ACES_ONE_CARD
+    surrender: bool = LATE_SURRENDER
+
+    @property
+    def max_hands(self):
+        # Hands a seat can hold in one round
+        return self.max_splits + 1
+
+    @property
+    def integral_money(self):
+        # True when every amount is a whole number and nothing pays a fraction of a bet
+        # (surrender returns half), so bankrolls and bets can be kept as integers
+        return not self.surrender and all(isinstance(amount, int) for amount in (
+            self.initial_balance, self.bet_amount, self.bet_ramp, self.min_bet, self.max_bet))
+
+    @property
+    def count_strategy_file(self):
+        # The deviation file actually played: deviations need counting
+        return self.deviations if self.counting else None
+
+
+DEFAULT_CONFIG = GameConfig()
@@ -0,0 +1,267 @@
+"""
+Bankroll and risk-of-ruin engine.
+
+simulate_game follows one bankroll per seat and run, which says little about the odds
+of going broke or how deep drawdowns get. This engine answers those questions without
+playing cards again: it takes the empirical distribution of a seat's net result per
+round, in units of the seat's initial bet and by the true count the round was bet at,
+from hand histories written by the game engine (src/helpers/hand_history.py), and
+resamples bankroll paths from it with NumPy. Each round of a path draws a true count
+with its observed frequency and a result observed at that count, staked at the bet the
+ramp places at that count. Play does not depend on the bet, so any starting balance
+and bet ramp can be evaluated from the same history. Rounds are drawn independently,
+so the correlation of counts within a shoe is not reproduced.
+
+Paths are generated a chunk of paths and a block of rounds at a time, as cumulative
+sums over an array of at most `max_cells` results drawn by uniform index into a table
+of observed results; between blocks only each path's balance, peak, largest drawdown
+and the rounds it was ruined or doubled at are kept, so memory stays bounded for
+millions of paths. A path is ruined when its balance reaches 0 or less, and stops
+there (it is dropped from the following blocks).
+
+    python -m src.engines.bankroll src/outputs/hands.bin --paths 1000000 --rounds 5000
+    python -m src.engines.bankroll src/outputs/hands.bin --balance 500 1000 2000 --ramp 0
+"""
+import argparse
+import math
+
+import numpy as np
+
+from src.helpers.hand_history import read_blocks, MIN_TRUE_COUNT, MAX_TRUE_COUNT
+from src.settings import INITIAL_BALANCE
+from src.strategies.policy import RampBet
+
+# True count buckets, truncated toward zero like the bet ramp (int(true_count)) and
+# clipped to the end buckets
+TRUE_COUNTS = np.arange(MIN_TRUE_COUNT, MAX_TRUE_COUNT + 1)
+# Results drawn per block of a chunk of paths
+MAX_CELLS = 1 << 21
+# Largest sampling table; longer histories are sampled to within 1 / TABLE_SIZE per result
+TABLE_SIZE = 1 << 21
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class OutcomeDistribution:
+    """
+    Empirical distribution of a seat's net result per round, by true count.
+
+    counts[i, j] is the number of seat rounds bet at true count TRUE_COUNTS[i] that ended
+    `values[j]` units of the initial bet up or down, over all of the seat's hands.
+    """
+
+    def __init__(self, values, counts):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.int64).reshape(len(TRUE_COUNTS), len(self.values))
+
+    @classmethod
+    def from_history(cls, paths):
+        # Seat rounds are consecutive records starting at hand 0; a round split over two
+        # blocks is carried into the next one
+        found = {}
+
+        def add(buckets, units):
+            keys, counts = np.unique(np.stack([buckets, np.round(units, 6)]), axis=1, return_counts=True)
+            for (bucket, value), count in zip(keys.T.tolist(), counts.tolist()):
+                found[int(bucket), value] = found.get((int(bucket), value), 0) + count
+
+        for path in [paths] if isinstance(paths, str) else paths:
+            carry = None
+            for block in read_blocks(path):
+                net = block['net'].astype(np.float64)
+                starts = np.flatnonzero(block['hand'] == 0)
+                head = starts[0] if len(starts) else len(net)
+                if carry is not None:
+                    carry[1] += net[:head].sum()
+                    if len(starts):
+                        add(np.array([carry[0]]), np.array([carry[1] / carry[2]]))
+                        carry = None
+                if not len(starts):
+                    continue
+                sums = np.add.reduceat(net[head:], starts - head)
+                buckets = np.clip(np.trunc(block['true_count'][starts]), MIN_TRUE_COUNT, MAX_TRUE_COUNT)
+                bets = block['bet'][starts].astype(np.float64)
+                if len(starts) > 1:
+                    add(buckets[:-1], sums[:-1] / bets[:-1])
+                carry = [buckets[-1], sums[-1], bets[-1]]
+            if carry is not None:
+                add(np.array([carry[0]]), np.array([carry[1] / carry[2]]))
+        if not found:
+            raise ValueError("No rounds in the hand history")
+        values = sorted({value for _, value in found})
+        column = {value: j for j, value in enumerate(values)}
+        counts = np.zeros((len(TRUE_COUNTS), len(values)), dtype=np.int64)
+        for (bucket, value), count in found.items():
+            counts[bucket - MIN_TRUE_COUNT, column[value]] += count
+        return cls(values, counts)
+
+    @property
+    def rounds(self):
+        return int(self.counts.sum())
+
+    def bets(self, bet):
+        # Bet per true count bucket under a RampBet
+        return np.clip(bet.base + TRUE_COUNTS * bet.ramp, bet.min_bet, bet.max_bet).astype(np.float64)
+
+    def outcomes(self, bet):
+        # Money won per round for every (true count, result) cell, and the cells' probabilities
+        money = (self.bets(bet)[:, None] * self.values[None, :]).ravel()
+        return money, self.counts.ravel() / self.rounds
+
+    def sampling_table(self, bet, size=TABLE_SIZE):
+        """
+        Money won per round, one entry per observed round (or, for histories of more than
+        `size` rounds, `size` entries spread by cumulative frequency), so that a uniform
+        index into it draws every result with its observed frequency.
+        """
+        money, probability = self.outcomes(bet)
+        if self.rounds <= size:
+            return np.repeat(money, self.counts.ravel())
+        cdf = np.cumsum(probability)
+        cdf[-1] = 1.0
+        return money[np.searchsorted(cdf, (np.arange(size) + 0.5) / size, side='right')]
+
+    def moments(self, bet):
+        # Mean and variance of the money won per round
+        money, probability = self.outcomes(bet)
+        mean = float(probability @ money)
+        return mean, float(probability @ (money * money)) - mean * mean
+
+
+def simulate_bankroll(distribution, paths=100_000, rounds=5_000, initial_balance=INITIAL_BALANCE, bet=None,
+                      seed=None, max_cells=MAX_CELLS):
+    """
+    Resample `paths` bankroll paths of `rounds` rounds each from `distribution`.
+
+    Args:
+        bet (RampBet | None): Bet ramp; the game's own bet by default.
+
+    Returns:
+        dict: Per path 'final' balance, 'max_drawdown' (largest fall from a running peak)
+            and 'ruined_at' / 'doubled_at' (round number, -1 if never), plus the inputs
+            and the per-round 'mean' and 'variance'.
+    """
+    bet = bet if bet is not None else RampBet()
+    rng = np.random.default_rng(seed)
+    table = distribution.sampling_table(bet)
+    chunk = min(paths, max(1024, max_cells // rounds))
+    final = np.empty(paths)
+    max_drawdown = np.empty(paths)
+    ruined_at = np.full(paths, -1, dtype=np.int64)
+    doubled_at = np.full(paths, -1, dtype=np.int64)
+
+    for first in range(0, paths, chunk):
+        n = min(chunk, paths - first)
+        balance = np.full(n, float(initial_balance))
+        peak = balance.copy()
+        drawdown = np.zeros(n)
+        ruined = ruined_at[first:first + n]
+        doubled = doubled_at[first:first + n]
+        # Paths still playing; ruined paths are dropped, so blocks widen as they go
+        live = np.arange(n)
+        start = 0
+        while start < rounds and len(live):
+            width = min(max(1, max_cells // len(live)), rounds - start)
+            path = table[rng.integers(0, len(table), (len(live), width))]
+            np.cumsum(path, axis=1, out=path)
+            path += balance[live, None]
+
+            below = path <= 0
+            hit = np.flatnonzero(below.any(axis=1))
+            if len(hit):
+                # A ruined path stays at the balance it was ruined with
+                at = below[hit].argmax(axis=1)
+                rows = path[hit]
+                np.copyto(rows, rows[np.arange(len(hit)), at][:, None],
+                          where=np.arange(width)[None, :] > at[:, None])
+                path[hit] = rows
+                ruined[live[hit]] = start + at + 1
+
+            reached = path >= 2 * initial_balance
+            new = np.flatnonzero((doubled[live] < 0) & reached.any(axis=1))
+            doubled[live[new]] = start + reached[new].argmax(axis=1) + 1
+
+            running = np.maximum.accumulate(path, axis=1)
+            np.maximum(running, peak[live, None], out=running)
+            drawdown[live] = np.maximum(drawdown[live], (running - path).max(axis=1))
+            peak[live] = running[:, -1]
+            balance[live] = path[:, -1]
+            live = live[ruined[live] < 0]
+            start += width
+        final[first:first + n] = balance
+        max_drawdown[first:first + n] = drawdown
+
+    mean, variance = distribution.moments(bet)
+    return {'final': final, 'max_drawdown': max_drawdown, 'ruined_at': ruined_at, 'doubled_at': doubled_at,
+            'paths': paths, 'rounds': rounds, 'initial_balance': initial_balance, 'mean': mean,
+            'variance': variance}
+
+
+def summarize(result, quantiles=QUANTILES):
+    """
+    Risk figures of a simulate_bankroll() result.
+
+    N0 is the number of rounds after which the expected win equals one standard
+    deviation of the result (variance / mean^2). The analytic risk of ruin is the
+    diffusion approximation for an unlimited number of rounds, exp(-2 mean balance /
+    variance), for comparison with the simulated, finite-horizon figure.
+    """
+    paths = result['paths']
+    mean, variance = result['mean'], result['variance']
+    ruined = result['ruined_at'] >= 0
+    doubled = result['doubled_at'] >= 0
+    ruin = float(ruined.mean())
+    return {
+        'paths': paths,
+        'rounds': result['rounds'],
+        'initial_balance': result['initial_balance'],
+        'mean': mean,
+        'sd': math.sqrt(max(variance, 0.0)),
+        'n0': variance / (mean * mean) if mean else math.inf,
+        'ruin': ruin,
+        'ruin_se': math.sqrt(ruin * (1 - ruin) / paths),
+        'analytic_ruin': math.exp(-2 * mean * result['initial_balance'] / variance) if mean > 0 else 1.0,
+        'ruin_rounds': float(np.median(result['ruined_at'][ruined])) if ruined.any() else math.nan,
+        'doubled': float(doubled.mean()),
+        'double_rounds': float(np.median(result['doubled_at'][doubled])) if doubled.any() else math.nan,
+        'drawdown': dict(zip(quantiles, np.quantile(result['max_drawdown'], quantiles).tolist())),
+        'final': dict(zip(quantiles, np.quantile(result['final'], quantiles).tolist())),
+        'final_mean': float(result['final'].mean()),
+    }
+
+
+def report(summary):
+    # Format a summarize() result as report lines
+    quantiles = ' / '.join(f"{100 * q:g}%" for q in summary['drawdown'])
+    return [
+        f"Bankroll {summary['initial_balance']:,}: {summary['paths']:,} paths of {summary['rounds']:,} rounds",
+        f"EV per round: {summary['mean']:+.4f}, SD per round: {summary['sd']:.4f}, N0: {summary['n0']:,.0f} rounds",
+        f"Risk of ruin: {100 * summary['ruin']:.3f}% ± {100 * 1.96 * summary['ruin_se']:.3f}% "
+        f"(median at round {summary['ruin_rounds']:,.0f}); unlimited rounds, analytic: "
+        f"{100 * summary['analytic_ruin']:.3f}%",
+        f"Doubled: {100 * summary['doubled']:.2f}% (median at round {summary['double_rounds']:,.0f})",
+        f"Max drawdown quantiles ({quantiles}): " + ' / '.join(f"{value:,.1f}" for value in summary['drawdown'].values()),
+        f"Final balance mean {summary['final_mean']:,.1f}, quantiles ({quantiles}): "
+        + ' / '.join(f"{value:,.1f}" for value in summary['final'].values()),
+    ]
+
+
+if __name__ == "__main__":
+    default_bet = RampBet()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('history', nargs='+', help="hand history files")
+    parser.add_argument('--paths', dest='num_paths', type=int, default=100_000)
+    parser.add_argument('--rounds', type=int, default=5_000)
+    parser.add_argument('--balance', type=float, nargs='+', default=[INITIAL_BALANCE])
+    parser.add_argument('--base', type=float, default=default_bet.base)
+    parser.add_argument('--ramp', type=float, default=default_bet.ramp)
+    parser.add_argument('--min-bet', type=float, default=default_bet.min_bet)
+    parser.add_argument('--max-bet', type=float, default=default_bet.max_bet)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    distribution = OutcomeDistribution.from_history(args.history)
+    ramp = RampBet(args.base, args.ramp, args.min_bet, args.max_bet)
+    print(f"{distribution.rounds:,} seat rounds, {len(distribution.values)} distinct results")
+    for balance in args.balance:
+        result = simulate_bankroll(distribution, args.num_paths, args.rounds, balance, ramp, args.seed)
+        for line in report(summarize(result)):
+            print(line)
@@ -0,0 +1,388 @@
+"""
+Vectorized batch simulator.
+
+Plays many independent tables (one shoe each) in lockstep with NumPy: every
+decision step is a handful of array operations over all tables that still have a
+hand in play. Each table is the batch equivalent of one `simulate_game` run and
+produces the same summary fields.
+
+Table t plays run seeds[t] of a campaign with the same GameConfig rules as the game
+engine (main.game_rules): no peek, naturals paid as plain wins, S17 or H17, doubling
+on two cards and after a split only with DAS, resplits up to max_splits, split aces
+one card when split_aces_one_card, the hard table after a hand's first two cards,
+late surrender when enabled, and the config's deviations on top of basic strategy.
+Its shoes come from a Deck built as simulate_game builds it from the run's seed
+(random shuffle, lazy Philox shoe or shoe corpus), and hands are dealt and played in
+the game engine's order, so a table deals the same cards and makes the same plays as
+the run would in the game engine.
+
+A table whose shoe runs out in the middle of a round stops there: that round is
+voided (no money changes hands and it is not counted) and the table plays no more.
+The game engine plays such a round on with the cards it has; with the usual
+penetrations no shoe ever runs out.
+"""
+import random
+
+import numpy as np
+
+from src.cls.card import CARD_IS_ACE, CARD_VALUE, CARDS_PER_DECK
+from src.cls.deck import Deck, ShoeStream
+from src.config import DEFAULT_CONFIG
+from src.helpers.shoe_corpus import shoe_for_run
+from src.helpers.stats import RunningStats
+from src.strategies.counting import count_tags, initial_running_count
+from src.strategies.basic import (STRATEGY_TABLE, ROWS_PER_CLASS, UPCARDS,
+                                  HARD, SOFT, PAIR, HIT, DOUBLE, DOUBLE_STAND, SPLIT, surrender_cells)
+from src.strategies.deviations import CountStrategy
+
+# Per-code card tables; aces count 1 here and are promoted to 11 when the hand allows
+VALUE = np.array([1 if ace else value for value, ace in zip(CARD_VALUE, CARD_IS_ACE)], dtype=np.int16)
+IS_ACE = np.array(CARD_IS_ACE, dtype=bool)
+UPCARD_INDEX = VALUE - 2 + 10 * IS_ACE  # 2..10 -> 0..8, ace -> 9
+PAIR_VALUE = VALUE + 10 * IS_ACE  # pair row of a card: 2..10, ace -> 11
+RANK = np.arange(CARDS_PER_DECK, dtype=np.int16) >> 2
+
+
+def _strategy_tables(tables):
+    # Flat strategy tables (one per true-count bucket) viewed as [bucket, hand class,
+    # total or pair value, upcard]: the hard/soft moves, and whether a pair splits
+    strategy = np.stack([np.frombuffer(table, dtype=np.uint8) for table in tables])
+    strategy = strategy.reshape(len(tables), 3, ROWS_PER_CLASS, len(UPCARDS))
+    return strategy[:, [HARD, SOFT]], strategy[:, PAIR] == SPLIT
+
+
+class BatchSimulator:
+    def __init__(self, seeds, config=DEFAULT_CONFIG, stats=None, corpus=None, first_run=1):
+        self.config = config
+        self.num_tables = num_tables = len(seeds)
+        self.num_players = num_players = config.num_players
+        self.max_hands = config.max_hands
+
+        # Table t deals the shoes of run first_run + t exactly as the game engine would:
+        # from a Deck seeded with the run's seed, or from the run's block of corpus shoes
+        self.decks = [
+            Deck(rng=random.Random(seed), config=config,
+                 shoes=corpus.stream(shoe_for_run(run, config.max_reshuffle)) if corpus is not None else None,
+                 stream=ShoeStream(seed) if config.lazy_shuffle else None)
+            for run, seed in enumerate(seeds, first_run)
+        ]
+        self.shoe_size = self.decks[0].size if seeds else config.num_decks * CARDS_PER_DECK
+        self.shoes = np.zeros((num_tables, self.shoe_size), dtype=np.uint8)
+        # Cards of each table's shoe that are in their final place (see Deck.ready)
+        self.ready = np.zeros(num_tables, dtype=np.int64)
+        for table in range(num_tables):
+            self._load_shoe(table)
+        self.position = np.zeros(num_tables, dtype=np.int64)
+        self.count_tags = np.array(count_tags(config.count_system), dtype=np.int16)
+        self.initial_count = initial_running_count(config.count_system, config.num_decks)
+        self.running_count = np.full(num_tables, self.initial_count, dtype=np.int64)
+
+        # Strategy tables per true-count bucket: just basic strategy without deviations
+        count_file = config.count_strategy_file
+        if count_file:
+            strategy = CountStrategy.load(count_file, config.count_system)
+            self.min_count, self.max_count = strategy.min_count, strategy.max_count
+            self.moves, self.splits = _strategy_tables(strategy.tables)
+        else:
+            self.min_count = self.max_count = 0
+            self.moves, self.splits = _strategy_tables([STRATEGY_TABLE])
+        self.surrender = np.zeros((ROWS_PER_CLASS, len(UPCARDS)), dtype=bool)
+        if config.surrender:
+            for total, upcard in surrender_cells(config.stands_on_soft_17):
+                self.surrender[total, upcard] = True
+
+        # Whole-number games keep money as integers, as TableState does
+        money_type = np.int64 if config.integral_money else np.float64
+        self.money = np.full((num_tables, num_players), config.initial_balance, dtype=money_type)
+        self.min_money = self.money.copy()
+        self.total_hands = np.zeros(num_tables, dtype=np.int64)
+        self.reshuffles = np.zeros(num_tables, dtype=np.int64)
+        self.active = np.ones(num_tables, dtype=bool)
+        # Tables whose shoe ran out during the current round
+        self.dry = np.zeros(num_tables, dtype=bool)
+
+        # Per-round hand state, indexed [table, seat, hand]; overwritten every round
+        shape = (num_tables, num_players, self.max_hands)
+        self.hard = np.zeros(shape, dtype=np.int16)
+        self.aces = np.zeros(shape, dtype=bool)
+        self.ncards = np.zeros(shape, dtype=np.int16)
+        self.first_rank = np.zeros(shape, dtype=np.int16)
+        self.second_card = np.zeros(shape, dtype=np.int16)
+        self.bets = np.zeros(shape, dtype=money_type)
+        self.num_hands = np.zeros((num_tables, num_players), dtype=np.int16)
+        self.surrendered = np.zeros((num_tables, num_players), dtype=bool)
+        self.dealer_hard = np.zeros(num_tables, dtype=np.int16)
+        self.dealer_aces = np.zeros(num_tables, dtype=bool)
+        # Optional EVStats fed with every seat's net units per round
+        self.stats = stats
+        self.round_bet = np.zeros(num_tables, dtype=money_type)
+
+    def _load_shoe(self, table):
+        # Copy the table's Deck's current shoe; a lazy shoe is copied again as _draw
+        # shuffles it further
+        deck = self.decks[table]
+        self.shoes[table] = np.frombuffer(deck.codes, dtype=np.uint8)
+        self.ready[table] = deck.ready
+
+    def _draw(self, tables):
+        # Deal one card to each table index in `tables`, updating the running count. A
+        # table whose shoe is empty is marked dry and gets its last card again, so the
+        # round can finish in lockstep; play_round then voids it.
+        position = self.position[tables]
+        short = position >= self.ready[tables]
+        if short.any():
+            for table, card in zip(tables[short].tolist(), position[short].tolist()):
+                if card < self.shoe_size:
+                    self.decks[table].draw(card)
+                    self._load_shoe(table)
+        empty = position >= self.shoe_size
+        if empty.any():
+            self.dry[tables[empty]] = True
+            position = np.minimum(position, self.shoe_size - 1)
+        codes = self.shoes[tables, position]
+        self.position[tables] = position + 1
+        if self.config.counting:
+            self.running_count[tables] += self.count_tags[codes] * ~empty
+        return codes
+
+    def _add_card(self, tables, seat, hands, codes):
+        ncards = self.ncards[tables, seat, hands]
+        self.hard[tables, seat, hands] += VALUE[codes]
+        self.aces[tables, seat, hands] |= IS_ACE[codes]
+        self.first_rank[tables, seat, hands] = np.where(ncards == 0, RANK[codes],
+                                                        self.first_rank[tables, seat, hands])
+        self.second_card[tables, seat, hands] = np.where(ncards == 1, codes, self.second_card[tables, seat, hands])
+        self.ncards[tables, seat, hands] = ncards + 1
+
+    def _hand_totals(self, hard, aces):
+        soft = aces & (hard <= 11)
+        return hard + 10 * soft, soft
+
+    def _true_count(self, tables):
+        # Running count per deck still in the shoe (0 for an empty shoe, as Deck.true_count)
+        undealt = self.shoe_size - self.position[tables]
+        return np.divide(self.running_count[tables] * CARDS_PER_DECK, undealt, out=np.zeros(len(tables)),
+                         where=undealt > 0)
+
+    def _bet_amount(self, tables):
+        config = self.config
+        if config.counting:
+            # Same ramp as get_bet_amount: bet_ramp per whole point of true count
+            bet = np.clip(config.bet_amount + np.trunc(self._true_count(tables)) * config.bet_ramp,
+                          config.min_bet, config.max_bet)
+            return bet.astype(self.round_bet.dtype)
+        return np.full(len(tables), config.bet_amount, dtype=self.round_bet.dtype)
+
+    def _deal_initial(self, tables):
+        first = np.zeros(len(tables), dtype=np.intp)
+        for seat in range(self.num_players):
+            for _ in range(2):
+                self._add_card(tables, seat, first, self._draw(tables))
+        upcard = self._draw(tables)
+        hole = self._draw(tables)
+        self.dealer_hard[tables] = VALUE[upcard] + VALUE[hole]
+        self.dealer_aces[tables] = IS_ACE[upcard] | IS_ACE[hole]
+        return UPCARD_INDEX[upcard]
+
+    def _play_seat(self, tables, seat, upcard_index):
+        # Each table plays the seat's hands in the game engine's order (main.play_seat):
+        # a split pushes the new hand on the table's stack and play goes on with the
+        # current hand; a finished hand is followed by the last hand pushed. Every step
+        # makes one decision for the current hand of every table still playing the seat.
+        config = self.config
+        current = np.zeros(self.num_tables, dtype=np.intp)
+        pending = np.zeros((self.num_tables, self.max_hands), dtype=np.intp)
+        num_pending = np.zeros(self.num_tables, dtype=np.intp)
+        live = tables
+        while len(live):
+            hand = current[live]
+            total, soft = self._hand_totals(self.hard[live, seat, hand], self.aces[live, seat, hand])
+            ncards = self.ncards[live, seat, hand]
+            num_hands = self.num_hands[live, seat]
+            upcard = upcard_index[live]
+            undecided = total < 21
+            row = np.minimum(total, 21)
+            two_cards = ncards == 2
+            if self.min_count == self.max_count:
+                bucket = np.zeros(len(live), dtype=np.intp)
+            else:
+                bucket = (np.clip(np.floor(self._true_count(live)), self.min_count, self.max_count)
+                          - self.min_count).astype(np.intp)
+            # The soft table and pair splitting only apply to a hand's first two cards
+            move = self.moves[bucket, (soft & two_cards).astype(np.intp), row, upcard]
+            second = self.second_card[live, seat, hand]
+            pair = (undecided & two_cards & (RANK[second] == self.first_rank[live, seat, hand])
+                    & (num_hands <= config.max_splits))
+            split = pair & self.splits[bucket, PAIR_VALUE[second], upcard]
+            undecided &= ~split
+            surrender = undecided & two_cards & ~soft & (num_hands == 1) & self.surrender[row, upcard]
+            undecided &= ~surrender
+            # Doubling needs two cards, and after a split DAS
+            can_double = two_cards & (config.das | (num_hands == 1))
+            doubles = (move == DOUBLE) | (move == DOUBLE_STAND)
+            double = undecided & doubles & can_double
+            hit = undecided & ((move == HIT) | ((move == DOUBLE) & ~can_double))
+
+            self.surrendered[live[surrender], seat] = True
+            if double.any():
+                self.bets[live[double], seat, hand[double]] *= 2
+            draw = double | hit
+            if draw.any():
+                self._add_card(live[draw], seat, hand[draw], self._draw(live[draw]))
+            one_card = np.zeros(len(live), dtype=bool)
+            if split.any():
+                one_card[split] = self._split(live[split], seat, hand[split])
+
+            # Split aces dealt one card each stand, and their new hand is never played
+            keep = hit | (split & ~one_card)
+            pushed = split & ~one_card
+            if pushed.any():
+                tables_pushed = live[pushed]
+                pending[tables_pushed, num_pending[tables_pushed]] = self.num_hands[tables_pushed, seat] - 1
+                num_pending[tables_pushed] += 1
+            finished = live[~keep]
+            resumed = finished[num_pending[finished] > 0]
+            if len(resumed):
+                num_pending[resumed] -= 1
+                current[resumed] = pending[resumed, num_pending[resumed]]
+            live = np.concatenate([live[keep], resumed])
+
+    def _split(self, tables, seat, hands):
+        # Move each hand's second card to a new hand of the seat with the same bet, then
+        # deal a card to the hand and one to the new hand, as main.handle_split does.
+        # Returns which of the splits were aces that take one card each
+        new_hands = self.num_hands[tables, seat].astype(np.intp)
+        moved = self.second_card[tables, seat, hands]
+        self.hard[tables, seat, new_hands] = 0
+        self.aces[tables, seat, new_hands] = False
+        self.ncards[tables, seat, new_hands] = 0
+        self._add_card(tables, seat, new_hands, moved)
+        self.bets[tables, seat, new_hands] = self.bets[tables, seat, hands]
+        self.num_hands[tables, seat] = new_hands + 1
+
+        self.hard[tables, seat, hands] -= VALUE[moved]
+        self.aces[tables, seat, hands] = IS_ACE[moved]
+        self.ncards[tables, seat, hands] = 1
+        self._add_card(tables, seat, hands, self._draw(tables))
+        self._add_card(tables, seat, new_hands, self._draw(tables))
+        if not self.config.split_aces_one_card:
+            return np.zeros(len(tables), dtype=bool)
+        return IS_ACE[moved]
+
+    def _play_dealer(self, tables):
+        hits_soft_17 = not self.config.stands_on_soft_17
+        live = tables
+        while len(live):
+            total, soft = self._hand_totals(self.dealer_hard[live], self.dealer_aces[live])
+            hits = (total < 17) | ((total == 17) & soft & hits_soft_17)
+            live = live[hits]
+            if len(live):
+                codes = self._draw(live)
+                self.dealer_hard[live] += VALUE[codes]
+                self.dealer_aces[live] |= IS_ACE[codes]
+
+    def _settle(self, tables):
+        # Totals are compared as main.settle_hand does; a surrendered seat loses half its bet
+        dealer_total, _ = self._hand_totals(self.dealer_hard[tables], self.dealer_aces[tables])
+        dealer_total = dealer_total[:, None, None]
+        total, _ = self._hand_totals(self.hard[tables], self.aces[tables])
+        bets = self.bets[tables]
+        in_play = np.arange(self.max_hands) < self.num_hands[tables][:, :, None]
+
+        outcome = np.where(total > 21, -1.0,
+                  np.where(dealer_total > 21, 1.0,
+                  np.sign(total - dealer_total).astype(np.float64)))
+        outcome = np.where(self.surrendered[tables][:, :, None], -0.5, outcome)
+        net = (outcome * bets * in_play).sum(axis=2)
+        self.money[tables] += net.astype(self.money.dtype)
+        if self.stats is not None:
+            self._record(tables, net, outcome, in_play)
+
+    def _record(self, tables, net, outcome, in_play):
+        # Fold this round into the EV accumulator: one sample per seat, one outcome per hand
+        units = (net / self.round_bet[tables, None]).ravel()
+        mean = units.mean()
+        self.stats.ev.merge(RunningStats(len(units), float(mean), float(((units - mean) ** 2).sum())))
+        self.stats.wins += int(((outcome > 0) & in_play).sum())
+        self.stats.pushes += int(((outcome == 0) & in_play).sum())
+        self.stats.losses += int(((outcome < 0) & in_play).sum())
+
+    def play_round(self):
+        tables = np.flatnonzero(self.active)
+        self.hard[tables] = 0
+        self.aces[tables] = False
+        self.ncards[tables] = 0
+        self.num_hands[tables] = 1
+        self.surrendered[tables] = False
+        self.bets[tables] = 0
+        self.round_bet[tables] = self._bet_amount(tables)
+        self.bets[tables, :, 0] = self.round_bet[tables, None]
+
+        # No peek: every seat plays, whatever the dealer holds
+        upcard_index = np.zeros(self.num_tables, dtype=np.intp)
+        upcard_index[tables] = self._deal_initial(tables)
+        for seat in range(self.num_players):
+            self._play_seat(tables, seat, upcard_index)
+
+        # The dealer plays while some hand is neither bust nor surrendered
+        total, _ = self._hand_totals(self.hard[tables], self.aces[tables])
+        in_play = np.arange(self.max_hands) < self.num_hands[tables][:, :, None]
+        live = (total <= 21) & in_play & ~self.surrendered[tables][:, :, None]
+        self._play_dealer(tables[live.any(axis=(1, 2))])
+        dry = self.dry[tables]
+        if dry.any():
+            # Rounds cut short by an empty shoe are voided and their tables finish
+            self.active[tables[dry]] = False
+            tables = tables[~dry]
+            if not len(tables):
+                return
+        self._settle(tables)
+
+        self.min_money[tables] = np.minimum(self.min_money[tables], self.money[tables])
+        self.total_hands[tables] += 1
+        self._check_reshuffle(tables)
+
+    def _check_reshuffle(self, tables):
+        remaining_pct = 100 * (self.shoe_size - self.position[tables]) / self.shoe_size
+        due = tables[remaining_pct <= 100 - self.config.shuffle_percentage]
+        finished = due[self.reshuffles[due] >= self.config.max_reshuffle]
+        self.active[finished] = False
+        reshuffle = due[self.reshuffles[due] < self.config.max_reshuffle]
+        if len(reshuffle):
+            self.reshuffles[reshuffle] += 1
+            for table in reshuffle:
+                self.decks[table].reshuffle()
+                self._load_shoe(table)
+            self.position[reshuffle] = 0
+            self.running_count[reshuffle] = self.initial_count
+
+    def run(self):
+        while self.active.any():
+            self.play_round()
+        return self.summaries()
+
+    def summaries(self):
+        names = [f"Player{i}" for i in range(1, self.num_players + 1)]
+        results = []
+        for table in range(self.num_tables):
+            money = self.money[table].tolist()
+            min_money = self.min_money[table].tolist()
+            max_seat = int(np.argmax(money))
+            min_seat = int(np.argmin(min_money))
+            summary = {
+                'total_hands': int(self.total_hands[table]),
+                'total_reshuffles': int(self.reshuffles[table]),
+                'final_running_count': int(self.running_count[table]) if self.config.counting else None,
+                'max_money': money[max_seat],
+                'max_money_player': names[max_seat],
+                'min_money_reached': min_money[min_seat],
+                'min_money_player': names[min_seat],
+            }
+            summary.update({f"final_money_{name}": value for name, value in zip(names, money)})
+            results.append(summary)
+        return results
+
+
+def simulate_batch(seeds, config=DEFAULT_CONFIG, stats=None, corpus=None, first_run=1):
+    # One table per run seed, all played in lockstep; `stats` (an EVStats) collects per-hand EV
+    return BatchSimulator(seeds, config=config, stats=stats, corpus=corpus, first_run=first_run).run()
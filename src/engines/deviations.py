@@ -0,0 +1,443 @@
+"""
+Count-indexed strategy deviation generator.
+
+For every strategy cell (hard total, soft total or pair against an upcard) and every
+true-count bucket, finds the best first action by simulation and writes the cells
+where it differs from basic strategy as a deviation file that
+src/strategies/deviations.CountStrategy loads.
+
+Each sample draws a shoe state whose true count, after the player's cards and the
+upcard are seen, falls in the bucket; it then plays every candidate action on the same
+card order (common random numbers). After the first action the hand continues by
+basic strategy. Because all candidates see the same cards, the paired differences
+have a far smaller variance than independent runs would. A cell stops as soon as the
+leading action beats every other by `z` standard errors. Close calls stop at
+`max_samples` and keep the basic move.
+
+The rules are those of the generic engine (main.play_seat) that plays the file: the
+dealer does not peek, so the hole card may give the dealer a natural, which is just a
+21; doubling is allowed on two cards, after a split only with `das`; pairs are resplit
+until the seat has split `max_splits` times; split aces take one card each when
+`split_aces_one_card`; after its first two cards a hand reads the hard table with its
+soft-aware total. The rules are recorded in the file.
+
+    python -m src.engines.deviations --output src/outputs/deviations.json --workers 8
+"""
+import argparse
+import hashlib
+import json
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from src.cls.card import CARDS_PER_DECK
+from src.engines.exact import ACE, full_shoe
+from src.helpers.stats import RunningStats
+from src.settings import (NUM_DECKS, COUNT_SYSTEM, DEALER_STANDS_ON_SOFT_17, SHUFFLE_PERCENTAGE, MAX_SPLIT_ALLOWED,
+                          DOUBLE_AFTER_SPLIT, SPLIT_ACES_ONE_CARD)
+from src.strategies.basic import (get_move_code, MOVE_NAMES, UPCARDS, STAND, HIT, DOUBLE, DOUBLE_STAND,
+                                  SPLIT)
+from src.strategies.counting import COUNT_SYSTEMS, initial_running_count
+
+# Candidate first actions for a pair: split it, or play it as a hard/soft total
+KEEP = -1
+# Cards drawn per sample: the hole card plus anything the player and dealer may need
+DRAWS = 40
+# Card orders played from each sampled shoe state
+ORDERS_PER_STATE = 8
+
+
+def strategy_cells():
+    # (class, row) of every cell the generator evaluates; rows as in the compiled table
+    cells = [('hard', total) for total in range(5, 20)]
+    cells += [('soft', total) for total in range(13, 21)]
+    cells += [('pair', value) for value in range(2, 12)]
+    return cells
+
+
+def _hands(hand_class, row):
+    # Two-card starting hands for a cell, as composition indexes (card value - 1)
+    if hand_class == 'hard':
+        return [(a, b) for a in range(1, 10) for b in range(a + 1, 10) if a + b + 2 == row]
+    if hand_class == 'soft':
+        return [(ACE, row - 12)]
+    index = ACE if row == 11 else row - 1
+    return [(index, index)]
+
+
+def _upcard_index(index):
+    # Strategy-table upcard index: 2..10 -> 0..8, ace -> 9
+    return 9 if index == ACE else index - 1
+
+
+def _total(hard, ace):
+    return hard + 10 if ace and hard <= 11 else hard
+
+
+def _play_basic(hard, ace, ncards, up, order, pos, can_double):
+    # Continue a hand by basic strategy; returns (final total, bet multiplier, next position).
+    # As in the generic engine, the soft table only applies to the first two cards
+    while True:
+        soft = ace and hard <= 11
+        total = hard + 10 if soft else hard
+        if total >= 21:
+            return total, 1, pos
+        move = get_move_code(total, soft and ncards == 2, 0, up)
+        if move == DOUBLE or move == DOUBLE_STAND:
+            if ncards == 2 and can_double:
+                card = order[pos]
+                return _total(hard + card + 1, ace or card == ACE), 2, pos + 1
+            move = HIT if move == DOUBLE else STAND
+        if move == STAND:
+            return total, 1, pos
+        card = order[pos]
+        pos += 1
+        hard += card + 1
+        ace = ace or card == ACE
+        ncards += 1
+
+
+def _dealer_total(hard, ace, order, pos, hits_soft_17):
+    while True:
+        soft = ace and hard <= 11
+        total = hard + 10 if soft else hard
+        if total > 17 or (total == 17 and not (soft and hits_soft_17)):
+            return total
+        card = order[pos]
+        pos += 1
+        hard += card + 1
+        ace = ace or card == ACE
+
+
+def _settle(total, multiplier, dealer_total):
+    if total > 21:
+        return -multiplier
+    if dealer_total > 21 or total > dealer_total:
+        return multiplier
+    return 0 if total == dealer_total else -multiplier
+
+
+class DeviationGenerator:
+    def __init__(self, num_decks=NUM_DECKS, count_system=COUNT_SYSTEM,
+                 stands_on_soft_17=DEALER_STANDS_ON_SOFT_17, shuffle_percentage=SHUFFLE_PERCENTAGE,
+                 das=DOUBLE_AFTER_SPLIT, max_splits=MAX_SPLIT_ALLOWED, split_aces_one_card=SPLIT_ACES_ONE_CARD,
+                 max_samples=200_000, min_samples=2_000, z=3.0):
+        self.num_decks = num_decks
+        self.count_system = count_system
+        self.hits_soft_17 = not stands_on_soft_17
+        self.das = das
+        self.max_splits = max_splits
+        self.split_aces_one_card = split_aces_one_card
+        self.shoe = full_shoe(num_decks)
+        self.size = sum(self.shoe)
+        # States are drawn from the part of the shoe that is played before the reshuffle
+        self.max_dealt = self.size * shuffle_percentage // 100
+        self.initial_count = initial_running_count(count_system, num_decks)
+        tags = COUNT_SYSTEMS[count_system]['tags']
+        self.tags = tuple(tags['A' if index == ACE else str(index + 1)] for index in range(10))
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.z = z
+
+    # --- Shoe states ----------------------------------------------------------
+
+    def _sample_state(self, rng, seen, true_count):
+        """
+        Remaining composition of a shoe whose true count is `true_count` once `seen` is out.
+
+        The depth is drawn among those from which the target is reachable, the dealt
+        cards at random; dealt cards are then swapped with undealt ones whose tag moves
+        the count towards the target until their tags add up to the running count the
+        target needs. Returns None when no swap can close the gap.
+        """
+        composition = list(self.shoe)
+        for index in seen:
+            composition[index] -= 1
+        # Shallowest depth at which `true_count` can be reached with the most extreme tags
+        max_tag = max(map(abs, self.tags))
+        scale = abs(true_count) / CARDS_PER_DECK
+        shallowest = int((scale * self.size + abs(self.initial_count) + 2 * max_tag * len(seen)) / (max_tag + scale))
+        dealt = rng.randint(min(max(len(seen), shallowest), self.max_dealt), self.max_dealt)
+        target = round(true_count * (self.size - dealt) / CARDS_PER_DECK) - self.initial_count
+        diff = target - sum(self.tags[index] for index in seen)
+
+        drawn = Counter(rng.sample(range(10), dealt - len(seen), counts=composition))
+        removed = [drawn[index] for index in range(10)]
+        for index in range(10):
+            composition[index] -= removed[index]
+        diff -= sum(tag * count for tag, count in zip(self.tags, removed))
+
+        misses = 0
+        while diff:
+            if not any(removed) or misses > 50:
+                return None
+            out = rng.choices(range(10), weights=removed)[0]
+            # Undealt cards that move the count towards the target without overshooting it
+            direction = 1 if diff > 0 else -1
+            weights = [count if 0 < (self.tags[index] - self.tags[out]) * direction <= abs(diff) else 0
+                       for index, count in enumerate(composition)]
+            if not any(weights):
+                misses += 1
+                continue
+            back = rng.choices(range(10), weights=weights)[0]
+            removed[out] -= 1
+            composition[out] += 1
+            removed[back] += 1
+            composition[back] -= 1
+            diff -= self.tags[back] - self.tags[out]
+        return composition
+
+    # --- Actions --------------------------------------------------------------
+
+    def _play_split(self, card, up, order):
+        # Play a split pair on a fixed card order: each hand draws its second card and
+        # splits again while the seat has split fewer than max_splits times; returns
+        # ([(final total, bet multiplier)], next position)
+        pair_value = 11 if card == ACE else card + 1
+        pending = 2
+        splits = 1
+        totals = []
+        pos = 0
+        while pending:
+            pending -= 1
+            drawn = order[pos]
+            pos += 1
+            hard, ace = card + drawn + 2, card == ACE or drawn == ACE
+            if card == ACE and self.split_aces_one_card:
+                totals.append((_total(hard, ace), 1))
+                continue
+            if drawn == card and splits < self.max_splits \
+                    and get_move_code(_total(hard, ace), ace, pair_value, up) == SPLIT:
+                splits += 1
+                pending += 2
+                continue
+            total, multiplier, pos = _play_basic(hard, ace, 2, up, order, pos, self.das)
+            totals.append((total, multiplier))
+        return totals, pos
+
+    def _action_ev(self, action, first, second, upcard, hole, order):
+        # Net units of one first action on a fixed card order
+        up = _upcard_index(upcard)
+        if action == SPLIT:
+            totals, pos = self._play_split(first, up, order)
+        else:
+            hard, ace = first + second + 2, first == ACE or second == ACE
+            if action == STAND:
+                total, multiplier, pos = _total(hard, ace), 1, 0
+            elif action == DOUBLE:
+                total, multiplier, pos = _total(hard + order[0] + 1, ace or order[0] == ACE), 2, 1
+            elif action == HIT:
+                total, multiplier, pos = _play_basic(hard + order[0] + 1, ace or order[0] == ACE, 3, up,
+                                                     order, 1, False)
+            else:
+                total, multiplier, pos = _play_basic(hard, ace, 2, up, order, 0, True)
+            totals = [(total, multiplier)]
+        dealer = _dealer_total(upcard + hole + 2, upcard == ACE or hole == ACE, order, pos, self.hits_soft_17)
+        return sum(_settle(total, multiplier, dealer) for total, multiplier in totals)
+
+    def _candidates(self, hand_class):
+        return (SPLIT, KEEP) if hand_class == 'pair' else (STAND, HIT, DOUBLE)
+
+    def evaluate(self, hand_class, row, upcard, true_count, seed=None):
+        """
+        Find the best first action for one cell and true-count bucket.
+
+        Args:
+            hand_class (str): 'hard', 'soft' or 'pair'.
+            row (int): Total for hard/soft cells, card value for pairs (ace = 11).
+            upcard (int): Composition index of the dealer's upcard (0 = ace, 9 = ten).
+            true_count (int): Bucket; sampled true counts are uniform in [true_count, true_count + 1).
+            seed (int | None): Seed for this cell's random stream.
+
+        Returns:
+            dict: 'best' action, 'resolved' flag, 'samples' played and the mean paired
+            EV difference of every candidate relative to the best ('margins').
+        """
+        rng = random.Random(seed)
+        hands = _hands(hand_class, row)
+        candidates = self._candidates(hand_class)
+        pairs = [(i, j) for i in range(len(candidates)) for j in range(i + 1, len(candidates))]
+        diffs = {pair: RunningStats() for pair in pairs}
+        samples = failures = 0
+        best, resolved = None, False
+
+        while samples < self.max_samples:
+            first, second = rng.choice(hands)
+            composition = self._sample_state(rng, (first, second, upcard), rng.uniform(true_count, true_count + 1))
+            if composition is None:
+                failures += 1
+                if failures > 100 and failures > 10 * samples:
+                    break  # the bucket is out of reach for this cell
+                continue
+            # The dealer does not peek, so the hole card is any card left; the order is
+            # then drawn from what remains
+            for _ in range(ORDERS_PER_STATE):
+                hole = rng.choices(range(10), weights=composition)[0]
+                composition[hole] -= 1
+                order = rng.sample(range(10), min(DRAWS, sum(composition)), counts=composition)
+                composition[hole] += 1
+                try:
+                    evs = [self._action_ev(action, first, second, upcard, hole, order) for action in candidates]
+                except IndexError:
+                    continue  # ran out of drawn cards; vanishingly rare
+                for i, j in pairs:
+                    diffs[(i, j)].add(evs[i] - evs[j])
+                samples += 1
+
+            if samples >= self.min_samples and samples % (ORDERS_PER_STATE * 250) < ORDERS_PER_STATE:
+                best, resolved = self._leader(len(candidates), diffs)
+                if resolved:
+                    break
+        if samples and not resolved:
+            best, resolved = self._leader(len(candidates), diffs)
+
+        result = {
+            'best': self._action_name(candidates[best]) if best is not None else None,
+            'resolved': resolved,
+            'samples': samples,
+            # Mean EV of each candidate minus the best one, per unit bet
+            'margins': {self._action_name(action): _paired(diffs, i, best)[0] if best is not None else None
+                        for i, action in enumerate(candidates)},
+        }
+        if hand_class != 'pair':
+            # Decides between D and Ds when doubling wins
+            result['hit_minus_stand'] = _paired(diffs, 1, 0)[0]
+        return result
+
+    def _leader(self, count, diffs):
+        # The candidate that no other beats on average, and whether it wins by z SEs against each
+        for best in range(count):
+            margins = [_paired(diffs, best, other) for other in range(count) if other != best]
+            if all(mean >= 0 for mean, _ in margins):
+                return best, all(mean > 0 and mean >= self.z * se for mean, se in margins)
+        return None, False
+
+    @staticmethod
+    def _action_name(action):
+        return 'keep' if action == KEEP else MOVE_NAMES[action]
+
+
+def _paired(diffs, i, j):
+    # (mean, standard error) of EV of candidate i minus candidate j
+    if i == j:
+        return 0.0, 0.0
+    stats = diffs[(i, j)] if i < j else diffs[(j, i)]
+    return (stats.mean if i < j else -stats.mean), stats.standard_error
+
+
+def _cell_seed(seed, *key):
+    # Independent seed per cell and bucket, a pure function of the master seed
+    digest = hashlib.sha256(":".join(map(str, (seed,) + key)).encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def _evaluate_task(params, task):
+    # Module-level so worker processes can run it
+    hand_class, row, upcard, true_count, seed = task
+    return task, DeviationGenerator(**params).evaluate(hand_class, row, upcard, true_count, seed=seed)
+
+
+def _table_move(hand_class, result):
+    # The strategy-table entry for an evaluated cell
+    best = result['best']
+    if hand_class == 'pair':
+        return "Y" if best == MOVE_NAMES[SPLIT] else "N"
+    if best == MOVE_NAMES[DOUBLE]:
+        # After doubling is no longer possible the entry falls back to hit (D) or stand (Ds)
+        return MOVE_NAMES[DOUBLE] if result['hit_minus_stand'] >= 0 else MOVE_NAMES[DOUBLE_STAND]
+    return best
+
+
+def _basic_move(hand_class, row, upcard):
+    up = _upcard_index(upcard)
+    if hand_class == 'pair':
+        return "Y" if get_move_code(0, False, row, up) == SPLIT else "N"
+    return MOVE_NAMES[get_move_code(row, hand_class == 'soft', 0, up)]
+
+
+def generate(min_count=-4, max_count=6, cells=None, seed=0, workers=None, **params):
+    """
+    Evaluate every cell and true-count bucket and collect the deviations from basic strategy.
+
+    Args:
+        min_count (int), max_count (int): Range of true-count buckets to evaluate.
+        cells (list | None): (class, row) pairs to evaluate; strategy_cells() if None.
+        seed (int): Master seed; each cell and bucket derives its own stream from it.
+        workers (int | None): Worker processes; 1 evaluates in this process.
+        **params: DeviationGenerator arguments (num_decks, count_system, max_samples, ...).
+
+    Returns:
+        dict: The deviation file contents (see CountStrategy.load).
+    """
+    generator = DeviationGenerator(**params)
+    cells = cells if cells is not None else strategy_cells()
+    if not generator.max_splits:
+        # Pairs are never split, so the pair rows are never read
+        cells = [(hand_class, row) for hand_class, row in cells if hand_class != 'pair']
+    tasks = [(hand_class, row, upcard, true_count, _cell_seed(seed, hand_class, row, upcard, true_count))
+             for hand_class, row in cells for upcard in range(10) for true_count in range(min_count, max_count + 1)]
+    if workers == 1:
+        results = [_evaluate_task(params, task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_evaluate_task, [params] * len(tasks), tasks, chunksize=4))
+
+    deviations = []
+    unresolved = samples = 0
+    for (hand_class, row, upcard, true_count, _), result in results:
+        samples += result['samples']
+        if not result['resolved']:
+            unresolved += 1
+            continue
+        move = _table_move(hand_class, result)
+        basic = _basic_move(hand_class, row, upcard)
+        # A two-card double is the same decision whether the table says D or Ds
+        if move == basic or {move, basic} == {MOVE_NAMES[DOUBLE], MOVE_NAMES[DOUBLE_STAND]}:
+            continue
+        deviations.append({
+            'class': hand_class, 'row': row, 'upcard': str(UPCARDS[_upcard_index(upcard)]),
+            'true_count': true_count, 'move': move, 'basic': basic,
+            'samples': result['samples'], 'margins': result['margins'],
+        })
+    return {
+        'count_system': generator.count_system,
+        'num_decks': generator.num_decks,
+        'hits_soft_17': generator.hits_soft_17,
+        'peek': False,
+        'das': generator.das,
+        'max_splits': generator.max_splits,
+        'split_aces_one_card': generator.split_aces_one_card,
+        'min_count': min_count,
+        'max_count': max_count,
+        'samples': samples,
+        'unresolved': unresolved,
+        'deviations': deviations,
+    }
+
+
+def _parse_cell(text):
+    hand_class, row = text.split(':')
+    return hand_class, int(row)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='src/outputs/deviations.json')
+    parser.add_argument('--min-count', type=int, default=-4)
+    parser.add_argument('--max-count', type=int, default=6)
+    parser.add_argument('--cells', nargs='+', type=_parse_cell, help="cells as class:row, e.g. hard:16 pair:10")
+    parser.add_argument('--max-samples', type=int, default=200_000)
+    parser.add_argument('--z', type=float, default=3.0, help="standard errors the best action must win by")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    table = generate(args.min_count, args.max_count, cells=args.cells, seed=args.seed, workers=args.workers,
+                     max_samples=args.max_samples, z=args.z)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(table, f, indent=2)
+    print(f"{len(table['deviations'])} deviations, {table['unresolved']} unresolved cells, "
+          f"{table['samples']:,} samples -> {args.output}")
+    for deviation in table['deviations']:
+        print(f"{deviation['class']} {deviation['row']} vs {deviation['upcard']} at TC {deviation['true_count']:+d}: "
+              f"{deviation['move']} (basic {deviation['basic']})")
@@ -0,0 +1,318 @@
+"""
+Exact (combinatorial) house-edge analyzer.
+
+Computes the dealer's final-total distribution for any upcard and shoe composition,
+and from it the expected value of playing the compiled basic strategy, under casino
+rules rather than the simulators' (main.game_rules): dealer peeks for blackjack,
+naturals pay BLACKJACK_PAYOUT, doubling on any two cards (also after a split), soft
+hands read the soft table whatever their length.
+
+A composition is a tuple of remaining card counts indexed by card value - 1
+(aces first, tens last). The dealer's possible draw sequences are enumerated once
+per upcard and weighted against a composition in one vectorized pass; the
+resulting distributions are memoized per (composition, upcard), which is what
+keeps the full calculation down to seconds.
+
+Two standard simplifications keep the calculation tractable: the player's draws are
+not conditioned on the dealer's hole card having been checked for blackjack, and
+split hands are evaluated as independent hands (resplitting up to
+MAX_SPLIT_ALLOWED is applied per hand rather than per seat).
+"""
+import numpy as np
+
+from src.settings import NUM_DECKS, DEALER_STANDS_ON_SOFT_17, BLACKJACK_PAYOUT, MAX_SPLIT_ALLOWED
+from src.strategies.basic import get_move_code, HIT, DOUBLE, DOUBLE_STAND, SPLIT
+
+ACE, TEN = 0, 9  # composition indexes
+DEALER_TOTALS = (17, 18, 19, 20, 21)
+BUST = len(DEALER_TOTALS)
+
+
+def full_shoe(num_decks=NUM_DECKS):
+    # Counts per card value for num_decks fresh decks: four of each, sixteen tens
+    return tuple([4 * num_decks] * 9 + [16 * num_decks])
+
+
+def _remove(composition, index):
+    counts = list(composition)
+    counts[index] -= 1
+    return tuple(counts)
+
+
+def _upcard_index(index):
+    # Strategy-table upcard index: 2..10 -> 0..8, ace -> 9
+    return 9 if index == ACE else index - 1
+
+
+class ExactAnalyzer:
+    def __init__(self, num_decks=NUM_DECKS, stands_on_soft_17=DEALER_STANDS_ON_SOFT_17,
+                 blackjack_payout=BLACKJACK_PAYOUT, max_splits=MAX_SPLIT_ALLOWED):
+        self.num_decks = num_decks
+        self.stands_on_soft_17 = stands_on_soft_17
+        self.blackjack_payout = blackjack_payout
+        self.max_splits = max_splits
+        self._sequences = {}
+        self._dealer_cache = {}
+        self._play_cache = {}
+
+    # --- Dealer ---------------------------------------------------------------
+
+    def _dealer_sequences(self, upcard):
+        """
+        Every way the dealer can finish from `upcard`, grouped by multiset of drawn cards.
+
+        The probability of an ordered draw sequence only depends on which cards were
+        drawn, so sequences are stored once per (multiset, final total) with a count of
+        orderings. Sequences whose hole card would give the dealer blackjack are skipped
+        because the dealer has already peeked.
+
+        Returns:
+            tuple: (draw counts per card [n, 10], number of draws [n], orderings [n], outcome index [n])
+        """
+        sequences = self._sequences.get(upcard)
+        if sequences is not None:
+            return sequences
+        peek = self._peek_card(upcard)
+        groups = {}
+
+        def walk(hard, has_ace, drawn):
+            soft = has_ace and hard <= 11
+            total = hard + 10 if soft else hard
+            if total > 21 or (total >= 17 and not (total == 17 and soft and not self.stands_on_soft_17)):
+                key = (tuple(drawn), BUST if total > 21 else DEALER_TOTALS.index(total))
+                groups[key] = groups.get(key, 0) + 1
+                return
+            for index in range(10):
+                if index == peek and not any(drawn):
+                    continue
+                drawn[index] += 1
+                walk(hard + index + 1, has_ace or index == ACE, drawn)
+                drawn[index] -= 1
+
+        walk(upcard + 1, upcard == ACE, [0] * 10)
+        draws = np.array([drawn for drawn, _ in groups], dtype=np.intp)
+        sequences = (draws, draws.sum(axis=1), np.array(list(groups.values()), dtype=np.float64),
+                     np.array([outcome for _, outcome in groups], dtype=np.intp))
+        self._sequences[upcard] = sequences
+        return sequences
+
+    def _dealer_probs(self, composition, upcard):
+        """
+        Probabilities of the dealer finishing on 17..21 or busting, given no dealer blackjack.
+
+        Memoized per (remaining composition, upcard); `composition` excludes the upcard.
+        """
+        key = (composition, upcard)
+        probs = self._dealer_cache.get(key)
+        if probs is not None:
+            return probs
+        draws, lengths, orderings, outcomes = self._dealer_sequences(upcard)
+        counts = np.array(composition, dtype=np.float64)
+        max_draws = int(lengths.max())
+
+        # falling[c, m] = counts[c] * (counts[c] - 1) * ... m terms, clamped at zero
+        steps = np.maximum(counts[:, None] - np.arange(max_draws)[None, :], 0)
+        falling = np.concatenate([np.ones((10, 1)), np.cumprod(steps, axis=1)], axis=1)
+        numerators = falling[np.arange(10), draws].prod(axis=1)
+
+        # Denominators only depend on how many cards were drawn; the hole card is drawn
+        # from the shoe minus the cards it cannot be
+        remaining = counts.sum()
+        peek = self._peek_card(upcard)
+        first = remaining - (counts[peek] if peek is not None else 0)
+        denominators = np.concatenate([[1.0], np.cumprod([first] + [remaining - k for k in range(1, max_draws)])])
+
+        # Sequences longer than the shoe allows have a zero numerator (and possibly a zero
+        # denominator); they weigh nothing
+        weights = np.divide(orderings * numerators, denominators[lengths], out=np.zeros(len(lengths)),
+                            where=numerators > 0)
+        probs = tuple(np.bincount(outcomes, weights=weights, minlength=BUST + 1).tolist())
+        self._dealer_cache[key] = probs
+        return probs
+
+    def _peek_card(self, upcard):
+        # The hole card that would give the dealer blackjack, excluded once the dealer has peeked
+        return TEN if upcard == ACE else ACE if upcard == TEN else None
+
+    def dealer_distribution(self, upcard, composition=None):
+        """
+        Distribution of the dealer's final total for an upcard, given no dealer blackjack.
+
+        Args:
+            upcard (int): Card value of the upcard (1 for an ace, 10 for any ten).
+            composition (tuple | None): Remaining counts with the upcard already removed; a full shoe minus the upcard if None.
+
+        Returns:
+            dict: {17: p, 18: p, 19: p, 20: p, 21: p, 'bust': p}
+        """
+        index = upcard - 1
+        if composition is None:
+            composition = _remove(full_shoe(self.num_decks), index)
+        probs = self._dealer_probs(composition, index)
+        return dict(zip(DEALER_TOTALS + ('bust',), probs))
+
+    # --- Player ---------------------------------------------------------------
+
+    def _ev_stand(self, composition, total, upcard):
+        if total > 21:
+            return -1.0
+        probs = self._dealer_probs(composition, upcard)
+        ev = probs[BUST]
+        for dealer_total, p in zip(DEALER_TOTALS, probs):
+            if total > dealer_total:
+                ev += p
+            elif total < dealer_total:
+                ev -= p
+        return ev
+
+    def _ev_play(self, composition, hard, has_ace, ncards, upcard):
+        # EV per unit bet of playing a (non-pair) hand by the strategy table
+        key = (composition, hard, has_ace, ncards, upcard)
+        ev = self._play_cache.get(key)
+        if ev is not None:
+            return ev
+
+        soft = has_ace and hard <= 11
+        total = hard + 10 if soft else hard
+        if total >= 21:
+            ev = self._ev_stand(composition, total, upcard)
+        else:
+            move = get_move_code(total, soft, 0, _upcard_index(upcard))
+            if ncards != 2 and move == DOUBLE:
+                move = HIT
+            remaining = sum(composition)
+            if move == DOUBLE or (move == DOUBLE_STAND and ncards == 2):
+                ev = 0.0
+                for index, count in enumerate(composition):
+                    if count:
+                        new_hard = hard + index + 1
+                        new_ace = has_ace or index == ACE
+                        new_total = new_hard + 10 if new_ace and new_hard <= 11 else new_hard
+                        ev += count / remaining * 2 * self._ev_stand(_remove(composition, index), new_total, upcard)
+            elif move == HIT:
+                ev = 0.0
+                for index, count in enumerate(composition):
+                    if count:
+                        ev += count / remaining * self._ev_play(_remove(composition, index), hard + index + 1,
+                                                                has_ace or index == ACE, ncards + 1, upcard)
+            else:
+                ev = self._ev_stand(composition, total, upcard)
+        self._play_cache[key] = ev
+        return ev
+
+    def _ev_split_hand(self, composition, pair, upcard, splits_left):
+        # One hand started from a single pair card; pairing again resplits while allowed
+        remaining = sum(composition)
+        ev = 0.0
+        for index, count in enumerate(composition):
+            if not count:
+                continue
+            p = count / remaining
+            after = _remove(composition, index)
+            if index == pair and splits_left > 0 and self._splits(pair, upcard):
+                ev += p * 2 * self._ev_split_hand(after, pair, upcard, splits_left - 1)
+            else:
+                ev += p * self._ev_play(after, pair + index + 2, pair == ACE or index == ACE, 2, upcard)
+        return ev
+
+    def _splits(self, pair, upcard):
+        return get_move_code(0, False, 11 if pair == ACE else pair + 1, _upcard_index(upcard)) == SPLIT
+
+    def hand_ev(self, first, second, upcard, composition=None):
+        """
+        EV per unit initial bet of a two-card hand against an upcard, before the dealer peeks.
+
+        Args:
+            first (int), second (int): Card values of the player's cards (1 for an ace).
+            upcard (int): Card value of the dealer's upcard.
+            composition (tuple | None): Shoe before these three cards were dealt; a full shoe if None.
+
+        Returns:
+            float: Expected net units won.
+        """
+        composition = composition if composition is not None else full_shoe(self.num_decks)
+        a, b, up = first - 1, second - 1, upcard - 1
+        composition = _remove(_remove(_remove(composition, a), b), up)
+        natural = {a, b} == {ACE, TEN}
+        peek = self._peek_card(up)
+        p_dealer_bj = composition[peek] / sum(composition) if peek is not None else 0.0
+
+        if natural:
+            return (1 - p_dealer_bj) * self.blackjack_payout
+        if a == b and self.max_splits > 0 and self._splits(a, up):
+            # Both pair cards are already out of `composition`; each split hand draws from it
+            ev = 2 * self._ev_split_hand(composition, a, up, self.max_splits - 1)
+        else:
+            ev = self._ev_play(composition, a + b + 2, ACE in (a, b), 2, up)
+        return (1 - p_dealer_bj) * ev - p_dealer_bj
+
+    def house_edge(self):
+        """
+        Exact EV of the strategy over a full shoe.
+
+        Returns:
+            dict: 'ev' (player EV per initial unit bet, negative for a house edge) and
+            'hand_evs' mapping (first, second, upcard) card values to each hand's EV and probability.
+        """
+        shoe = full_shoe(self.num_decks)
+        total_cards = sum(shoe)
+        hand_evs = {}
+        ev = 0.0
+        for up, n_up in enumerate(shoe):
+            after_up = _remove(shoe, up)
+            for a in range(10):
+                for b in range(a, 10):
+                    # Unordered two-card hand probability given the upcard
+                    p_a = after_up[a] / (total_cards - 1)
+                    p_b = (after_up[b] - (a == b)) / (total_cards - 2)
+                    p = n_up / total_cards * p_a * p_b * (1 if a == b else 2)
+                    if p <= 0:
+                        continue
+                    hand = self.hand_ev(a + 1, b + 1, up + 1)
+                    hand_evs[(a + 1, b + 1, up + 1)] = {'ev': hand, 'probability': p}
+                    ev += p * hand
+        return {'ev': ev, 'hand_evs': hand_evs}
+
+
+def _composition(**counts):
+    # Composition from counts by card value name, e.g. _composition(eight=2, ten=3)
+    names = ('ace', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten')
+    return tuple(counts.get(name, 0) for name in names)
+
+
+def verify():
+    """
+    Check split EVs against hands worked out by hand.
+
+    8,8 against a 6 is played from shoes holding only eights, tens and the six: the
+    dealer then always busts (6 plus two cards of 8 or more) and every split hand
+    stands on 16 or 18 and wins, so the EV is the expected number of hands. With no
+    eight left there is no resplit (EV 2); with one eight among three tens each split
+    hand resplits with probability 1/4 (EV 2 * (1/4 * 2 + 3/4) = 2.5).
+
+    Returns:
+        list: (case, expected, computed) per check.
+    """
+    cases = [
+        ("8,8 vs 6, no eight left", _composition(six=1, eight=2, ten=3), 3, 2.0),
+        ("8,8 vs 6, one eight left", _composition(six=1, eight=3, ten=3), 3, 2.5),
+        ("8,8 vs 6, one eight left, no resplit", _composition(six=1, eight=3, ten=3), 1, 2.0),
+    ]
+    return [(case, expected, ExactAnalyzer(num_decks=1, max_splits=max_splits).hand_ev(8, 8, 6, composition))
+            for case, composition, max_splits, expected in cases]
+
+
+if __name__ == "__main__":
+    failed = False
+    for case, expected, computed in verify():
+        failed = failed or not abs(computed - expected) <= 1e-12
+        print(f"{case}: expected {expected:+.4f}, computed {computed:+.4f}")
+    if failed:
+        raise SystemExit(1)
+    analyzer = ExactAnalyzer()
+    result = analyzer.house_edge()
+    print(f"{analyzer.num_decks} decks, player EV: {100 * result['ev']:.4f}% per initial bet")
+    for upcard in range(2, 12):
+        dist = analyzer.dealer_distribution(1 if upcard == 11 else upcard)
+        print(f"Upcard {'A' if upcard == 11 else upcard}: " +
+              ", ".join(f"{total}: {p:.4f}" for total, p in dist.items()))
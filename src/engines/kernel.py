@@ -0,0 +1,401 @@
+"""
+Rule-specialized round kernels.
+
+The generic round (simulate_round / play_seat in main.py) re-reads every rule switch
+on every card and decision. compile_round() instead generates the source of a round
+function for one frozen RoundRules, with every disabled feature left out of the code
+(no count upkeep without counting, no surrender, DAS or split-ace checks unless the
+rules need them, the dealer's soft-17 rule fixed in the loop condition, doubling on two
+cards only folded into a separate table for longer hands), compiles it once and caches
+it per rules.
+
+A kernel plays a whole round on the deck's card array with local variables only and
+writes the shoe position, count, seats' money (table 0 of a TableState), bet histogram
+and EV stats back at the end. If the shoe runs out mid-round it writes nothing and returns False, so the
+caller can play that round with the generic engine instead; bounds are never checked
+on the way.
+
+The rules are those of the generic engine: a seat may split up to `max_splits` times,
+each split hand's bet is the bet it was split from, split hands are played depth first
+in the order they were split off and doubling doubles the bet of the hand that
+doubles. verify() plays the same rounds through a kernel and the generic engine and
+compares them:
+
+    python -m src.engines.kernel --rounds 200000
+"""
+import argparse
+import linecache
+import math
+import random
+import time
+from typing import NamedTuple
+
+from src.cls.card import CARDS_PER_DECK, CARD_IS_ACE, CARD_RANK_INDEX, CARD_VALUE
+from src.cls.deck import Deck, ShoeStream
+from src.cls.table import TableState
+from src.config import DEFAULT_CONFIG
+from src.helpers.stats import EVStats
+from src.settings import (ENABLE_CARD_COUNTING, DEALER_STANDS_ON_SOFT_17, MAX_SPLIT_ALLOWED,
+                          DOUBLE_AFTER_SPLIT, SPLIT_ACES_ONE_CARD, LATE_SURRENDER,
+                          BET_AMOUNT, BET_RAMP, MIN_BET, MAX_BET, LAZY_SHUFFLE, COUNT_SYSTEM)
+from src.strategies.basic import (STRATEGY_TABLE, ROWS_PER_CLASS, UPCARD_INDEX, SOFT, PAIR, STAND, HIT, DOUBLE,
+                                  DOUBLE_STAND, SPLIT, surrender_cells)
+from src.strategies.deviations import CountStrategy
+
+
+class RoundRules(NamedTuple):
+    # Everything a kernel is specialized on; immutable and hashable, so it keys the cache
+    counting: bool = ENABLE_CARD_COUNTING
+    count_system: str = COUNT_SYSTEM  # the deck's; a deviation file must be for the same system
+    stands_on_soft_17: bool = DEALER_STANDS_ON_SOFT_17
+    das: bool = DOUBLE_AFTER_SPLIT
+    max_splits: int = MAX_SPLIT_ALLOWED
+    split_aces_one_card: bool = SPLIT_ACES_ONE_CARD
+    surrender: bool = LATE_SURRENDER
+    deviations: str = None  # deviation file played on top of basic strategy (counting only)
+    bet_amount: int = BET_AMOUNT
+    bet_ramp: int = BET_RAMP
+    min_bet: int = MIN_BET
+    max_bet: int = MAX_BET
+    lazy_shuffle: bool = LAZY_SHUFFLE  # deals check the shoe's shuffled bound (Deck.ready)
+
+    @classmethod
+    def from_config(cls, config):
+        # The rules the generic engine plays under a GameConfig
+        return cls(**{field: getattr(config, field) for field in cls._fields})._replace(
+            deviations=config.count_strategy_file)
+
+    @classmethod
+    def from_settings(cls):
+        # The rules the generic engine plays under the current settings
+        return cls.from_config(DEFAULT_CONFIG)
+
+    def to_config(self, base=DEFAULT_CONFIG):
+        # `base` with these rules, for playing them with the generic engine
+        return base._replace(**self._asdict())
+
+
+# Kernel template. Lines tagged "@name" are kept only when feature `name` is on ("@!name"
+# when it is off); "DEAL x" deals the next card into x.
+_TEMPLATE = '''
+def play_round(deck, state, bet_histogram, stats):
+    codes = deck.codes
+    size = deck.size
+@lazy    ready = deck.ready
+    start = pos = deck.position
+@counting    tags = deck.count_tags
+@counting    rc = deck.running_count
+@counting    undealt = size - pos
+@counting    bet = max(MIN_BET, min(BET_AMOUNT + int(rc * CARDS_PER_DECK / undealt if undealt else 0.0) * BET_RAMP, MAX_BET))
+@!counting    bet = BET_AMOUNT
+@!deviations    table = STRATEGY_TABLE
+@!deviations    multi = MULTI_CARD_TABLE
+    try:
+        seat_cards = []
+        for _ in range(state.seats):
+            DEAL a
+            DEAL b
+            seat_cards.append((a, b))
+        DEAL d1
+        DEAL d2
+        up = UPCARD_INDEX[d1]
+        seats = []
+        live = False
+        for a, b in seat_cards:
+            hands = [[HARD[a] + HARD[b], IS_ACE[a] or IS_ACE[b], 2, a, b]]
+            bets = [bet]
+            splits = 0
+            surrendered = False
+            i = 0
+            while i < len(hands):
+                hard, ace, ncards, first, second = hands[i]
+                while True:
+                    total = hard + 10 if ace and hard <= 11 else hard
+                    if total >= 21:
+                        break
+@split_aces                    if not ncards:
+@split_aces                        break
+@deviations                    undealt = size - pos
+@deviations                    bucket = min(max(floor(rc * CARDS_PER_DECK / undealt if undealt else 0.0), MIN_COUNT), MAX_COUNT) - MIN_COUNT
+                    # The soft table, pair splitting and doubling only apply to the first two cards
+                    if ncards == 2:
+@deviations                        table = TABLES[bucket]
+                        if (splits < MAX_SPLITS and RANK[first] == RANK[second]
+                                and table[PAIR_ROW + VALUE[first] * 10 + up] == SPLIT):
+                            splits += 1
+                            DEAL c
+                            DEAL e
+@split_aces                            # Split aces take one card each and stand (ncards 0)
+@split_aces                            ncards = 0 if IS_ACE[first] else 2
+                            hands.insert(i + 1, [HARD[second] + HARD[e], IS_ACE[second] or IS_ACE[e], ncards, second, e])
+                            bets.insert(i + 1, bets[i])
+                            hard, ace, second = HARD[first] + HARD[c], IS_ACE[first] or IS_ACE[c], c
+                            continue
+@surrender                        if not splits and not ace and (total, up) in SURRENDER:
+@surrender                            surrendered = True
+@surrender                            break
+                        move = table[((SOFT_ROW if ace else 0) + total) * 10 + up]
+@!das                        if splits and (move == DOUBLE or move == DOUBLE_STAND):
+@!das                            move = HIT if move == DOUBLE else STAND
+                    else:
+@deviations                        move = MULTI_CARD_TABLES[bucket][total * 10 + up]
+@!deviations                        move = multi[total * 10 + up]
+                    if move == HIT:
+                        DEAL c
+                        hard += HARD[c]
+                        ace = ace or IS_ACE[c]
+                        ncards += 1
+                    elif move == DOUBLE or move == DOUBLE_STAND:
+                        DEAL c
+                        hard += HARD[c]
+                        ace = ace or IS_ACE[c]
+                        bets[i] *= 2
+                        break
+                    else:
+                        break
+                total = hard + 10 if ace and hard <= 11 else hard
+                hands[i] = total
+                if total <= 21 and not surrendered:
+                    live = True
+                i += 1
+            seats.append((hands, bets, surrendered))
+
+        dhard = HARD[d1] + HARD[d2]
+        dace = IS_ACE[d1] or IS_ACE[d2]
+        dtotal = dhard + 10 if dace and dhard <= 11 else dhard
+        if live:
+@s17            while dtotal < 17:
+@!s17            while dtotal < 17 or (dtotal == 17 and dace and dhard <= 11):
+                DEAL c
+                dhard += HARD[c]
+                dace = dace or IS_ACE[c]
+                dtotal = dhard + 10 if dace and dhard <= 11 else dhard
+    except IndexError:
+        return False
+
+    deck.position = pos
+@counting    deck.running_count = rc
+@counting    remaining = deck.remaining
+@counting    for code in codes[start:pos]:
+@counting        remaining[RANK[code]] -= 1
+    bet_histogram[bet] = bet_histogram.get(bet, 0) + state.seats
+    money = state.money
+    for seat, (totals, bets, surrendered) in enumerate(seats):
+        if surrendered:
+            net = -bet / 2
+            if stats is not None:
+                stats.losses += 1
+        else:
+            net = 0
+            for total, hand_bet in zip(totals, bets):
+                if total > 21 or (dtotal <= 21 and total < dtotal):
+                    net -= hand_bet
+                    if stats is not None:
+                        stats.losses += 1
+                elif dtotal > 21 or total > dtotal:
+                    net += hand_bet
+                    if stats is not None:
+                        stats.wins += 1
+                elif stats is not None:
+                    stats.pushes += 1
+        money[seat] += net
+        if stats is not None:
+            stats.add_hand(net / bet)
+    return True
+'''
+
+_kernels = {}
+
+
+def _multi_card_table(table):
+    # Hard rows of a strategy table with doubles turned into hits (D) or stands (Ds), for
+    # hands of three or more cards
+    return bytes(HIT if move == DOUBLE else STAND if move == DOUBLE_STAND else move
+                 for move in table[:ROWS_PER_CLASS * 10])
+
+
+def kernel_source(rules):
+    # Source of the kernel for `rules`, with the feature tags resolved and deals expanded
+    features = {'counting': rules.counting, 'deviations': rules.deviations is not None,
+                's17': rules.stands_on_soft_17, 'das': rules.das, 'surrender': rules.surrender,
+                'split_aces': rules.split_aces_one_card, 'lazy': rules.lazy_shuffle}
+    lines = []
+    for line in _TEMPLATE.splitlines():
+        if line.startswith('@'):
+            tag = line.split(' ', 1)[0]
+            line = line[len(tag):]
+            if features[tag.lstrip('@!')] == tag.startswith('@!'):
+                continue
+        body = line.lstrip()
+        if body.startswith('DEAL '):
+            indent = line[:len(line) - len(body)]
+            name = body[5:]
+            if rules.lazy_shuffle:
+                # Past the shuffled cards the deck shuffles more (IndexError at the end of the shoe)
+                lines.append(f"{indent}if pos >= ready:")
+                lines.append(f"{indent}    ready = deck.draw(pos)")
+            lines.append(f"{indent}{name} = codes[pos]")
+            lines.append(f"{indent}pos += 1")
+            if rules.counting:
+                lines.append(f"{indent}rc += tags[{name}]")
+            continue
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def compile_round(rules=None):
+    """
+    Return the round kernel for `rules` (the settings' rules by default), generating it
+    on first use.
+
+    The kernel is called as kernel(deck, table, bet_histogram, stats), `table` being a
+    TableState whose first table it plays, and returns
+    False, leaving everything untouched, when the shoe runs out during the round. Without
+    counting it does not keep the deck's running count or composition up to date.
+    """
+    rules = rules if rules is not None else RoundRules.from_settings()
+    kernel = _kernels.get(rules)
+    if kernel is not None:
+        return kernel
+    if rules.deviations is not None and not rules.counting:
+        raise ValueError("Deviations need counting enabled")
+    namespace = {
+        'CARDS_PER_DECK': CARDS_PER_DECK, 'STRATEGY_TABLE': STRATEGY_TABLE, 'UPCARD_INDEX': UPCARD_INDEX,
+        'MULTI_CARD_TABLE': _multi_card_table(STRATEGY_TABLE),
+        'HARD': tuple(1 if ace else value for value, ace in zip(CARD_VALUE, CARD_IS_ACE)),
+        'IS_ACE': CARD_IS_ACE, 'RANK': CARD_RANK_INDEX, 'VALUE': CARD_VALUE,
+        'SOFT_ROW': SOFT * ROWS_PER_CLASS, 'PAIR_ROW': PAIR * ROWS_PER_CLASS * 10,
+        'HIT': HIT, 'DOUBLE': DOUBLE, 'DOUBLE_STAND': DOUBLE_STAND, 'SPLIT': SPLIT, 'STAND': STAND,
+        'MAX_SPLITS': rules.max_splits, 'SURRENDER': surrender_cells(rules.stands_on_soft_17),
+        'BET_AMOUNT': rules.bet_amount, 'BET_RAMP': rules.bet_ramp, 'MIN_BET': rules.min_bet,
+        'MAX_BET': rules.max_bet, 'floor': math.floor,
+    }
+    if rules.deviations is not None:
+        strategy = CountStrategy.load(rules.deviations, rules.count_system)
+        namespace.update(TABLES=strategy.tables, MULTI_CARD_TABLES=[_multi_card_table(table) for table in strategy.tables],
+                         MIN_COUNT=strategy.min_count, MAX_COUNT=strategy.max_count)
+    source = kernel_source(rules)
+    # Registered with linecache so tracebacks and profilers can show the generated lines
+    filename = f"<round kernel {len(_kernels)}>"
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    exec(compile(source, filename, 'exec'), namespace)
+    kernel = _kernels[rules] = namespace['play_round']
+    return kernel
+
+
+def verify(rules=None, rounds=100_000, seed=0):
+    """
+    Play `rounds` rounds from the same shoe states through the kernel for `rules` and
+    the generic engine (run with the same rules), and compare every seat's money, the
+    win/push/loss counts, the cards used and the count. Rounds where the shoe runs out
+    are skipped and counted.
+
+    Returns:
+        dict: 'compared', 'skipped' and 'mismatches' (round numbers) counts.
+    """
+    import main
+    from src.cls.game import BlackjackGame
+    from src.helpers.simulation_logger import LOG_OFF
+
+    rules = rules if rules is not None else RoundRules.from_settings()
+    kernel = compile_round(rules)
+    config = rules.to_config()
+    level, main.logger.level = main.logger.level, LOG_OFF
+    try:
+        game = BlackjackGame([f"Player{i}" for i in range(1, config.num_players + 1)], rng=random.Random(seed),
+                             config=config, stream=ShoeStream(seed) if config.lazy_shuffle else None)
+        deck = game.deck
+        table = TableState(game.table.names, initial_money=config.initial_balance, integral=config.integral_money)
+        compared = skipped = 0
+        mismatches = []
+        for number in range(1, rounds + 1):
+            state = (deck.position, deck.running_count, list(deck.remaining))
+            kernel_stats, generic_stats = EVStats(), EVStats()
+            played = kernel(deck, table, {}, kernel_stats)
+            kernel_state = (deck.position, deck.running_count, list(deck.remaining))
+            deck.position, deck.running_count, deck.remaining = state
+            main.simulate_round(game, {}, generic_stats)
+            if not played:
+                skipped += 1
+            else:
+                compared += 1
+                same = (table.money == game.table.money
+                        and kernel_stats.to_dict() == generic_stats.to_dict()
+                        and (kernel_state[0] == deck.position if not rules.counting
+                             else kernel_state == (deck.position, deck.running_count, deck.remaining)))
+                if not same:
+                    mismatches.append(number)
+            table.money[:] = game.table.money
+            if 100 * len(deck) / deck.size <= 100 - config.shuffle_percentage:
+                deck.reshuffle()
+    finally:
+        main.logger.level = level
+    return {'compared': compared, 'skipped': skipped, 'mismatches': mismatches}
+
+
+def _rounds_per_second(play, rounds, seed, config=DEFAULT_CONFIG):
+    deck = Deck(rng=random.Random(seed), config=config,
+                stream=ShoeStream(seed) if config.lazy_shuffle else None)
+    table = TableState([f"Player{i}" for i in range(1, config.num_players + 1)], integral=config.integral_money)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        play(deck, table)
+        if 100 * len(deck) / deck.size <= 100 - config.shuffle_percentage:
+            deck.reshuffle()
+    return rounds / (time.perf_counter() - start)
+
+
+def benchmark(rules=None, rounds=100_000, seed=0):
+    # Rounds per second of the kernel and of the generic engine on the same shoes
+    import main
+    from src.helpers.simulation_logger import LOG_OFF
+
+    kernel = compile_round(rules)
+    level, main.logger.level = main.logger.level, LOG_OFF
+
+    class Game:
+        __slots__ = ('deck', 'table', 'config')
+
+    game = Game()
+    game.config = rules.to_config() if rules is not None else DEFAULT_CONFIG
+
+    def generic(deck, table):
+        game.deck, game.table = deck, table
+        main.simulate_round(game, {}, None)
+
+    try:
+        return {'kernel': _rounds_per_second(lambda deck, table: kernel(deck, table, {}, None), rounds, seed,
+                                             game.config),
+                'generic': _rounds_per_second(generic, rounds, seed, game.config)}
+    finally:
+        main.logger.level = level
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--source', action='store_true', help="print the kernel for the settings' rules and exit")
+    args = parser.parse_args()
+    base = RoundRules.from_settings()
+    if args.source:
+        print(kernel_source(base))
+        raise SystemExit
+    variants = [base, base._replace(counting=not base.counting, deviations=None),
+                base._replace(stands_on_soft_17=not base.stands_on_soft_17),
+                base._replace(das=not base.das, split_aces_one_card=not base.split_aces_one_card,
+                              surrender=not base.surrender, max_splits=1),
+                base._replace(lazy_shuffle=not base.lazy_shuffle)]
+    failed = False
+    for rules in variants:
+        result = verify(rules, args.rounds, args.seed)
+        failed = failed or bool(result['mismatches'])
+        print(f"counting={rules.counting} s17={rules.stands_on_soft_17} das={rules.das} "
+              f"split_aces_one_card={rules.split_aces_one_card} surrender={rules.surrender} "
+              f"max_splits={rules.max_splits} deviations={rules.deviations} lazy_shuffle={rules.lazy_shuffle}: "
+              f"{result['compared']:,} rounds identical to the generic engine, {result['skipped']:,} skipped, "
+              f"{len(result['mismatches']):,} mismatches {result['mismatches'][:10]}")
+    speed = benchmark(base, args.rounds, args.seed)
+    print(f"kernel {speed['kernel']:,.0f} rounds/s, generic {speed['generic']:,.0f} rounds/s "
+          f"({speed['kernel'] / speed['generic']:.1f}x)")
+    raise SystemExit(1 if failed else 0)
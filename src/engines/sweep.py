@@ -0,0 +1,287 @@
+"""
+Parameter sweeps over game configurations, with results cached per cell.
+
+A grid maps GameConfig fields to the values to try; every combination is one cell,
+played as `runs` seeded runs of the generic engine (main.simulate_game) and reduced to
+aggregates: the EV accumulator, mean final and minimum money and rounds played. All
+cells share the master seed, so cells with the same shoe size play the same shuffles
+and their differences are not swamped by card luck.
+
+Each finished cell is written to the cache directory as <key>.json, the key being a
+hash of the cell's config, seed, run count, the shoe corpus dealt from (path and
+size), the SHA-256 of the deviation file played and main.ENGINE_VERSION. Running a
+sweep again only plays the cells that are not cached yet, so widening a grid or
+tweaking one axis reuses everything already computed. The key cannot see code
+changes: bump main.ENGINE_VERSION with any change that alters a seeded game (see the
+comment there), which invalidates every cached cell.
+
+    python -m src.engines.sweep --grid num_decks=1,2,6 shuffle_percentage=50,75 --runs 200 --workers 8
+    python -m src.engines.sweep --grid bet_ramp=0,10,20 max_bet=100,200 --runs 500 --output spread.csv
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import main
+from src.config import DEFAULT_CONFIG, GameConfig
+from src.helpers.shoe_corpus import shoe_for_run
+from src.helpers.simulation_logger import LOG_OFF
+from src.helpers.stats import EVStats
+
+CACHE_DIR = 'src/outputs/sweep_cache'
+_TRUE = ('1', 'true', 'yes', 'on')
+_FALSE = ('0', 'false', 'no', 'off')
+
+
+def expand(grid, base=DEFAULT_CONFIG):
+    """
+    Every combination of a grid, as configs.
+
+    Args:
+        grid (dict): GameConfig field -> list of values; fields not in it keep `base`'s value.
+        base (GameConfig): The config the cells vary.
+
+    Returns:
+        list: One GameConfig per cell, the last field of the grid varying fastest.
+    """
+    unknown = set(grid) - set(GameConfig._fields)
+    if unknown:
+        raise ValueError(f"Unknown config fields: {', '.join(sorted(unknown))}")
+    fields = list(grid)
+    return [base._replace(**dict(zip(fields, values))) for values in itertools.product(*grid.values())]
+
+
+def _file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _cell_inputs(config, seed, runs):
+    # Everything besides the code that decides a cell's results: the config, seed and run
+    # count, the shoe corpus dealt from and the contents of the deviation file played
+    corpus = main.shoe_corpus
+    deviations = config.count_strategy_file
+    return {
+        'config': config._asdict(), 'seed': seed, 'runs': runs, 'engine_version': main.ENGINE_VERSION,
+        'corpus': {'path': os.path.abspath(corpus.path), 'num_shoes': corpus.num_shoes} if corpus else None,
+        'deviations_sha256': _file_sha256(deviations) if deviations else None,
+    }
+
+
+def cell_key(config, seed, runs):
+    # Cache key of a cell: anything that changes its results changes the key. Whole floats
+    # hash as ints, so 75 and 75.0 are the same cell
+    data = _cell_inputs(config, seed, runs)
+    data['config'] = {field: int(value) if isinstance(value, float) and value.is_integer() else value
+                      for field, value in data['config'].items()}
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def _run_cell(config, runs, seed):
+    # Play a cell's runs and reduce them to aggregates (worker side), with logging off
+    stats = EVStats()
+    final_money = min_money = rounds = reshuffles = 0.0
+    worst = None
+    names = [f"Player{i}" for i in range(1, config.num_players + 1)]
+    saved_level = main.logger.level
+    main.logger.level = LOG_OFF
+    try:
+        for run in range(1, runs + 1):
+            run_stats = EVStats()
+            result = main.simulate_game(seed=main.derive_run_seed(seed, run), stats=run_stats,
+                                        first_shoe=shoe_for_run(run, config.max_reshuffle), run=run,
+                                        config=config)
+            stats.merge(run_stats)
+            final_money += sum(result[f"final_money_{name}"] for name in names) / len(names)
+            min_money += result['min_money_reached']
+            worst = result['min_money_reached'] if worst is None else min(worst, result['min_money_reached'])
+            rounds += result['total_hands']
+            reshuffles += result['total_reshuffles']
+    finally:
+        main.logger.level = saved_level
+    return {
+        'ev_stats': stats.to_dict(),
+        'mean_final_money': final_money / runs,
+        'mean_min_money': min_money / runs,
+        'worst_min_money': worst,
+        'mean_rounds': rounds / runs,
+        'mean_reshuffles': reshuffles / runs,
+    }
+
+
+def _cache_path(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def _load_cell(cache_dir, key):
+    try:
+        with open(_cache_path(cache_dir, key), encoding='utf-8') as f:
+            return json.load(f)['result']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _store_cell(cache_dir, key, config, seed, runs, result):
+    # Written to a temporary file and renamed, so an interrupted sweep never leaves a partial cell
+    path = _cache_path(cache_dir, key)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(dict(_cell_inputs(config, seed, runs), result=result), f, indent=2)
+    os.replace(temporary, path)
+
+
+def sweep(grid, runs, seed=0, base=DEFAULT_CONFIG, cache_dir=CACHE_DIR, workers=None, progress=None):
+    """
+    Play every cell of a grid that is not cached yet and return all cells' results.
+
+    Args:
+        grid (dict): GameConfig field -> list of values (see expand).
+        runs (int): Seeded runs per cell.
+        seed (int): Master seed shared by every cell.
+        base (GameConfig): The config the cells vary.
+        cache_dir (str): Directory of cached cells; created if missing.
+        workers (int | None): Worker processes; 1 plays the cells in this process.
+        progress (callable | None): Called as progress(config, result, cached) as cells finish.
+
+    Returns:
+        list: (config, result) per cell, in grid order; result as returned by _run_cell.
+    """
+    configs = expand(grid, base)
+    corpus = main.shoe_corpus
+    if corpus is not None and any(config.num_decks != corpus.num_decks for config in configs):
+        raise ValueError(f"The shoe corpus {corpus.path} deals {corpus.num_decks}-deck shoes only")
+    os.makedirs(cache_dir, exist_ok=True)
+    keys = [cell_key(config, seed, runs) for config in configs]
+    results = {}
+    pending = []
+    for key, config in zip(keys, configs):
+        if key in results:
+            continue
+        cached = _load_cell(cache_dir, key)
+        if cached is not None:
+            results[key] = cached
+            if progress:
+                progress(config, cached, True)
+        elif key not in pending:
+            pending.append(key)
+    by_key = dict(zip(keys, configs))
+
+    def finish(key, result):
+        _store_cell(cache_dir, key, by_key[key], seed, runs, result)
+        results[key] = result
+        if progress:
+            progress(by_key[key], result, False)
+
+    if workers == 1 or len(pending) <= 1:
+        for key in pending:
+            finish(key, _run_cell(by_key[key], runs, seed))
+    elif pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_run_cell, by_key[key], runs, seed): key for key in pending}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+    return [(config, results[key]) for key, config in zip(keys, configs)]
+
+
+def rows(cells, fields):
+    # Flat rows for a report or CSV: the varied fields, then the cell's aggregates
+    table = []
+    for config, result in cells:
+        stats = EVStats.from_dict(result['ev_stats'])
+        rates = stats.rates()
+        row = {field: getattr(config, field) for field in fields}
+        row.update({
+            'hands': stats.hands,
+            'ev': stats.ev.mean,
+            'ev_half_width': stats.half_width(),
+            'win_rate': rates['win'],
+            'push_rate': rates['push'],
+            'loss_rate': rates['loss'],
+        })
+        row.update({name: value for name, value in result.items() if name != 'ev_stats'})
+        table.append(row)
+    return table
+
+
+def report(cells, fields):
+    # Report lines, one per cell: the varied fields, hands, EV with its 95% interval and money
+    widths = [max(len(field), 8) + 2 for field in fields]
+    header = ''.join(f"{field:>{width}}" for field, width in zip(fields, widths))
+    lines = [header + f"{'hands':>14}{'EV %':>10}{'± 95%':>9}{'final $':>12}{'min $':>12}{'rounds':>10}"]
+    for row in rows(cells, fields):
+        values = ''.join(f"{str(row[field]):>{width}}" for field, width in zip(fields, widths))
+        lines.append(values + f"{row['hands']:>14,}{100 * row['ev']:>+10.3f}{100 * row['ev_half_width']:>9.3f}"
+                              f"{row['mean_final_money']:>12.1f}{row['mean_min_money']:>12.1f}"
+                              f"{row['mean_rounds']:>10.1f}")
+    return lines
+
+
+def write_csv(path, cells, fields):
+    table = rows(cells, fields)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(table[0]) if table else list(fields))
+        writer.writeheader()
+        writer.writerows(table)
+
+
+def _parse_value(field, text):
+    # A grid value as the field's annotated type; "none" clears optional fields
+    kind = GameConfig.__annotations__[field]
+    if text.lower() == 'none':
+        return None
+    if kind is bool:
+        if text.lower() not in _TRUE + _FALSE:
+            raise ValueError(f"{field} takes true or false, not {text!r}")
+        return text.lower() in _TRUE
+    value = kind(text)
+    # Whole amounts stay ints, so the game keeps integral money (GameConfig.integral_money)
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+def parse_grid(items):
+    # "field=v1,v2,..." arguments -> grid dict
+    grid = {}
+    for item in items:
+        field, _, values = item.partition('=')
+        if field not in GameConfig._fields:
+            raise ValueError(f"Unknown config field {field!r}; fields: {', '.join(GameConfig._fields)}")
+        grid[field] = [_parse_value(field, value) for value in values.split(',')]
+    return grid
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--grid', nargs='+', required=True, metavar='FIELD=V1,V2',
+                        help="config fields and the values to sweep")
+    parser.add_argument('--set', nargs='+', default=[], metavar='FIELD=V',
+                        help="fields fixed for every cell (overriding the settings)")
+    parser.add_argument('--runs', type=int, default=100, help="seeded runs per cell")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--cache', default=CACHE_DIR, help="directory of cached cells")
+    parser.add_argument('--output', help="also write every cell as a CSV row")
+    args = parser.parse_args()
+
+    grid = parse_grid(args.grid)
+    base = DEFAULT_CONFIG._replace(**{field: values[0] for field, values in parse_grid(args.set).items()})
+    counts = {'cached': 0, 'played': 0}
+
+    def progress(config, result, cached):
+        counts['cached' if cached else 'played'] += 1
+        if not cached:
+            cell = ' '.join(f"{field}={getattr(config, field)}" for field in grid)
+            print(f"[{counts['cached'] + counts['played']}] {cell}: "
+                  f"EV {100 * result['ev_stats']['mean']:+.3f}%", flush=True)
+
+    cells = sweep(grid, args.runs, args.seed, base=base, cache_dir=args.cache, workers=args.workers,
+                  progress=progress)
+    print(f"{len(cells)} cells: {counts['played']} played, {counts['cached']} from {args.cache}")
+    for line in report(cells, list(grid)):
+        print(line)
+    if args.output:
+        write_csv(args.output, cells, list(grid))
+        print(f"-> {args.output}")
@@ -0,0 +1,272 @@
+"""
+Binary hand history and aggregate queries over it.
+
+Every resolved hand becomes one fixed-width record (run, round, seat, hand index,
+player and dealer cards, what was done to the hand, the count when the round was bet,
+the seat's bet and the hand's net result). Records are written in blocks, and inside a
+block each field is stored contiguously (columnar), so a reader maps a block's fields
+as NumPy arrays without copying or parsing:
+
+    header: MAGIC, uint32 length of the JSON schema, the schema
+    block:  uint32 row count, then every field's values for those rows, in schema order
+
+Aggregates are computed a block at a time with vectorized reductions, so memory stays
+flat however long the history is:
+
+    python -m src.helpers.hand_history src/outputs/hands.bin --by upcard
+    python -m src.helpers.hand_history src/outputs/hands.bin --by true_count
+"""
+import argparse
+import json
+import math
+import mmap
+import struct
+
+import numpy as np
+
+from src.cls.hand import DOUBLED, SPLIT_HAND
+from src.strategies.basic import UPCARDS, UPCARD_INDEX
+
+MAGIC = b'BJHANDS1'
+SCHEMA_LENGTH = struct.Struct('<I')
+BLOCK_HEADER = struct.Struct('<I')
+
+# Rows per block written by HandHistoryWriter
+BLOCK_ROWS = 65536
+# Card slots per hand; longer hands (possible with several decks, but rare) keep their first MAX_CARDS
+MAX_CARDS = 12
+NO_CARD = 255
+
+HAND_DTYPE = np.dtype([
+    ('run', '<u4'),
+    ('round', '<u4'),
+    ('seat', 'u1'),
+    ('hand', 'u1'),            # index among the seat's hands (> 0 after a split)
+    ('flags', 'u1'),           # DOUBLED | SPLIT_HAND | SURRENDERED, see src.cls.hand
+    ('num_cards', 'u1'),
+    ('cards', 'u1', (MAX_CARDS,)),         # card codes, NO_CARD padded
+    ('dealer_num_cards', 'u1'),
+    ('dealer_cards', 'u1', (MAX_CARDS,)),  # dealer_cards[0] is the upcard
+    ('total', 'u1'),
+    ('dealer_total', 'u1'),
+    ('running_count', '<i2'),  # count when the round was bet
+    ('true_count', '<f4'),
+    ('bet', '<f4'),            # the seat's initial bet
+    ('net', '<f4'),            # money won (+) or lost (-) on this hand
+    ('outcome', 'i1'),         # 1 win, 0 push, -1 loss
+])
+
+_PAD = (NO_CARD,) * MAX_CARDS
+_UPCARD_INDEX = np.array(UPCARD_INDEX + (len(UPCARDS),) * (NO_CARD + 1 - len(UPCARD_INDEX)), dtype=np.intp)
+# True counts outside this range fall in the end buckets
+MIN_TRUE_COUNT = -10
+MAX_TRUE_COUNT = 10
+
+
+class HandRecorder:
+    """
+    Collects the records of one game as plain tuples; simulate_round adds every hand.
+
+    `run` and `round` are set by the game loop before each round. Tuples are cheap to
+    build on the hot path and to send back from a worker process; they become a
+    structured array only when a block is written.
+    """
+
+    __slots__ = ('run', 'round', 'rows')
+
+    def __init__(self, run=0):
+        self.run = run
+        self.round = 0
+        self.rows = []
+
+    def add(self, seat, index, codes, flags, total, dealer_hand, dealer_total, running_count, true_count, bet, net,
+            outcome):
+        # `codes`, `flags` and `total` describe the player's hand (see TableState)
+        dealer_codes = dealer_hand.codes
+        self.rows.append((self.run, self.round, seat, index, flags,
+                          len(codes), tuple(codes[:MAX_CARDS]) + _PAD[len(codes):],
+                          len(dealer_codes), tuple(dealer_codes[:MAX_CARDS]) + _PAD[len(dealer_codes):],
+                          min(total, 255), dealer_total, running_count, true_count, bet, net, outcome))
+
+
+class HandHistoryWriter:
+    """
+    Appends hand records to a history file one block at a time.
+
+    With `truncate_to` the file is reopened for appending after cutting it back to that
+    size (the size checkpointed by an earlier campaign), otherwise it is started over.
+    """
+
+    def __init__(self, path, block_rows=BLOCK_ROWS, truncate_to=None):
+        self.path = path
+        self.block_rows = block_rows
+        self._rows = []
+        if truncate_to is not None:
+            self._file = open(path, 'r+b')
+            self._file.truncate(truncate_to)
+            self._file.seek(truncate_to)
+        else:
+            self._file = open(path, 'wb')
+            schema = json.dumps(HAND_DTYPE.descr).encode()
+            self._file.write(MAGIC + SCHEMA_LENGTH.pack(len(schema)) + schema)
+
+    def write(self, rows):
+        self._rows.extend(rows)
+        while len(self._rows) >= self.block_rows:
+            self._write_block(self._rows[:self.block_rows])
+            del self._rows[:self.block_rows]
+
+    def flush(self):
+        # Write whatever is buffered as a (short) block; returns the file size after it
+        if self._rows:
+            self._write_block(self._rows)
+            self._rows = []
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def _write_block(self, rows):
+        records = np.array(rows, dtype=HAND_DTYPE)
+        self._file.write(BLOCK_HEADER.pack(len(records)))
+        for field in HAND_DTYPE.names:
+            self._file.write(np.ascontiguousarray(records[field]).tobytes())
+
+
+def read_blocks(path):
+    """
+    Iterate over a history file's blocks.
+
+    Yields:
+        dict: Field name -> read-only array over the mapped file, one entry per hand in the block.
+    """
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # The map is not closed here: the yielded arrays keep it alive, and it is released
+    # with the last of them
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a hand history")
+    position = len(MAGIC)
+    (length,) = SCHEMA_LENGTH.unpack_from(data, position)
+    position += SCHEMA_LENGTH.size
+    dtype = np.dtype([tuple(field) for field in json.loads(data[position:position + length])])
+    position += length
+    while position < len(data):
+        (rows,) = BLOCK_HEADER.unpack_from(data, position)
+        position += BLOCK_HEADER.size
+        block = {}
+        for field in dtype.names:
+            base, shape = dtype[field].base, dtype[field].shape
+            block[field] = np.frombuffer(data, dtype=base, count=rows * math.prod(shape),
+                                         offset=position).reshape((rows,) + shape)
+            position += rows * dtype[field].itemsize
+        yield block
+
+
+def _upcard_key(block):
+    return _UPCARD_INDEX[block['dealer_cards'][:, 0]], [str(up) for up in UPCARDS]
+
+
+def _true_count_key(block):
+    buckets = np.clip(np.floor(block['true_count']), MIN_TRUE_COUNT, MAX_TRUE_COUNT).astype(np.intp)
+    return buckets - MIN_TRUE_COUNT, [f"{tc:+d}" for tc in range(MIN_TRUE_COUNT, MAX_TRUE_COUNT + 1)]
+
+
+def _seat_key(block):
+    seats = int(block['seat'].max()) + 1 if len(block['seat']) else 0
+    return block['seat'].astype(np.intp), [f"seat {seat + 1}" for seat in range(max(seats, 1))]
+
+
+def _total_key(block):
+    return np.minimum(block['total'], 22).astype(np.intp), [str(total) if total < 22 else "bust"
+                                                           for total in range(23)]
+
+
+GROUP_KEYS = {'upcard': _upcard_key, 'true_count': _true_count_key, 'seat': _seat_key, 'total': _total_key}
+
+# Per-group sums kept while streaming
+_SUMS = ('hands', 'wins', 'pushes', 'losses', 'units', 'units_sq', 'doubles', 'splits')
+
+
+def aggregate(paths, by='upcard'):
+    """
+    Stream one or more history files and sum per group of `by` (a GROUP_KEYS name).
+
+    EV is measured in units of the seat's initial bet per hand, so a won double is +2
+    and the two halves of a split count as two hands.
+
+    Returns:
+        dict: Group label -> {'hands', 'wins', 'pushes', 'losses', 'units', 'units_sq', 'doubles', 'splits'}.
+    """
+    key_function = GROUP_KEYS[by]
+    sums = {name: np.zeros(0) for name in _SUMS}
+    labels = []
+    for path in [paths] if isinstance(paths, str) else paths:
+        for block in read_blocks(path):
+            keys, block_labels = key_function(block)
+            if len(block_labels) > len(labels):
+                labels = block_labels
+            size = len(labels)
+            units = block['net'] / block['bet']
+            outcome = block['outcome']
+            flags = block['flags']
+            values = {
+                'hands': None,
+                'wins': outcome == 1,
+                'pushes': outcome == 0,
+                'losses': outcome == -1,
+                'units': units,
+                'units_sq': units * units,
+                'doubles': (flags & DOUBLED) != 0,
+                'splits': (flags & SPLIT_HAND) != 0,
+            }
+            for name, weights in values.items():
+                counts = np.bincount(keys, weights=weights, minlength=size)
+                total = sums[name]
+                if len(total) < size:
+                    total = np.concatenate([total, np.zeros(size - len(total))])
+                total[:len(counts)] += counts
+                sums[name] = total
+    return {label: {name: float(sums[name][i]) for name in _SUMS}
+            for i, label in enumerate(labels) if sums['hands'][i]}
+
+
+def report(groups, by='upcard'):
+    """
+    Format aggregate() results as report lines, one per group plus a total.
+
+    Columns are hands, win / push / loss rate, EV per hand with its standard error and
+    the share of hands that were doubled or came from a split.
+    """
+    header = (f"{by:<12}{'hands':>12}{'win %':>8}{'push %':>8}{'loss %':>8}{'EV %':>9}{'± SE':>8}"
+              f"{'double %':>10}{'split %':>9}")
+    lines = [header]
+    total = {name: 0.0 for name in _SUMS}
+    for label, sums in list(groups.items()) + [('all', total)]:
+        if label != 'all':
+            for name in _SUMS:
+                total[name] += sums[name]
+        hands = sums['hands']
+        if not hands:
+            continue
+        mean = sums['units'] / hands
+        variance = (sums['units_sq'] - hands * mean * mean) / (hands - 1) if hands > 1 else math.nan
+        error = math.sqrt(max(variance, 0.0) / hands)
+        lines.append(f"{label:<12}{int(hands):>12,}{100 * sums['wins'] / hands:>8.2f}"
+                     f"{100 * sums['pushes'] / hands:>8.2f}{100 * sums['losses'] / hands:>8.2f}"
+                     f"{100 * mean:>+9.3f}{100 * error:>8.3f}"
+                     f"{100 * sums['doubles'] / hands:>10.2f}{100 * sums['splits'] / hands:>9.2f}")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--by', choices=sorted(GROUP_KEYS), default='upcard')
+    args = parser.parse_args()
+    for line in report(aggregate(args.paths, args.by), args.by):
+        print(line)
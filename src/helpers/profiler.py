@@ -0,0 +1,116 @@
+import json
+import time
+import tracemalloc
+
+from src.settings import PROFILE, PROFILE_MEMORY
+
+
+class PhaseProfiler:
+    """
+    Cumulative wall time, call counts and (optionally) traced memory per simulation phase.
+
+    Call sites read `enabled` once into a local and only call start()/stop() when it is
+    set, so a disabled profiler costs one attribute lookup per instrumented function:
+
+        profile = profiler.enabled
+        if profile:
+            mark = profiler.start()
+        ...
+        if profile:
+            profiler.stop('deal', mark)
+
+    Phases may nest (e.g. 'strategy' runs inside 'player'), so their times are inclusive
+    and do not add up to the total. With memory tracking on, each phase also accumulates
+    the net bytes traced by tracemalloc between start() and stop().
+    """
+
+    def __init__(self, enabled=PROFILE, memory=PROFILE_MEMORY):
+        self.enabled = False
+        self.memory = False
+        # Whether enable() started tracemalloc itself, and so should stop it
+        self._tracing = False
+        # phase -> [calls, total ns, net traced bytes]
+        self.phases = {}
+        # name -> count, for events that are not timed (cards dealt, splits, ...)
+        self.counters = {}
+        if enabled:
+            self.enable(memory)
+
+    def enable(self, memory=False):
+        self.enabled = True
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def disable(self):
+        # `memory` is kept so a report made after disabling still shows the memory column
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        self.enabled = False
+
+    def start(self):
+        if self.memory:
+            return time.perf_counter_ns(), tracemalloc.get_traced_memory()[0]
+        return time.perf_counter_ns(), 0
+
+    def stop(self, phase, mark):
+        elapsed = time.perf_counter_ns() - mark[0]
+        allocated = tracemalloc.get_traced_memory()[0] - mark[1] if self.memory else 0
+        stats = self.phases.get(phase)
+        if stats is None:
+            self.phases[phase] = [1, elapsed, allocated]
+        else:
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] += allocated
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        # Plain-data copy of the collected stats, picklable so worker processes can return it
+        return {'phases': {phase: list(stats) for phase, stats in self.phases.items()},
+                'counters': dict(self.counters)}
+
+    def reset(self):
+        self.phases = {}
+        self.counters = {}
+
+    def merge(self, snapshot):
+        # Add a snapshot taken elsewhere (another worker, another run) into this profiler
+        for phase, (calls, elapsed, allocated) in snapshot['phases'].items():
+            stats = self.phases.setdefault(phase, [0, 0, 0])
+            stats[0] += calls
+            stats[1] += elapsed
+            stats[2] += allocated
+        for name, n in snapshot['counters'].items():
+            self.count(name, n)
+
+    def report(self):
+        """
+        Format the collected stats as report lines, slowest phase first.
+
+        Returns:
+            list: One line per phase (calls, total ms, µs per call, share of the 'game'
+            phase when present, traced KB with memory tracking) followed by the counters.
+        """
+        lines = []
+        total = self.phases.get('game', (0, 0, 0))[1]
+        header = f"{'phase':<12}{'calls':>12}{'total ms':>12}{'us/call':>10}{'% game':>8}"
+        lines.append(header + (f"{'net KB':>12}" if self.memory else ""))
+        for phase, (calls, elapsed, allocated) in sorted(self.phases.items(), key=lambda item: -item[1][1]):
+            share = f"{100 * elapsed / total:>7.1f}%" if total else f"{'-':>8}"
+            line = f"{phase:<12}{calls:>12,}{elapsed / 1e6:>12,.1f}{elapsed / calls / 1e3:>10.2f}{share}"
+            lines.append(line + (f"{allocated / 1024:>12,.1f}" if self.memory else ""))
+        for name, n in sorted(self.counters.items()):
+            lines.append(f"{name}: {n:,}")
+        return lines
+
+    def export(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+profiler = PhaseProfiler()
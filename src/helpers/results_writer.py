@@ -0,0 +1,169 @@
+import csv
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+CHECKPOINT_VERSION = 1
+
+
+def _column(values):
+    # Numeric columns become float/int arrays (None -> nan), anything else a string array
+    if all(isinstance(v, (int, float)) or v is None for v in values):
+        if any(v is None for v in values):
+            return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        return np.asarray(values)
+    return np.asarray([str(v) for v in values])
+
+
+class ResultsWriter:
+    """
+    Streams per-run summaries to disk in chunks and checkpoints after each one.
+
+    Every chunk is appended to the CSV and written as one columnar .npz part next
+    to it (<csv>.columns/part-NNNNNN.npz). After both are on disk the checkpoint
+    (<csv>.checkpoint.json) is atomically replaced with the completed run ids, the
+    RNG state needed to continue, the file sizes to roll back to and a resume token
+    identifying the campaign. A restarted campaign opened with resume=True picks up
+    at the next run and appends. Callers may checkpoint their own JSON-serializable
+    aggregate with each chunk (`state`), which is restored on resume.
+    """
+
+    def __init__(self, output_csv, checkpoint_file=None):
+        self.output_csv = output_csv
+        self.checkpoint_file = checkpoint_file or f"{output_csv}.checkpoint.json"
+        self.columns_dir = f"{output_csv}.columns"
+        self.fieldnames = None
+        self.completed = []  # [first_run, last_run] ranges
+        self.parts = 0
+        self.master_seed = None
+        self.resume_token = None
+        self.state = None
+        self._csv = None
+        self._writer = None
+
+    @property
+    def next_run(self):
+        return self.completed[-1][1] + 1 if self.completed else 1
+
+    def start(self, master_seed, campaign, resume=False):
+        """
+        Open the output files for a campaign.
+
+        Args:
+            master_seed (int | None): Seed the run seeds derive from; None to take it from the checkpoint on resume.
+            campaign (dict): Parameters that must match for a checkpoint to be resumed (engine, chunk size, ...).
+            resume (bool): Continue from an existing checkpoint instead of starting over.
+
+        Returns:
+            int: The master seed in use.
+        """
+        checkpoint = self._read_checkpoint() if resume else None
+        if checkpoint is not None:
+            if master_seed is not None and master_seed != checkpoint['rng_state']['master_seed']:
+                raise ValueError(f"Seed {master_seed} does not match checkpoint seed "
+                                 f"{checkpoint['rng_state']['master_seed']} in {self.checkpoint_file}")
+            master_seed = checkpoint['rng_state']['master_seed']
+            token = self._token(master_seed, campaign)
+            if token != checkpoint['resume_token']:
+                raise ValueError(f"Checkpoint {self.checkpoint_file} belongs to a different campaign")
+            self.fieldnames = checkpoint['fieldnames']
+            self.completed = checkpoint['completed_runs']
+            self.parts = checkpoint['column_parts']
+            self.state = checkpoint.get('state')
+            self._roll_back(checkpoint['csv_bytes'])
+            self._csv = open(self.output_csv, 'a', newline='')
+            self._writer = csv.DictWriter(self._csv, fieldnames=self.fieldnames)
+        else:
+            # A fresh campaign drops whatever an earlier one left, so a later resume can
+            # never pick up a checkpoint or parts that do not belong to this CSV
+            for stale in (self.checkpoint_file, f"{self.checkpoint_file}.tmp"):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            for part in glob.glob(os.path.join(self.columns_dir, "part-*.npz")):
+                os.remove(part)
+            os.makedirs(os.path.dirname(self.output_csv) or '.', exist_ok=True)
+            self._csv = open(self.output_csv, 'w', newline='')
+        os.makedirs(self.columns_dir, exist_ok=True)
+        self.master_seed = master_seed
+        self.resume_token = self._token(master_seed, campaign)
+        return master_seed
+
+    def write(self, results, state=None):
+        # Append one chunk of run summaries (in run order) and checkpoint, along with
+        # the caller's aggregate state after this chunk
+        if not results:
+            return
+        self.state = state
+        if self._writer is None:
+            self.fieldnames = list(results[0].keys())
+            self._writer = csv.DictWriter(self._csv, fieldnames=self.fieldnames)
+            self._writer.writeheader()
+        self._writer.writerows(results)
+        self._csv.flush()
+        os.fsync(self._csv.fileno())
+
+        self.parts += 1
+        np.savez(os.path.join(self.columns_dir, f"part-{self.parts:06d}.npz"),
+                 **{field: _column([res[field] for res in results]) for field in self.fieldnames})
+
+        first, last = results[0]['run'], results[-1]['run']
+        if self.completed and self.completed[-1][1] + 1 == first:
+            self.completed[-1][1] = last
+        else:
+            self.completed.append([first, last])
+        self._write_checkpoint()
+
+    def close(self):
+        if self._csv is not None:
+            self._csv.close()
+            self._csv = None
+
+    def _token(self, master_seed, campaign):
+        payload = json.dumps({'master_seed': master_seed, **campaign}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    def _read_checkpoint(self):
+        if not os.path.exists(self.checkpoint_file):
+            return None
+        with open(self.checkpoint_file, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_checkpoint(self):
+        checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'resume_token': self.resume_token,
+            'completed_runs': self.completed,
+            'rng_state': {'master_seed': self.master_seed, 'next_run': self.next_run},
+            'fieldnames': self.fieldnames,
+            'csv_bytes': self._csv.tell(),
+            'column_parts': self.parts,
+            'state': self.state,
+        }
+        tmp_file = f"{self.checkpoint_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.checkpoint_file)
+
+    def _roll_back(self, csv_bytes):
+        # Drop anything written after the last checkpoint (a chunk cut off by a crash)
+        with open(self.output_csv, 'r+b') as f:
+            f.truncate(csv_bytes)
+        for part in glob.glob(os.path.join(self.columns_dir, "part-*.npz")):
+            if int(os.path.basename(part)[5:11]) > self.parts:
+                os.remove(part)
+
+
+def load_columns(output_csv):
+    # Concatenate every columnar part written for `output_csv` into one array per field
+    parts = sorted(glob.glob(os.path.join(f"{output_csv}.columns", "part-*.npz")))
+    columns = {}
+    for part in parts:
+        with np.load(part) as data:
+            for field in data.files:
+                columns.setdefault(field, []).append(data[field])
+    return {field: np.concatenate(arrays) for field, arrays in columns.items()}
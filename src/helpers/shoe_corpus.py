@@ -0,0 +1,106 @@
+"""
+Pre-shuffled shoe corpus.
+
+A corpus is a binary file of shuffled shoes, one byte per card code, plus an index of
+shoe offsets (<corpus>.idx, little-endian uint64, one entry per shoe and a final end
+offset). It is generated once:
+
+    python -m src.helpers.shoe_corpus src/outputs/shoes.bin --shoes 100000 --seed 1
+
+and read through a memory map, so every process replaying it shares the same pages
+and a shoe is a zero-copy view rather than a fresh shuffle. Run n of a campaign plays
+the shoes from shoe_for_run(n) on, so any run can be replayed exactly and two settings
+or strategies can be compared on identical cards.
+"""
+import argparse
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from src.cls.card import CARDS_PER_DECK
+from src.settings import NUM_DECKS, MAX_RESHUFFLE
+
+MAGIC = b'BJSHOES1'
+# magic, number of shoes, decks per shoe
+HEADER = struct.Struct('<8sIH')
+
+
+def shoe_for_run(run, max_reshuffle=MAX_RESHUFFLE):
+    # First shoe of a run: every run gets its own block of max_reshuffle + 1 shoes, so
+    # pass the game's max_reshuffle when it is not the settings'
+    return (run - 1) * (max_reshuffle + 1)
+
+
+def write_corpus(path, num_shoes, num_decks=NUM_DECKS, seed=None, chunk_shoes=4096):
+    """
+    Shuffle `num_shoes` shoes of `num_decks` decks and write them with their index.
+
+    Returns:
+        str: Path of the index file.
+    """
+    rng = np.random.default_rng(seed)
+    base = np.tile(np.arange(CARDS_PER_DECK, dtype=np.uint8), num_decks)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, num_shoes, num_decks))
+        for start in range(0, num_shoes, chunk_shoes):
+            count = min(chunk_shoes, num_shoes - start)
+            rng.permuted(np.tile(base, (count, 1)), axis=1).tofile(f)
+    index_file = f"{path}.idx"
+    offsets = HEADER.size + np.arange(num_shoes + 1, dtype='<u8') * len(base)
+    offsets.tofile(index_file)
+    return index_file
+
+
+class ShoeCorpus:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.num_shoes, self.num_decks = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a shoe corpus")
+        self.offsets = np.fromfile(f"{path}.idx", dtype='<u8')
+        if len(self.offsets) != self.num_shoes + 1 or self.offsets[-1] != len(self._mmap):
+            raise ValueError(f"Index {path}.idx does not match {path}")
+        self.offsets = self.offsets.tolist()
+        self.shoe_size = self.num_decks * CARDS_PER_DECK
+        self._view = memoryview(self._mmap)
+
+    def __len__(self):
+        return self.num_shoes
+
+    def shoe(self, number):
+        # Zero-copy view of shoe `number`; numbers past the end wrap around the corpus
+        number %= self.num_shoes
+        return self._view[self.offsets[number]:self.offsets[number + 1]]
+
+    def stream(self, first=0):
+        # Endless iterator of shoes from `first` on, as consumed by Deck(shoes=...)
+        number = first
+        while True:
+            yield self.shoe(number)
+            number += 1
+
+    @property
+    def array(self):
+        # Every shoe as one read-only [num_shoes, shoe_size] array over the mapped file
+        return np.frombuffer(self._mmap, dtype=np.uint8, count=self.num_shoes * self.shoe_size,
+                             offset=HEADER.size).reshape(self.num_shoes, self.shoe_size)
+
+    def close(self):
+        self._view.release()
+        self._mmap.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--shoes', type=int, default=100_000)
+    parser.add_argument('--decks', type=int, default=NUM_DECKS)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    os.makedirs(os.path.dirname(args.path) or '.', exist_ok=True)
+    index_file = write_corpus(args.path, args.shoes, args.decks, args.seed)
+    print(f"{args.shoes:,} shoes of {args.decks} decks -> {args.path} (index {index_file})")
@@ -1,19 +1,122 @@
+import atexit
+import itertools
+import os
+import queue
+import struct
 import sys
+import threading
+
+from src.settings import LOG_LEVEL, LOG_ECHO
+
+# Log levels, from least to most verbose. A logger at level N keeps messages of level <= N.
+LOG_OFF = 0
+LOG_SUMMARY = 1  # per-run and per-campaign results
+LOG_ROUND = 2    # hands, dealer cards and outcome of every round
+LOG_ACTION = 3   # every individual move and card dealt
+
+# Messages are collected in memory and handed to the writer thread in chunks of this many lines
+BUFFER_LINES = 4096
+
+# Round index sidecar (<log>.idx): a header, then one fixed-size record per round
+# (byte offset of the round's first line, run number, round number, player count),
+# so a reader can seek to round i in O(1).
+INDEX_MAGIC = b'BJLOGIX1'
+INDEX_RECORD = struct.Struct('<QIIH')
 
 
 class SimulationLogger:
-    def __init__(self, log_file):
+    def __init__(self, log_file, level=LOG_LEVEL, echo=LOG_ECHO):
         self.log_file = log_file
-        self.log_file_obj = open(self.log_file, 'w', encoding='utf-8')
-        self.log_file_obj.write("Turn by Turn Simulation Log\n\n")
+        # Callers compare against `level` before formatting a message, so a
+        # disabled level costs one attribute lookup and nothing else.
+        self.level = level
+        self.echo = echo
+        # The file is opened on first use, so importing this module (e.g. in a
+        # worker process) never truncates a log that another process is writing.
+        self.log_file_obj = None
+        self.index_file = f"{log_file}.idx"
+        self.index_file_obj = None
+        self._buffer = []
+        self._marks = []  # (buffer position, run, round, players) of rounds starting in the buffer
+        self._queue = None
+        self._writer = None
+
+    def _open(self):
+        # Written as bytes so the writer always knows the byte offset it is at. The output
+        # directory is not part of the repository, so it is created on first use
+        os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+        self.log_file_obj = open(self.log_file, 'wb', buffering=1 << 20)
+        self.log_file_obj.write("Turn by Turn Simulation Log\n\n".encode('utf-8'))
+        self.index_file_obj = open(self.index_file, 'wb')
+        self.index_file_obj.write(INDEX_MAGIC)
+        self._queue = queue.Queue(maxsize=64)
+        self._writer = threading.Thread(target=self._drain, name="simulation-log-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _drain(self):
+        # Background writer: each queue item is (lines, round marks), None means stop
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            lines, marks = item
+            if marks:
+                # Encode line by line so the byte offset of every marked line is known
+                encoded = [line.encode('utf-8') for line in lines]
+                offsets = list(itertools.accumulate((len(line) + 1 for line in encoded),
+                                                    initial=self.log_file_obj.tell()))
+                for position, run, round_num, players in marks:
+                    self.index_file_obj.write(INDEX_RECORD.pack(offsets[position], run, round_num, players))
+                self.log_file_obj.write(b"\n".join(encoded) + b"\n")
+            else:
+                self.log_file_obj.write(("\n".join(lines) + "\n").encode('utf-8'))
+            if self.echo:
+                sys.stdout.write("\n".join(lines) + "\n")
+            self._queue.task_done()
+
+    def log(self, message, level=LOG_SUMMARY):
+        if level > self.level:
+            return
+        if self.log_file_obj is None:
+            self._open()
+        self._buffer.append(message)
+        if len(self._buffer) >= BUFFER_LINES:
+            self._queue.put((self._buffer, self._marks))
+            self._buffer = []
+            self._marks = []
+
+    def mark_round(self, run, round_num, players):
+        # Index the next logged line as the start of a round; call only when that line is logged
+        if self.log_file_obj is None:
+            self._open()
+        self._marks.append((len(self._buffer), run or 0, round_num, players))
 
-    def log(self, message):
-        print(message)
-        self.log_file_obj.write(message + "\n")
+    def flush(self):
+        if self.log_file_obj is None:
+            return
+        if self._buffer:
+            self._queue.put((self._buffer, self._marks))
+            self._buffer = []
+            self._marks = []
+        self._queue.join()
+        self.log_file_obj.flush()
+        self.index_file_obj.flush()
+        if self.echo:
+            sys.stdout.flush()
 
     def close(self):
         sys.stdout = sys.__stdout__
-        self.log_file_obj.close()
+        if self.log_file_obj is not None:
+            self.flush()
+            self._queue.put(None)
+            self._writer.join()
+            self.log_file_obj.close()
+            self.log_file_obj = None
+            self.index_file_obj.close()
+            self.index_file_obj = None
+            atexit.unregister(self.close)
 
 
 logger = SimulationLogger("src/outputs/simulation_log.txt");
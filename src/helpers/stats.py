@@ -0,0 +1,284 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+from src.cls.card import CARD_IS_ACE, CARD_RANK, CARD_VALUE
+from src.strategies.basic import HARD, SOFT, PAIR, ROWS_PER_CLASS, UPCARDS
+from src.strategies.deviations import CLASS_NAMES
+
+
+class RunningStats:
+    """
+    Count, mean and variance of a stream of values, kept online (Welford) in O(1) memory.
+
+    Two accumulators fed from different runs or workers combine exactly with merge(),
+    so partial results never have to be kept around to be re-aggregated.
+    """
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2  # sum of squared deviations from the mean
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        # Chan et al. pairwise update: combines two accumulators of any size
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def standard_error(self):
+        return math.sqrt(self.variance / self.count) if self.count > 1 else math.nan
+
+
+class EVStats:
+    """
+    Online estimate of the player's EV per hand with its error bar.
+
+    Every seat's round is one sample of net units won per unit of initial bet (so a
+    won double is +2 and a split adds both hands), and every resolved hand counts as a
+    win, push or loss. Samples from one shoe are treated as independent, the usual
+    approximation for a per-hand confidence interval.
+    """
+
+    __slots__ = ('ev', 'wins', 'pushes', 'losses')
+
+    def __init__(self):
+        self.ev = RunningStats()
+        self.wins = 0
+        self.pushes = 0
+        self.losses = 0
+
+    @property
+    def hands(self):
+        return self.ev.count
+
+    def add_hand(self, units):
+        self.ev.add(units)
+
+    def merge(self, other):
+        self.ev.merge(other.ev)
+        self.wins += other.wins
+        self.pushes += other.pushes
+        self.losses += other.losses
+
+    def half_width(self, confidence=0.95):
+        # Half-width of the normal confidence interval around the mean EV
+        return NormalDist().inv_cdf((1 + confidence) / 2) * self.ev.standard_error
+
+    def converged(self, precision, confidence=0.95):
+        # True once EV is known to within ±precision (units per initial bet)
+        return self.hands > 1 and self.half_width(confidence) <= precision
+
+    def rates(self):
+        resolved = self.wins + self.pushes + self.losses
+        if not resolved:
+            return {'win': math.nan, 'push': math.nan, 'loss': math.nan}
+        return {'win': self.wins / resolved, 'push': self.pushes / resolved, 'loss': self.losses / resolved}
+
+    def to_dict(self):
+        return {'count': self.ev.count, 'mean': self.ev.mean, 'm2': self.ev.m2,
+                'wins': self.wins, 'pushes': self.pushes, 'losses': self.losses}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.ev = RunningStats(data['count'], data['mean'], data['m2'])
+        stats.wins, stats.pushes, stats.losses = data['wins'], data['pushes'], data['losses']
+        return stats
+
+    def report(self, confidence=0.95):
+        # Report lines in the style of the simulation log summary
+        rates = self.rates()
+        return [
+            f"Hands: {self.hands:,}",
+            f"Player EV per hand: {100 * self.ev.mean:+.4f}% ± {100 * self.half_width(confidence):.4f}% "
+            f"({100 * confidence:g}% confidence, SE {100 * self.ev.standard_error:.4f}%)",
+            f"Standard deviation per hand: {math.sqrt(self.ev.variance):.4f} units",
+            f"Win / push / loss rate per hand: {100 * rates['win']:.2f}% / "
+            f"{100 * rates['push']:.2f}% / {100 * rates['loss']:.2f}%",
+        ]
+
+
+class ShadowStats:
+    """
+    One policy's results in shadow play: its own EVStats and net money per seat and
+    round, and the per-seat differences of both from the reference policy that played
+    the same cards.
+
+    EV (units per initial bet) compares playing strategies; money also reflects bet
+    sizing, so it is what tells bet ramps apart. The paired differences cancel most of
+    the card luck both policies shared, so their confidence intervals are far tighter
+    than the difference of two independent estimates.
+    """
+
+    __slots__ = ('ev', 'money', 'paired', 'paired_money')
+
+    def __init__(self):
+        self.ev = EVStats()
+        self.money = RunningStats()
+        self.paired = RunningStats()
+        self.paired_money = RunningStats()
+
+    def add_seat(self, units, money):
+        self.ev.add_hand(units)
+        self.money.add(money)
+
+    def merge(self, other):
+        self.ev.merge(other.ev)
+        self.money.merge(other.money)
+        self.paired.merge(other.paired)
+        self.paired_money.merge(other.paired_money)
+
+    def to_dict(self):
+        return {'ev': self.ev.to_dict(),
+                **{name: [stats.count, stats.mean, stats.m2] for name, stats in
+                   (('money', self.money), ('paired', self.paired), ('paired_money', self.paired_money))}}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.ev = EVStats.from_dict(data['ev'])
+        stats.money = RunningStats(*data['money'])
+        stats.paired = RunningStats(*data['paired'])
+        stats.paired_money = RunningStats(*data['paired_money'])
+        return stats
+
+    def report(self, reference=None, confidence=0.95):
+        # EV report lines, then the paired differences to `reference` (a policy name) when given
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        lines = self.ev.report(confidence)
+        lines.append(f"Net money per seat and round: {self.money.mean:+.4f} ± {z * self.money.standard_error:.4f}")
+        if reference is not None and self.paired.count > 1:
+            lines.append(f"EV difference vs {reference}: {100 * self.paired.mean:+.4f}% "
+                         f"± {100 * z * self.paired.standard_error:.4f}% (paired)")
+            lines.append(f"Net money difference vs {reference}: {self.paired_money.mean:+.4f} "
+                         f"± {z * self.paired_money.standard_error:.4f} per seat and round (paired)")
+        return lines
+
+
+class OutcomeMatrix:
+    """
+    Seat outcomes accumulated per (initial hand, dealer upcard, first action, true count).
+
+    The initial hand is the strategy-table row of the first two cards (hard or soft
+    total, or pair value). The first action is what was done to that hand: stand, hit,
+    double, split or surrender. Each cell keeps the number of seats, their net units (per initial
+    bet, all split hands included) and the sum of squared units, in flat dense arrays,
+    so recording a seat is O(1) and memory does not grow with the number of hands.
+    Matrices from different runs or workers are merged with merge(); they pickle and
+    serialize as their non-empty cells only.
+    """
+
+    ACTIONS = ('stand', 'hit', 'double', 'split', 'surrender')
+    STAND, HIT, DOUBLE, SPLIT, SURRENDER = range(5)
+    # True counts outside this range fall in the end buckets
+    MIN_TRUE_COUNT = -10
+    MAX_TRUE_COUNT = 10
+    SHAPE = (3 * ROWS_PER_CLASS, len(UPCARDS), len(ACTIONS), MAX_TRUE_COUNT - MIN_TRUE_COUNT + 1)
+
+    __slots__ = ('counts', 'units', 'units_sq')
+
+    def __init__(self):
+        size = math.prod(self.SHAPE)
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.units = np.zeros(size, dtype=np.float64)
+        self.units_sq = np.zeros(size, dtype=np.float64)
+
+    @staticmethod
+    def hand_row(first, second):
+        # Strategy-table row (class * ROWS_PER_CLASS + total or pair value) of a two-card hand
+        if CARD_RANK[first] == CARD_RANK[second]:
+            return PAIR * ROWS_PER_CLASS + CARD_VALUE[first]
+        if CARD_IS_ACE[first] or CARD_IS_ACE[second]:
+            return SOFT * ROWS_PER_CLASS + CARD_VALUE[first] + CARD_VALUE[second]
+        return HARD * ROWS_PER_CLASS + CARD_VALUE[first] + CARD_VALUE[second]
+
+    def cell(self, row, upcard_index, action, true_count):
+        bucket = min(max(math.floor(true_count), self.MIN_TRUE_COUNT), self.MAX_TRUE_COUNT) - self.MIN_TRUE_COUNT
+        _, upcards, actions, buckets = self.SHAPE
+        return ((row * upcards + upcard_index) * actions + action) * buckets + bucket
+
+    def add(self, cell, units):
+        self.counts[cell] += 1
+        self.units[cell] += units
+        self.units_sq[cell] += units * units
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.units += other.units
+        self.units_sq += other.units_sq
+
+    def to_dict(self):
+        cells = np.flatnonzero(self.counts)
+        return {'cells': cells.tolist(), 'counts': self.counts[cells].tolist(),
+                'units': self.units[cells].tolist(), 'units_sq': self.units_sq[cells].tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        matrix = cls()
+        cells = np.asarray(data['cells'], dtype=np.intp)
+        matrix.counts[cells] = data['counts']
+        matrix.units[cells] = data['units']
+        matrix.units_sq[cells] = data['units_sq']
+        return matrix
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.merge(self.from_dict(state))
+
+    @classmethod
+    def row_labels(cls):
+        return [f"{CLASS_NAMES[row // ROWS_PER_CLASS]} {row % ROWS_PER_CLASS}" for row in range(cls.SHAPE[0])]
+
+    def export(self, path):
+        # Dense arrays shaped SHAPE plus the labels of every axis, as one .npz file
+        np.savez(path, counts=self.counts.reshape(self.SHAPE), units=self.units.reshape(self.SHAPE),
+                 units_sq=self.units_sq.reshape(self.SHAPE), hands=np.array(self.row_labels()),
+                 upcards=np.array([str(up) for up in UPCARDS]), actions=np.array(self.ACTIONS),
+                 true_counts=np.arange(self.MIN_TRUE_COUNT, self.MAX_TRUE_COUNT + 1))
+
+    def report(self, limit=10):
+        """
+        Report lines: seats and EV per first action, then the `limit` cells (summed over
+        true counts) that lost the most units in total.
+        """
+        counts = self.counts.reshape(self.SHAPE)
+        units = self.units.reshape(self.SHAPE)
+        lines = [f"{'action':<12}{'seats':>12}{'EV %':>10}"]
+        for action, name in enumerate(self.ACTIONS):
+            seats = counts[:, :, action].sum()
+            if seats:
+                lines.append(f"{name:<12}{seats:>12,}{100 * units[:, :, action].sum() / seats:>+10.3f}")
+        cell_counts = counts.sum(axis=3)
+        cell_units = units.sum(axis=3)
+        worst = [cell for cell in np.argsort(cell_units, axis=None)[:limit] if cell_units.flat[cell] < 0]
+        if worst:
+            labels = self.row_labels()
+            lines.append(f"{'hand':<10}{'upcard':>7}{'action':>8}{'seats':>10}{'units':>12}{'EV %':>10}")
+            for cell in worst:
+                row, up, action = np.unravel_index(cell, cell_counts.shape)
+                seats = cell_counts[row, up, action]
+                lines.append(f"{labels[row]:<10}{str(UPCARDS[up]):>7}{self.ACTIONS[action]:>8}{seats:>10,}"
+                             f"{cell_units[row, up, action]:>12,.1f}{100 * cell_units[row, up, action] / seats:>+10.3f}")
+        return lines
@@ -26,9 +26,65 @@ SHUFFLE_PERCENTAGE = 25
 # Enable or disable card counting
 ENABLE_CARD_COUNTING = True
 
+# Count system kept by the shoe: "hi_lo", "ko" or "omega_ii"
+COUNT_SYSTEM = "hi_lo"
+
+# Bet increment per point of true count when card counting is enabled
+BET_RAMP = 10
+
+# Count-indexed strategy deviations (generated by src/engines/deviations.py) played on
+# top of basic strategy when card counting is enabled; None plays basic strategy only
+DEVIATIONS_FILE = None
+
 # New setting for maximum number of reshuffles
 MAX_RESHUFFLE = 15
 
+# Shuffle each shoe lazily as it is dealt (incremental Fisher-Yates from a counter-based
+# stream, see src/cls/deck.py), so the cards behind the cut card are never shuffled and
+# a seeded game's shoe n depends only on the seed and n
+LAZY_SHUFFLE = False
+
 TOTAL_RUNS=100
 
-MAX_SPLIT_ALLOWED = 3
\ No newline at end of file
+# Maximum number of splits per seat and round (resplits included), so up to MAX_SPLIT_ALLOWED + 1 hands
+MAX_SPLIT_ALLOWED = 3
+
+# Allow doubling a two-card hand after a split
+DOUBLE_AFTER_SPLIT = True
+
+# Split aces receive one card each and stand
+SPLIT_ACES_ONE_CARD = True
+
+# Allow surrendering the initial two-card hand for half the bet (see basic.surrender_cells)
+LATE_SURRENDER = False
+
+# Simulation log verbosity: 0 = off, 1 = summary, 2 = every round, 3 = every action
+LOG_LEVEL = 3
+
+# Echo log lines to stdout as well as writing them to the log file
+LOG_ECHO = True
+
+# Pre-shuffled shoe corpus (written by src/helpers/shoe_corpus.py) to deal from instead
+# of shuffling; None shuffles every shoe
+SHOE_CORPUS = None
+
+# Binary hand history (see src/helpers/hand_history.py) written by the game engine;
+# None records nothing
+HAND_HISTORY_FILE = None
+
+# Accumulate seat outcomes by initial hand, dealer upcard, first action and true count
+# in the game engine, reported and exported after all runs
+OUTCOME_MATRIX = False
+
+# Play rounds with a kernel generated for the rules above (src/engines/kernel.py) when
+# no per-hand output (round logs, hand history, outcome matrix, profiling) is needed
+ROUND_KERNEL = False
+
+# Number of runs written to the results files (and checkpointed) at a time
+RESULTS_CHUNK_SIZE = 1000
+
+# Collect per-phase timings and counters in the scalar engine, reported after all runs
+PROFILE = False
+
+# Also track net traced memory per phase with tracemalloc (slow; only with PROFILE)
+PROFILE_MEMORY = False
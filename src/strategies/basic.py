@@ -1,3 +1,8 @@
+import functools
+
+from src.cls.card import CARD_VALUE, RANK_INDEX
+
+
 def card_lookup_value(rank):
     try:
         return int(rank)
@@ -70,41 +75,102 @@ blackjack_strategy = {
 # S = Stand
 # D = Double if possible, otherwise hit
 
+# Compiled form of blackjack_strategy used by the simulation engines. Moves are small
+# integer codes and every (hand class, total or pair value, upcard) cell lives in one
+# flat bytes table, so a lookup is a single index with no string formatting or dicts.
+STAND, HIT, DOUBLE, DOUBLE_STAND, SPLIT = 0, 1, 2, 3, 4
+INVALID = 255
+MOVE_NAMES = ("S", "H", "D", "Ds", "split")
+_MOVE_CODES = {name: code for code, name in enumerate(MOVE_NAMES)}
+
+# Hand classes. Hard and soft rows are indexed by total, pair rows by card value (ace = 11).
+HARD, SOFT, PAIR = 0, 1, 2
+ROWS_PER_CLASS = 22
+UPCARDS = (2, 3, 4, 5, 6, 7, 8, 9, 10, 'A')
+
+# Upcard index (2..10 -> 0..8, ace -> 9) per card code and per rank string
+UPCARD_INDEX = tuple(value - 2 if value < 11 else 9 for value in CARD_VALUE)
+_UPCARD_INDEX_BY_RANK = {rank: UPCARD_INDEX[RANK_INDEX[rank] * 4] for rank in RANK_INDEX}
+
+
+def _compile_strategy(strategy):
+    table = bytearray([INVALID]) * (3 * ROWS_PER_CLASS * len(UPCARDS))
+
+    def fill(hand_class, row, moves):
+        start = (hand_class * ROWS_PER_CLASS + row) * len(UPCARDS)
+        table[start:start + len(UPCARDS)] = bytes(moves[up] for up in UPCARDS)
+
+    for total, moves in strategy['hard'].items():
+        fill(HARD, total, {up: _MOVE_CODES[move] for up, move in moves.items()})
+    for key, moves in strategy['soft'].items():
+        # "A,x" is soft 11 + x; "A,A" is the only two-card soft 12
+        fill(SOFT, 12 if key == 'A,A' else 11 + int(key[2:]), {up: _MOVE_CODES[move] for up, move in moves.items()})
+    for key, moves in strategy['pairSplitting'].items():
+        rank = key.split(',')[0]
+        pair_value = 11 if rank == 'A' else 10 if rank == 'T' else int(rank)
+        fill(PAIR, pair_value, {up: SPLIT if move == "Y" else INVALID for up, move in moves.items()})
+    return bytes(table)
+
+
+STRATEGY_TABLE = _compile_strategy(blackjack_strategy)
+
+
+def get_move_code(total, soft, pair_value, upcard_index):
+    """
+    Look up the basic-strategy move for a hand's running state.
+
+    Args:
+        total (int): Best total of the hand.
+        soft (bool): True to read the soft table (a two-card hand holding an ace).
+        pair_value (int): Card value of a two-card pair (ace = 11), or 0 if not a pair.
+        upcard_index (int): UPCARD_INDEX of the dealer's upcard.
+
+    Returns:
+        int: One of STAND, HIT, DOUBLE, DOUBLE_STAND, SPLIT, or INVALID if the table has no entry.
+    """
+    if pair_value and STRATEGY_TABLE[(PAIR * ROWS_PER_CLASS + pair_value) * 10 + upcard_index] == SPLIT:
+        return SPLIT
+    if total == 21:
+        return STAND
+    if total > 21:
+        return INVALID
+    return STRATEGY_TABLE[(soft * ROWS_PER_CLASS + total) * 10 + upcard_index]
+
+
+@functools.lru_cache(maxsize=None)
+def surrender_cells(stands_on_soft_17=True):
+    """
+    Late-surrender basic strategy (multi-deck) as a set of (hard total, upcard index)
+    cells: surrender hard 16 against 9, 10 or ace and hard 15 against 10, and when the
+    dealer hits soft 17 also hard 15 and 17 against an ace. Pairs that basic strategy
+    splits are split rather than surrendered.
+    """
+    cells = {(16, UPCARDS.index(9)), (16, UPCARDS.index(10)), (16, UPCARDS.index('A')), (15, UPCARDS.index(10))}
+    if not stands_on_soft_17:
+        cells |= {(15, UPCARDS.index('A')), (17, UPCARDS.index('A'))}
+    return frozenset(cells)
+
+
 # Function to get the move for hard or soft totals
 def get_blackjack_move(player_hand, dealer_upcard, player_total):
+    # Dict-based API kept for callers outside the engine; it translates the hand
+    # into running state and reads the compiled table.
+    pair_value = 0
+    soft = False
+    if len(player_hand) == 2:
+        first, second = player_hand[0]['rank'], player_hand[1]['rank']
+        if first == second:
+            pair_value = card_lookup_value(first)
+            pair_value = 11 if pair_value == 'A' else pair_value
+        soft = first == 'A' or second == 'A'
 
-    # Check for pair splitting if exactly 2 cards and both have the same rank.
-    if len(player_hand) == 2 and player_hand[0]['rank'] == player_hand[1]['rank']:
-        upcard_value = 10 if dealer_upcard['rank'] in ['J', 'Q', 'K'] else card_lookup_value(dealer_upcard['rank'])
-        action = blackjack_strategy['pairSplitting'].get(f"{player_hand[0]['rank']},{player_hand[1]['rank']}", {}).get(upcard_value, "Invalid")
-        if action != "Invalid" and action == "Y":
-            return "split"
-
-    if player_total == 21:
-        return "S"
-
-    upcard = 'A' if dealer_upcard['rank'] == 'A' else dealer_upcard['rank']
-    has_ace = any(card['rank'] == 'A' for card in player_hand)
-    upcard_value = 10 if upcard in ['J', 'Q', 'K'] else card_lookup_value(upcard)
-
-    result = None
-    # Handle soft totals
-    if len(player_hand) == 2 and player_hand[0]['rank'] == 'A' and player_hand[1]['rank'] == 'A':
-        # print('A,A')
-        result = blackjack_strategy['soft'].get('A,A', {}).get(upcard_value, "Invalid")
-    elif has_ace and player_total < 21 and len(player_hand) == 2:
-        # print('Soft')
-        result = blackjack_strategy['soft'].get(f"A,{player_total - 11}", {}).get(upcard_value, "Invalid")
-    else:
-        # print('Hard')
-        result = blackjack_strategy['hard'].get(player_total, {}).get(upcard_value, "Invalid")
-
-    if result == 'Invalid':
+    result = get_move_code(player_total, soft, pair_value, _UPCARD_INDEX_BY_RANK[dealer_upcard['rank']])
+    if result == INVALID:
         print(player_hand, dealer_upcard)
-
-    return result
+        return "Invalid"
+    return MOVE_NAMES[result]
 
 # Example usage:
 # player_hand = [{'rank': 'A', 'suit': '♠️'}, {'rank': '7', 'suit': '♣️'}]
 # dealer_upcard = {'rank': '3', 'suit': '♦️'}
-# print(get_blackjack_move(player_hand, dealer_upcard, 18))  # "Ds"
\ No newline at end of file
+# print(get_blackjack_move(player_hand, dealer_upcard, 18))  # "Ds"
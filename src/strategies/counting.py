@@ -0,0 +1,34 @@
+from src.cls.card import CARD_RANK
+
+# Card counting systems: tag per rank and the initial running count for a shoe of
+# `num_decks` decks (zero for balanced counts, which sum to zero over a deck).
+COUNT_SYSTEMS = {
+    'hi_lo': {
+        'tags': {'2': 1, '3': 1, '4': 1, '5': 1, '6': 1, '7': 0, '8': 0, '9': 0,
+                 '10': -1, 'J': -1, 'Q': -1, 'K': -1, 'A': -1},
+        'initial_count': lambda num_decks: 0,
+    },
+    'ko': {
+        'tags': {'2': 1, '3': 1, '4': 1, '5': 1, '6': 1, '7': 1, '8': 0, '9': 0,
+                 '10': -1, 'J': -1, 'Q': -1, 'K': -1, 'A': -1},
+        'initial_count': lambda num_decks: 4 - 4 * num_decks,
+    },
+    'omega_ii': {
+        'tags': {'2': 1, '3': 1, '4': 2, '5': 2, '6': 2, '7': 1, '8': 0, '9': -1,
+                 '10': -2, 'J': -2, 'Q': -2, 'K': -2, 'A': 0},
+        'initial_count': lambda num_decks: 0,
+    },
+}
+
+
+def count_tags(system):
+    # Precomputed tag per card code for a count system
+    try:
+        tags = COUNT_SYSTEMS[system]['tags']
+    except KeyError:
+        raise ValueError(f"Unknown count system: {system}") from None
+    return tuple(tags[rank] for rank in CARD_RANK)
+
+
+def initial_running_count(system, num_decks):
+    return COUNT_SYSTEMS[system]['initial_count'](num_decks)
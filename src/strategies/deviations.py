@@ -0,0 +1,68 @@
+import json
+import math
+
+from src.strategies.basic import (STRATEGY_TABLE, ROWS_PER_CLASS, UPCARDS, MOVE_NAMES, INVALID,
+                                  PAIR, STAND, SPLIT)
+
+# Hand class names used in deviation files
+CLASS_NAMES = ('hard', 'soft', 'pair')
+_CLASS_CODES = {name: code for code, name in enumerate(CLASS_NAMES)}
+_MOVE_CODES = {name: code for code, name in enumerate(MOVE_NAMES)}
+_UPCARD_POSITIONS = {str(up): index for index, up in enumerate(UPCARDS)}
+
+
+class CountStrategy:
+    """
+    Basic strategy with count-indexed deviations, loaded from a deviation file.
+
+    The file (written by src/engines/deviations.py) lists, per true-count bucket, the
+    cells where the best move differs from basic strategy. Each bucket is compiled into
+    its own copy of the flat basic-strategy table, so a lookup is the basic lookup plus
+    one bucket index. Bucket n covers true counts in [n, n + 1); counts outside the
+    generated range use the nearest bucket.
+    """
+
+    def __init__(self, min_count, max_count, deviations=(), count_system=None):
+        self.min_count = min_count
+        self.max_count = max_count
+        self.count_system = count_system
+        tables = [bytearray(STRATEGY_TABLE) for _ in range(max_count - min_count + 1)]
+        for deviation in deviations:
+            hand_class = _CLASS_CODES[deviation['class']]
+            index = (hand_class * ROWS_PER_CLASS + deviation['row']) * len(UPCARDS) \
+                + _UPCARD_POSITIONS[str(deviation['upcard'])]
+            move = deviation['move']
+            # Pair rows only say whether to split ("Y"/"N"); "N" falls through to hard/soft
+            code = (SPLIT if move == "Y" else INVALID) if hand_class == PAIR else _MOVE_CODES[move]
+            tables[deviation['true_count'] - min_count][index] = code
+        self.tables = [bytes(table) for table in tables]
+
+    @classmethod
+    def load(cls, path, count_system=None):
+        # `count_system`, when given, is the game's: the file's true counts must be that system's
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if count_system is not None and data.get('count_system') != count_system:
+            raise ValueError(f"{path} holds deviations for the {data.get('count_system')} count, "
+                             f"not {count_system}")
+        return cls(data['min_count'], data['max_count'], data['deviations'], data.get('count_system'))
+
+    def table_for(self, true_count):
+        bucket = min(max(math.floor(true_count), self.min_count), self.max_count)
+        return self.tables[bucket - self.min_count]
+
+    def get_move_code(self, total, soft, pair_value, upcard_index, true_count):
+        """
+        Same as basic.get_move_code, read from the table for `true_count`'s bucket.
+
+        Returns:
+            int: One of STAND, HIT, DOUBLE, DOUBLE_STAND, SPLIT, or INVALID if the table has no entry.
+        """
+        table = self.table_for(true_count)
+        if pair_value and table[(PAIR * ROWS_PER_CLASS + pair_value) * 10 + upcard_index] == SPLIT:
+            return SPLIT
+        if total == 21:
+            return STAND
+        if total > 21:
+            return INVALID
+        return table[(soft * ROWS_PER_CLASS + total) * 10 + upcard_index]
@@ -0,0 +1,73 @@
+import hashlib
+
+from src.settings import BET_AMOUNT, BET_RAMP, MIN_BET, MAX_BET, ENABLE_CARD_COUNTING
+from src.strategies.basic import get_move_code
+from src.strategies.deviations import CountStrategy
+
+
+class RampBet:
+    """
+    Bet sizing by true count: `base` plus `ramp` per whole point of true count, clipped
+    to [min_bet, max_bet]. ramp=0 bets flat. The default is the game's own bet
+    (get_bet_amount in main.py).
+    """
+
+    __slots__ = ('base', 'ramp', 'min_bet', 'max_bet')
+
+    def __init__(self, base=BET_AMOUNT, ramp=BET_RAMP if ENABLE_CARD_COUNTING else 0, min_bet=MIN_BET,
+                 max_bet=MAX_BET):
+        self.base = base
+        self.ramp = ramp
+        self.min_bet = min_bet
+        self.max_bet = max_bet
+
+    @property
+    def integral(self):
+        # True when every bet it makes is a whole amount
+        return all(isinstance(amount, int) for amount in (self.base, self.ramp, self.min_bet, self.max_bet))
+
+    def __call__(self, deck):
+        return max(self.min_bet, min(self.base + int(deck.true_count) * self.ramp, self.max_bet))
+
+
+class Policy:
+    """
+    A player policy for shadow play: a playing strategy and a bet function.
+
+    `strategy` is anything with CountStrategy's get_move_code(total, soft, pair_value,
+    upcard_index, true_count), or None for basic strategy; `bet` maps the deck to a bet.
+    Both are plain objects, so a policy can be sent to worker processes.
+    """
+
+    __slots__ = ('name', 'strategy', 'bet')
+
+    def __init__(self, name, strategy=None, bet=None):
+        self.name = name
+        self.strategy = strategy
+        self.bet = bet if bet is not None else RampBet()
+
+    @classmethod
+    def with_deviations(cls, name, path, bet=None, count_system=None):
+        return cls(name, CountStrategy.load(path, count_system), bet)
+
+    def get_move_code(self, total, soft, pair_value, upcard_index, true_count):
+        if self.strategy is None:
+            return get_move_code(total, soft, pair_value, upcard_index)
+        return self.strategy.get_move_code(total, soft, pair_value, upcard_index, true_count)
+
+    def signature(self):
+        # What decides the policy's play, as JSON-able data: its name, a digest of its
+        # strategy tables and its bet parameters (the bet's type when it is not a RampBet)
+        strategy = None
+        if self.strategy is not None:
+            digest = hashlib.sha256(b''.join(getattr(self.strategy, 'tables', ())))
+            strategy = [type(self.strategy).__name__, getattr(self.strategy, 'min_count', None),
+                        getattr(self.strategy, 'max_count', None), digest.hexdigest()]
+        if isinstance(self.bet, RampBet):
+            bet = [self.bet.base, self.bet.ramp, self.bet.min_bet, self.bet.max_bet]
+        else:
+            bet = type(self.bet).__name__
+        return {'name': self.name, 'strategy': strategy, 'bet': bet}
+
+    def __repr__(self):
+        return f"Policy({self.name!r})"